@@ -0,0 +1,327 @@
+"""
+Study Sphere AI - Admission Module
+This module caps the number of LLM generations running at once across the bot,
+serving queued user requests before speculative and pregeneration jobs and
+shedding requests whose wait for a slot would exceed their SLO
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+from circuit_breaker import LatencyTracker
+
+
+class _Waiter:
+    """
+    Request queued for a generation slot
+    """
+
+    def __init__(self, priority, wake):
+        self.priority = priority
+        self.wake = wake
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.abandoned = False
+
+
+class AdmissionController:
+    """
+    Class to admit LLM generations up to a global in-flight limit
+
+    A request takes a free slot at once. Otherwise it is queued by priority,
+    interactive before speculative before bulk and first come first served
+    within a priority, and a finished generation hands its slot to the head
+    of the queue. The wait of a new request is estimated from the requests
+    queued ahead of it and the rolling duration of a generation; a request
+    whose estimate exceeds the SLO of its priority is shed straight away, and
+    one still queued when its SLO has passed is shed then.
+    """
+
+    INTERACTIVE = 0
+    SPECULATIVE = 1
+    BULK = 2
+
+    PRIORITY_NAMES = {INTERACTIVE: "interactive", SPECULATIVE: "speculative", BULK: "bulk"}
+
+    def __init__(self, max_in_flight=6, slo=None, smoothing=0.2):
+        """
+        Initialize the AdmissionController
+
+        Args:
+            max_in_flight (int): Most generations running at once
+            slo (dict, optional): Most seconds each priority may wait for a slot, None for a
+                priority that waits as long as it takes, every priority waits if not given
+            smoothing (float): Weight of the newest generation in the rolling duration
+        """
+        self.max_in_flight = max_in_flight
+        self.slo = slo or {}
+        self.smoothing = smoothing
+
+        # Heap of (priority, sequence, waiter), abandoned waiters are skipped when popped
+        self._queue = []
+        self._sequence = itertools.count()
+        self._waiting = {priority: 0 for priority in self.PRIORITY_NAMES}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        # Rolling duration of a generation, None until the first one finishes
+        self.service_time = None
+
+        self.queue_times = {priority: LatencyTracker(min_samples=5) for priority in self.PRIORITY_NAMES}
+        self.stats = {
+            priority: {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0, "max_wait": 0.0}
+            for priority in self.PRIORITY_NAMES
+        }
+        self.max_in_flight_seen = 0
+        self.max_queue_length = 0
+
+    def _estimate_wait(self, priority):
+        """
+        Estimate how long a new request would wait for a slot, the caller must hold the lock
+
+        Args:
+            priority (int): INTERACTIVE, SPECULATIVE or BULK
+
+        Returns:
+            float: Seconds, 0 with a free slot, None while the duration of a generation is unknown
+        """
+        if self._in_flight < self.max_in_flight:
+            return 0.0
+        if self.service_time is None:
+            return None
+
+        # Requests of the same or a higher priority are served first, each slot serves them in turn
+        ahead = sum(count for waiting, count in self._waiting.items() if waiting <= priority)
+        return (ahead + 1) * self.service_time / self.max_in_flight
+
+    def _admit(self, priority, waited):
+        """
+        Count an admitted request, the caller must hold the lock
+
+        Args:
+            priority (int): Priority of the request
+            waited (float): Seconds the request was queued
+        """
+        self._in_flight += 1
+        self.max_in_flight_seen = max(self.max_in_flight_seen, self._in_flight)
+
+        stats = self.stats[priority]
+        stats["admitted"] += 1
+        stats["max_wait"] = max(stats["max_wait"], waited)
+        self.queue_times[priority].record(waited)
+
+    def _enqueue(self, priority, wake):
+        """
+        Queue a request for the next free slot, or shed it, the caller must hold the lock
+
+        Args:
+            priority (int): Priority of the request
+            wake (callable): Called once the request is granted a slot
+
+        Returns:
+            _Waiter: Request, already granted if a slot was free, None if it was shed
+        """
+        waiter = _Waiter(priority, wake)
+
+        estimate = self._estimate_wait(priority)
+        if estimate == 0.0:
+            waiter.granted = True
+            self._admit(priority, 0.0)
+            return waiter
+
+        slo = self.slo.get(priority)
+        if slo is not None and estimate is not None and estimate > slo:
+            self.stats[priority]["shed"] += 1
+            return None
+
+        heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+        self._waiting[priority] += 1
+        self.stats[priority]["queued"] += 1
+        self.max_queue_length = max(self.max_queue_length, sum(self._waiting.values()))
+        return waiter
+
+    def _abandon(self, waiter):
+        """
+        Take a request off the queue, the caller must hold the lock
+
+        Args:
+            waiter (_Waiter): Queued request
+
+        Returns:
+            bool: False if the request was granted a slot meanwhile
+        """
+        if waiter.granted:
+            return False
+
+        waiter.abandoned = True
+        self._waiting[waiter.priority] -= 1
+        return True
+
+    def _grant_next(self):
+        """
+        Hand free slots to the requests at the head of the queue, the caller must hold the lock
+        """
+        while self._queue and self._in_flight < self.max_in_flight:
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.abandoned:
+                continue
+
+            waiter.granted = True
+            self._waiting[waiter.priority] -= 1
+            self._admit(waiter.priority, time.monotonic() - waiter.enqueued_at)
+            waiter.wake()
+
+    def acquire(self, priority):
+        """
+        Wait for a generation slot, a request that is admitted must be ended with release
+
+        Args:
+            priority (int): INTERACTIVE, SPECULATIVE or BULK
+
+        Returns:
+            bool: True if admitted, False if the request was shed
+        """
+        granted = threading.Event()
+        with self._lock:
+            waiter = self._enqueue(priority, granted.set)
+            if waiter is None or waiter.granted:
+                return waiter is not None
+
+        granted.wait(self.slo.get(priority))
+
+        with self._lock:
+            if self._abandon(waiter):
+                self.stats[priority]["timed_out"] += 1
+                return False
+        return True
+
+    async def acquire_async(self, priority):
+        """
+        Async counterpart of acquire, waiting without blocking the event loop
+
+        Args:
+            priority (int): INTERACTIVE, SPECULATIVE or BULK
+
+        Returns:
+            bool: True if admitted, False if the request was shed
+        """
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            # Slots are handed over from whichever thread finished a generation
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(True))
+
+        with self._lock:
+            waiter = self._enqueue(priority, wake)
+            if waiter is None or waiter.granted:
+                return waiter is not None
+
+        try:
+            await asyncio.wait({granted}, timeout=self.slo.get(priority))
+        except asyncio.CancelledError:
+            with self._lock:
+                if not self._abandon(waiter):
+                    self._release(None)
+            raise
+
+        with self._lock:
+            if self._abandon(waiter):
+                self.stats[priority]["timed_out"] += 1
+                return False
+        return True
+
+    def _release(self, elapsed):
+        """
+        Free a slot and hand it to the next queued request, the caller must hold the lock
+
+        Args:
+            elapsed (float): Seconds the generation took, None if it tells nothing about generations
+        """
+        self._in_flight -= 1
+        if elapsed is not None:
+            if self.service_time is None:
+                self.service_time = elapsed
+            else:
+                self.service_time += self.smoothing * (elapsed - self.service_time)
+        self._grant_next()
+
+    def release(self, elapsed=None):
+        """
+        End an admitted request
+
+        Args:
+            elapsed (float, optional): Seconds the generation took, updates the rolling duration
+        """
+        with self._lock:
+            self._release(elapsed)
+
+    @contextlib.contextmanager
+    def admit(self, priority):
+        """
+        Hold a generation slot for the duration of a with block
+
+        Args:
+            priority (int): INTERACTIVE, SPECULATIVE or BULK
+
+        Yields:
+            bool: True if admitted, False if the request was shed and must not call the LLM
+        """
+        if not self.acquire(priority):
+            yield False
+            return
+
+        started = time.monotonic()
+        try:
+            yield True
+        finally:
+            self.release(time.monotonic() - started)
+
+    @contextlib.asynccontextmanager
+    async def admit_async(self, priority):
+        """
+        Async counterpart of admit
+
+        Args:
+            priority (int): INTERACTIVE, SPECULATIVE or BULK
+
+        Yields:
+            bool: True if admitted, False if the request was shed and must not call the LLM
+        """
+        if not await self.acquire_async(priority):
+            yield False
+            return
+
+        started = time.monotonic()
+        try:
+            yield True
+        finally:
+            self.release(time.monotonic() - started)
+
+    def get_stats(self):
+        """
+        Get admission statistics
+
+        Returns:
+            dict: In-flight and queue figures with, per priority name, counters and queue time percentiles
+        """
+        with self._lock:
+            stats = {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight_seen,
+                "queued": sum(self._waiting.values()),
+                "max_queue_length": self.max_queue_length,
+                "service_time": self.service_time,
+                "priorities": {
+                    name: dict(self.stats[priority], estimated_wait=self._estimate_wait(priority))
+                    for priority, name in self.PRIORITY_NAMES.items()
+                }
+            }
+
+        for priority, name in self.PRIORITY_NAMES.items():
+            stats["priorities"][name]["queue_time"] = self.queue_times[priority].get_stats()
+        return stats
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Study Sphere AI - clean_response Benchmark
+Times DeepSeekAPI.clean_response against the original implementation on an
+8 KB completion from the golden corpus and checks that both produce the same
+output
+
+Run from the repository root: python benchmarks/bench_clean_response.py
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepseek_api import DeepSeekAPI
+
+CORPUS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "tests", "golden", "clean_response", "15_sample_paper_8kb.input.txt"
+)
+
+
+def original_clean_response(content):
+    """
+    clean_response as it was before the patterns were precompiled, without its
+    debugging prints so only the cleaning passes are compared
+
+    Args:
+        content (str): Raw content from API
+
+    Returns:
+        str: Cleaned content
+    """
+    if not content:
+        return "No content was generated. Please try again."
+
+    content = re.sub(r'\\boxed\{(.*?)\}', r'\1', content, flags=re.DOTALL)
+    content = re.sub(r'\\begin\{.*?\}(.*?)\\end\{.*?\}', r'\1', content, flags=re.DOTALL)
+    content = re.sub(r'\\[a-zA-Z]+(\{.*?\}|\[.*?\])?', '', content)
+    content = re.sub(r'```(?:json|python|markdown|latex|math)?\n?(.*?)```', r'\1', content, flags=re.DOTALL)
+    content = re.sub(r'\*\*(.*?)\*\*', r'\1', content)
+    content = re.sub(r'\*(.*?)\*', r'\1', content)
+    content = re.sub(r'__(.*?)__', r'\1', content)
+    content = re.sub(r'_(.*?)_', r'\1', content)
+    content = content.replace('\\\\', '')
+    content = re.sub(r'(\d+)\\\. ', r'\1. ', content)
+    content = re.sub(r'^\s*[-•●◦○*]\s+', '• ', content, flags=re.MULTILINE)
+    content = re.sub(r'\n{3,}', '\n\n', content)
+    content = '\n'.join([line.strip() for line in content.split('\n')])
+    content = re.sub(r'([.,:;!?])([a-zA-Z])', r'\1 \2', content)
+    content = re.sub(r'^([A-Z][A-Z\s]+)$', r'\n\1\n', content, flags=re.MULTILINE)
+    content = re.sub(r'[^\x00-\x7F]+', '', content)
+    content = re.sub(r' {2,}', ' ', content)
+    content = re.sub(r'\n(\d+\.)', r'\n\n\1', content)
+    content = re.sub(r'\n(•)', r'\n\n\1', content)
+    content = content.replace('\\boxed', '')
+    content = content.replace('\\text', '')
+    content = content.replace('\\frac', '')
+    content = content.replace('\\sqrt', 'sqrt')
+    content = content.replace('\\sum', 'sum')
+    content = content.replace('\\int', 'integral')
+    content = content.replace('\\infty', 'infinity')
+    content = content.replace('\\approx', '≈')
+    content = content.replace('\\times', '×')
+    content = content.replace('\\div', '÷')
+    content = content.replace('\\pm', '±')
+    content = content.replace('\\cdot', '·')
+    content = content.replace('\\ldots', '...')
+    content = content.replace('\\rightarrow', '→')
+    content = content.replace('\\leftarrow', '←')
+    content = re.sub(r'\{([^{}]*)\}', r'\1', content)
+    content = re.sub(r'\[([^\[\]]*)\]', r'\1', content)
+    content = re.sub(r' {2,}', ' ', content)
+    content = re.sub(r'\n{3,}', '\n\n', content)
+    content = content.replace("#", " ")
+    return content
+
+
+def best_time(function, content, number, repeat):
+    """
+    Time a cleaning function
+
+    Args:
+        function (callable): Function called with the content
+        content (str): Completion to clean
+        number (int): Calls per measurement
+        repeat (int): Measurements taken
+
+    Returns:
+        float: Fastest time of one call, in seconds
+    """
+    return min(timeit.repeat(lambda: function(content), number=number, repeat=repeat)) / number
+
+
+def main():
+    """
+    Run the benchmark and print the time per call of both implementations
+    """
+    parser = argparse.ArgumentParser(description="Benchmark clean_response on an 8 KB completion")
+    parser.add_argument("--number", type=int, default=200, help="Calls per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements taken, the fastest is reported")
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, "r", encoding="utf-8", newline="") as file:
+        content = file.read()
+
+    api = DeepSeekAPI("benchmark-key", "http://127.0.0.1:9/v1/chat/completions", "benchmark-model")
+    try:
+        if api.clean_response(content) != original_clean_response(content):
+            sys.exit("clean_response output differs from the original implementation")
+
+        original = best_time(original_clean_response, content, args.number, args.repeat)
+        current = best_time(api.clean_response, content, args.number, args.repeat)
+    finally:
+        api.close()
+
+    print(f"Completion size: {len(content.encode('utf-8'))} bytes")
+    print(f"Original: {original * 1000:.3f} ms per call")
+    print(f"Current:  {current * 1000:.3f} ms per call")
+    print(f"Speedup:  {original / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
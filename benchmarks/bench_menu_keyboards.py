@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Study Sphere AI - Menu Keyboard Benchmark
+Measures the CPU time a menu tap spends on its keyboard: building the markup,
+serializing it and encoding the request body, with keyboards rebuilt on every
+tap as before and with the memoized, pre-serialized keyboards
+
+Run from the repository root: python benchmarks/bench_menu_keyboards.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from menu_navigation import MenuNavigation
+from telegram_api import _encode_form
+
+
+def catalogue_taps(menu_navigation):
+    """
+    List one tap for every keyboard reachable from the catalogue
+
+    Args:
+        menu_navigation (MenuNavigation): Menu builder
+
+    Returns:
+        list: (builder, args) pairs
+    """
+    taps = [(menu_navigation.build_class_keyboard, ()), (menu_navigation.build_post_response_keyboard, ())]
+
+    for class_num, subjects in menu_navigation.course_data.items():
+        taps.append((menu_navigation.build_subject_keyboard, (class_num,)))
+        taps.append((menu_navigation.build_difficulty_keyboard, ([class_num],)))
+
+        for subject, subject_info in subjects.items():
+            taps.append((menu_navigation.build_resource_type_keyboard, ([class_num, subject],)))
+            if "Chapters" in subject_info:
+                taps.append((menu_navigation.build_chapter_keyboard, ([class_num, subject],)))
+            if "Subsubjects" in subject_info:
+                taps.append((menu_navigation.build_subsubject_keyboard, (class_num, subject)))
+                for subsubject in subject_info["Subsubjects"]:
+                    taps.append((menu_navigation.build_chapter_keyboard, ([class_num, subject, subsubject],)))
+
+    return taps
+
+
+def rebuilt_tap(menu_navigation, builder, args):
+    """
+    Handle a tap the way it was handled before memoization: the keyboard is built
+    and serialized again and the whole body, markup included, is form-encoded
+
+    Args:
+        menu_navigation (MenuNavigation): Menu builder
+        builder (callable): Keyboard builder of the tapped menu
+        args (tuple): Builder arguments
+
+    Returns:
+        bytes: Request body
+    """
+    menu_navigation._keyboards.clear()
+    data = {"chat_id": 123456789, "message_id": 42, "text": "Select an option:", "parse_mode": "HTML"}
+    data["reply_markup"] = builder(*args)
+    return urllib.parse.urlencode(data).encode()
+
+
+def memoized_tap(menu_navigation, builder, args):
+    """
+    Handle a tap with the prebuilt keyboard and the cached markup encoding
+
+    Args:
+        menu_navigation (MenuNavigation): Menu builder
+        builder (callable): Keyboard builder of the tapped menu
+        args (tuple): Builder arguments
+
+    Returns:
+        bytes: Request body
+    """
+    data = {"chat_id": 123456789, "message_id": 42, "text": "Select an option:", "parse_mode": "HTML"}
+    data["reply_markup"] = builder(*args)
+    return _encode_form(data)
+
+
+def cpu_per_tap(tap, menu_navigation, sequence, repeat):
+    """
+    Measure the CPU time of a tap handler over a sequence of taps
+
+    Args:
+        tap (callable): Tap handler
+        menu_navigation (MenuNavigation): Menu builder
+        sequence (list): (builder, args) pairs to tap in order
+        repeat (int): Measurements taken
+
+    Returns:
+        float: Fastest CPU seconds per tap
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        for builder, args in sequence:
+            tap(menu_navigation, builder, args)
+        best = min(best, (time.process_time() - started) / len(sequence))
+    return best
+
+
+def main():
+    """
+    Run the benchmark and print the CPU time per tap before and after memoization
+    """
+    parser = argparse.ArgumentParser(description="Benchmark per-tap keyboard CPU time")
+    parser.add_argument("--taps", type=int, default=20000, help="Taps per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements taken, the fastest is reported")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random tap sequence")
+    args = parser.parse_args()
+
+    menu_navigation = MenuNavigation()
+    taps = catalogue_taps(menu_navigation)
+    sequence = random.Random(args.seed).choices(taps, k=args.taps)
+
+    # Both handlers must send the same request body
+    for builder, builder_args in taps:
+        if rebuilt_tap(menu_navigation, builder, builder_args) != memoized_tap(menu_navigation, builder, builder_args):
+            sys.exit("Memoized keyboards encode differently from rebuilt ones")
+
+    before = cpu_per_tap(rebuilt_tap, menu_navigation, sequence, args.repeat)
+
+    started = time.perf_counter()
+    count = menu_navigation.warm_keyboards()
+    warm_time = time.perf_counter() - started
+    after = cpu_per_tap(memoized_tap, menu_navigation, sequence, args.repeat)
+
+    print(f"Keyboards: {count} ({len(taps)} distinct menus), prebuilt in {warm_time * 1000:.1f} ms")
+    print(f"Rebuilt per tap:  {before * 1e6:.1f} us CPU")
+    print(f"Memoized per tap: {after * 1e6:.1f} us CPU")
+    print(f"Speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
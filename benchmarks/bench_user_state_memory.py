@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Study Sphere AI - User State Memory Benchmark
+Measures the memory per user of navigation state held for many chats, as the
+dicts used before UserState, as UserState objects and inside a UserStateStore
+
+Run from the repository root: python benchmarks/bench_user_state_memory.py
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from course_data import COURSE_DATA, DIFFICULTY_LEVELS, RESOURCE_TYPES
+from state_store import UserState, UserStateStore
+
+
+def catalogue_hierarchies(course_data=COURSE_DATA):
+    """
+    List the hierarchy of every chapter in the catalogue
+
+    Args:
+        course_data (dict): Catalogue of classes, subjects, sub-subjects and chapters
+
+    Returns:
+        list: Lists containing [class_num, subject, (optional) subsubject, chapter]
+    """
+    hierarchies = []
+    for class_num, subjects in course_data.items():
+        for subject, subject_info in subjects.items():
+            hierarchies.extend([class_num, subject, chapter] for chapter in subject_info.get("Chapters", []))
+            for subsubject, subsubject_info in subject_info.get("Subsubjects", {}).items():
+                hierarchies.extend(
+                    [class_num, subject, subsubject, chapter] for chapter in subsubject_info.get("Chapters", [])
+                )
+    return hierarchies
+
+
+def sample_fields(users, seed):
+    """
+    Pick the navigation of each user: a chapter, resource type, difficulty and menu message
+
+    Every user is at the difficulty step, the largest state NavigationHandler keeps
+
+    Args:
+        users (int): Number of users
+        seed (int): Random seed
+
+    Returns:
+        list: (chat_id, hierarchy, resource_type, difficulty, message_id) tuples
+    """
+    generator = random.Random(seed)
+    hierarchies = catalogue_hierarchies()
+    difficulties = [level["value"] for level in DIFFICULTY_LEVELS]
+
+    return [
+        (
+            100000000 + number,
+            generator.choice(hierarchies),
+            generator.choice(RESOURCE_TYPES),
+            generator.choice(difficulties),
+            generator.randrange(1, 2 ** 31)
+        )
+        for number in range(users)
+    ]
+
+
+def dict_states(fields):
+    """
+    Hold states the way they were kept before UserState, a dict per chat
+
+    Hierarchy names are parsed from callback data, so each state holds its own list
+    """
+    return {
+        chat_id: {
+            "current_level": "generating",
+            "hierarchy": list(hierarchy),
+            "last_message_id": message_id,
+            "resource_type": resource_type,
+            "difficulty": difficulty
+        }
+        for chat_id, hierarchy, resource_type, difficulty, message_id in fields
+    }
+
+
+def slotted_states(fields):
+    """
+    Hold states as UserState objects in a dict keyed by chat
+    """
+    return {
+        chat_id: UserState("generating", hierarchy, message_id, resource_type, difficulty)
+        for chat_id, hierarchy, resource_type, difficulty, message_id in fields
+    }
+
+
+def store_states(fields):
+    """
+    Hold UserState objects in a UserStateStore, with its LRU and size bookkeeping
+    """
+    store = UserStateStore(max_entries=len(fields) + 1, ttl=None, max_memory_bytes=None)
+    for chat_id, hierarchy, resource_type, difficulty, message_id in fields:
+        store[chat_id] = UserState("generating", hierarchy, message_id, resource_type, difficulty)
+    return store
+
+
+def measure(build, fields):
+    """
+    Measure the memory a container of states allocates
+
+    Args:
+        build (callable): Builds the container from the sampled fields
+        fields (list): Sampled navigation per user
+
+    Returns:
+        int: Bytes still allocated once the container is built
+    """
+    gc.collect()
+    tracemalloc.start()
+    container = build(fields)
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del container
+    return allocated
+
+
+def main():
+    """
+    Run the benchmark and print bytes per user for each representation
+    """
+    parser = argparse.ArgumentParser(description="Benchmark navigation state memory per user")
+    parser.add_argument("--users", type=int, default=1000000, help="Number of users held at once")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the sampled navigation")
+    args = parser.parse_args()
+
+    fields = sample_fields(args.users, args.seed)
+
+    # Resolve the catalogue index before measuring, it is shared by every state
+    UserState("start", fields[0][1])
+
+    print(f"Users: {args.users}")
+    for name, build in (("dict state", dict_states), ("UserState", slotted_states), ("UserStateStore", store_states)):
+        allocated = measure(build, fields)
+        print(f"{name:15s} {allocated / args.users:7.1f} bytes per user, {allocated / 1024 / 1024:8.1f} MiB total")
+
+
+if __name__ == "__main__":
+    main()
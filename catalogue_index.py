@@ -0,0 +1,376 @@
+"""
+Study Sphere AI - Catalogue Index Module
+This module assigns every catalogue node a stable numeric ID used in callback data,
+and keeps the older name-based callback tokens resolvable, so a button press maps to
+its exact node with a dictionary lookup
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from course_data import COURSE_DATA, RESOURCE_TYPES
+
+# Longest name fragment embedded in legacy callback data
+TOKEN_LENGTH = 20
+
+# Append-only table of node IDs, committed so IDs stay stable across deployments
+CATALOGUE_IDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalogue_ids.json")
+
+
+class CatalogueIndex:
+    """
+    Class to map catalogue nodes to stable IDs and callback tokens to nodes
+
+    Node paths are tuples: (class_num,) for classes, (class_num, subject) for
+    subjects, (class_num, subject, subsubject) for sub-subjects,
+    (class_num, subject, subsubject or None, chapter) for chapters and
+    (resource_type,) for resource types.
+    """
+
+    def __init__(self, course_data=COURSE_DATA, resource_types=RESOURCE_TYPES, ids_path=CATALOGUE_IDS_PATH,
+                 token_length=TOKEN_LENGTH):
+        """
+        Initialize the CatalogueIndex and build all lookup tables
+
+        Args:
+            course_data (dict): Catalogue of classes, subjects, sub-subjects and chapters
+            resource_types (list): Available resource types
+            ids_path (str, optional): Path of the node ID table, None assigns IDs in memory only
+            token_length (int): Longest name fragment used as a legacy token
+        """
+        self.ids_path = ids_path
+        self.token_length = token_length
+
+        # Legacy tokens: parent path -> {token: name}, per level
+        self._subjects = {}
+        self._subsubjects = {}
+        self._chapters = {}
+        self._resources = {}
+
+        # Node IDs: id -> (level, path) and (level, path) -> id
+        self._nodes = {}
+        self._node_ids = {}
+        self.version = 0
+        self.next_id = 1
+        self.new_ids = 0
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+
+        if ids_path and os.path.exists(ids_path):
+            self._load_ids(ids_path)
+        self._build(course_data, resource_types)
+
+        self.build_time = time.perf_counter() - started
+        self.memory_bytes = tracemalloc.get_traced_memory()[0] - memory_before
+        if not tracing:
+            tracemalloc.stop()
+
+    def _build(self, course_data, resource_types):
+        """
+        Walk the catalogue once and fill the lookup tables
+
+        Args:
+            course_data (dict): Catalogue of classes, subjects, sub-subjects and chapters
+            resource_types (list): Available resource types
+        """
+        self.node_count = 0
+
+        for class_num, subjects in course_data.items():
+            self._assign_id("class", (class_num,))
+            self._add_level(self._subjects, "subject", (class_num,), list(subjects))
+
+            for subject, subject_info in subjects.items():
+                if "Chapters" in subject_info:
+                    self._add_level(self._chapters, "chapter", (class_num, subject, None), subject_info["Chapters"])
+
+                subsubjects = subject_info.get("Subsubjects", {})
+                if subsubjects:
+                    self._add_level(self._subsubjects, "subsubject", (class_num, subject), list(subsubjects))
+
+                for subsubject, subsubject_info in subsubjects.items():
+                    self._add_level(
+                        self._chapters,
+                        "chapter",
+                        (class_num, subject, subsubject),
+                        subsubject_info.get("Chapters", [])
+                    )
+
+        self._add_level(self._resources, "resource", (), resource_types)
+
+    def _load_ids(self, path):
+        """
+        Load the node ID table
+
+        Args:
+            path (str): Path of the node ID table
+        """
+        with open(path, "r", encoding="utf-8") as file:
+            table = json.load(file)
+
+        self.version = table["version"]
+        for node_id, level, node_path in table["nodes"]:
+            self._nodes[node_id] = (level, tuple(node_path))
+            self._node_ids[(level, tuple(node_path))] = node_id
+            self.next_id = max(self.next_id, node_id + 1)
+
+    def _assign_id(self, level, path):
+        """
+        Give a node an ID if the table does not have one yet
+
+        IDs are never reused or reassigned, so callback data on older messages keeps
+        pointing at the same node after catalogue updates
+
+        Args:
+            level (str): Level of the node
+            path (tuple): Path of the node
+        """
+        if (level, path) in self._node_ids:
+            return
+
+        node_id = self.next_id
+        self.next_id += 1
+        self._nodes[node_id] = (level, path)
+        self._node_ids[(level, path)] = node_id
+        self.new_ids += 1
+
+    def save_ids(self, path=None):
+        """
+        Write the node ID table, bumping its version when new IDs were assigned
+
+        Args:
+            path (str, optional): Path of the node ID table, defaults to ids_path
+
+        Returns:
+            bool: True if the table was written
+        """
+        path = path or self.ids_path
+        if not path or (not self.new_ids and os.path.exists(path)):
+            return False
+
+        self.version += 1
+        self.new_ids = 0
+
+        # One node per line keeps catalogue additions readable in diffs
+        lines = [
+            json.dumps([node_id, level, list(node_path)], ensure_ascii=False)
+            for node_id, (level, node_path) in sorted(self._nodes.items())
+        ]
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(f'{{"version": {self.version}, "nodes": [\n')
+            file.write(",\n".join(lines))
+            file.write("\n]}\n")
+
+        return True
+
+    def _add_level(self, table, level, parent, names):
+        """
+        Assign IDs and legacy tokens to sibling nodes and register them under their parent
+
+        Names whose truncated forms collide get a token carrying their position
+        among the siblings. The full name and the plain truncated form are kept as
+        aliases so buttons from older messages still resolve.
+
+        Args:
+            table (dict): Lookup table of the level
+            level (str): Level name used in the token table
+            parent (tuple): Path of the parent node
+            names (list): Names of the sibling nodes
+        """
+        lookup = table.setdefault(parent, {})
+
+        truncated = [name[:self.token_length] for name in names]
+        counts = {}
+        for short in truncated:
+            counts[short] = counts.get(short, 0) + 1
+
+        for position, (name, short) in enumerate(zip(names, truncated)):
+            if counts[short] > 1:
+                suffix = f"~{position}"
+                token = name[:self.token_length - len(suffix)] + suffix
+            else:
+                token = short
+
+            lookup[token] = name
+            lookup.setdefault(name, name)
+            lookup.setdefault(short, name)
+            self._assign_id(level, parent + (name,))
+            self.node_count += 1
+
+    def node_id(self, level, *path):
+        """
+        Get the ID of a catalogue node
+
+        Args:
+            level (str): One of class, subject, subsubject, chapter or resource
+            *path (str): Path of the node
+
+        Returns:
+            int: Node ID or None if the node is not in the catalogue
+        """
+        return self._node_ids.get((level, path))
+
+    def resolve_id(self, level, node_id):
+        """
+        Get the path of the node an ID refers to
+
+        Args:
+            level (str): Level the node is expected at
+            node_id (str): Node ID from callback data
+
+        Returns:
+            tuple: Node path or None if the ID is unknown or at another level
+        """
+        if not node_id.isdigit():
+            return None
+
+        node = self._nodes.get(int(node_id))
+        if node is None or node[0] != level:
+            return None
+        return node[1]
+
+    def hierarchy_id(self, hierarchy):
+        """
+        Get the ID of the deepest node of a navigation hierarchy
+
+        Args:
+            hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter],
+                or a prefix of it
+
+        Returns:
+            int: Node ID or None if the hierarchy is not in the catalogue
+        """
+        path = tuple(hierarchy)
+
+        if len(path) == 1:
+            return self._node_ids.get(("class", path))
+        if len(path) == 2:
+            return self._node_ids.get(("subject", path))
+        if len(path) == 3:
+            # Either a sub-subject or a chapter of a subject without sub-subjects
+            node_id = self._node_ids.get(("subsubject", path))
+            if node_id is None:
+                node_id = self._node_ids.get(("chapter", (path[0], path[1], None, path[2])))
+            return node_id
+        if len(path) == 4:
+            return self._node_ids.get(("chapter", path))
+        return None
+
+    def resolve_hierarchy(self, node_id):
+        """
+        Get the navigation hierarchy ending at a node
+
+        Args:
+            node_id (int): Node ID from hierarchy_id
+
+        Returns:
+            list: Hierarchy as used by the navigation handlers, empty if the ID is unknown
+        """
+        node = self._nodes.get(node_id)
+        if node is None or node[0] == "resource":
+            return []
+
+        return [name for name in node[1] if name is not None]
+
+    def resolve_subject(self, class_num, token):
+        """
+        Get the subject a legacy callback token refers to
+
+        Args:
+            class_num (str): Class number
+            token (str): Callback token
+
+        Returns:
+            str: Subject name or None if not found
+        """
+        return self._subjects.get((class_num,), {}).get(token)
+
+    def resolve_subsubject(self, class_num, subject, token):
+        """
+        Get the sub-subject a legacy callback token refers to
+
+        Args:
+            class_num (str): Class number
+            subject (str): Subject name
+            token (str): Callback token
+
+        Returns:
+            str: Sub-subject name or None if not found
+        """
+        return self._subsubjects.get((class_num, subject), {}).get(token)
+
+    def resolve_chapter(self, class_num, subject, token, subsubject=None):
+        """
+        Get the chapter a legacy callback token refers to
+
+        Args:
+            class_num (str): Class number
+            subject (str): Subject name
+            token (str): Callback token
+            subsubject (str, optional): Sub-subject name
+
+        Returns:
+            str: Chapter name or None if not found
+        """
+        return self._chapters.get((class_num, subject, subsubject), {}).get(token)
+
+    def resolve_resource(self, token):
+        """
+        Get the resource type a legacy callback token refers to
+
+        Args:
+            token (str): Callback token
+
+        Returns:
+            str: Resource type or None if not found
+        """
+        return self._resources.get((), {}).get(token)
+
+    def get_stats(self):
+        """
+        Get index size and build statistics
+
+        Returns:
+            dict: Node count, ID table version, build time and memory use
+        """
+        return {
+            "nodes": self.node_count,
+            "ids_version": self.version,
+            "new_ids": self.new_ids,
+            "build_time": self.build_time,
+            "memory_bytes": self.memory_bytes
+        }
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_catalogue_index():
+    """
+    Get the process-wide index of the catalogue, building it on first use
+
+    Returns:
+        CatalogueIndex: Shared index
+    """
+    global _shared_index
+
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = CatalogueIndex()
+        return _shared_index
+
+
+if __name__ == "__main__":
+    # Regenerate the node ID table after editing course_data.py
+    index = CatalogueIndex()
+    new_ids = index.new_ids
+    if index.save_ids():
+        print(f"✅ Catalogue IDs updated to version {index.version} with {new_ids} new IDs")
+    else:
+        print(f"✅ Catalogue IDs version {index.version} already cover all nodes")
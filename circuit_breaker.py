@@ -0,0 +1,235 @@
+"""
+Study Sphere AI - Circuit Breaker Module
+This module stops calls to a failing API for a while so requests fail fast to
+fallback content, and derives call timeouts from the latencies observed so far
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is rejected because the circuit breaker is open
+    """
+
+
+class LatencyTracker:
+    """
+    Class to keep a sliding window of call latencies and report their percentiles
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        """
+        Initialize the LatencyTracker
+
+        Args:
+            window (int): Number of most recent latencies kept
+            min_samples (int): Latencies needed before percentiles are trusted
+        """
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """
+        Add the latency of a successful call
+
+        Args:
+            seconds (float): Call duration
+        """
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent):
+        """
+        Get a latency percentile of the window
+
+        Args:
+            percent (float): Percentile between 0 and 100
+
+        Returns:
+            float: Latency in seconds, None if fewer than min_samples were recorded
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def adaptive_timeout(self, default, minimum, percent=99, multiplier=2.0):
+        """
+        Get a call timeout a healthy call is very unlikely to reach
+
+        Args:
+            default (float): Timeout used until enough latencies are known, also the upper bound
+            minimum (float): Lower bound of the timeout
+            percent (float): Percentile the timeout is based on
+            multiplier (float): Headroom over the percentile
+
+        Returns:
+            float: Timeout in seconds
+        """
+        latency = self.percentile(percent)
+        if latency is None:
+            return default
+        return min(default, max(minimum, latency * multiplier))
+
+    def get_stats(self):
+        """
+        Get latency percentiles of the window
+
+        Returns:
+            dict: Sample count with p50, p90 and p99 latencies, None until enough samples
+        """
+        with self._lock:
+            ordered = sorted(self._samples)
+
+        stats = {"samples": len(ordered), "p50": None, "p90": None, "p99": None}
+        if len(ordered) >= self.min_samples:
+            for name, percent in (("p50", 50), ("p90", 90), ("p99", 99)):
+                stats[name] = ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+        return stats
+
+
+class CircuitBreaker:
+    """
+    Class to reject calls to a dependency after repeated failures
+
+    Closed: calls go through and consecutive failures are counted. Open: calls
+    are rejected until reset_timeout has passed. Half-open: a limited number of
+    trial calls go through, one success closes the breaker and one failure
+    opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, half_open_max_calls=1):
+        """
+        Initialize the CircuitBreaker closed
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the breaker
+            reset_timeout (float): Seconds the breaker stays open before a trial call
+            half_open_max_calls (int): Trial calls allowed at once while half-open
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+
+        self.stats = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0}
+
+    def _update_state(self, now):
+        """
+        Move from open to half-open once reset_timeout has passed, the caller must hold the lock
+
+        Args:
+            now (float): Current monotonic time
+        """
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+
+    def _open(self, now):
+        """
+        Open the breaker, the caller must hold the lock
+
+        Args:
+            now (float): Current monotonic time
+        """
+        self._state = self.OPEN
+        self._opened_at = now
+        self._trials = 0
+        self.stats["opened"] += 1
+
+    @property
+    def state(self):
+        """
+        Get the current state
+
+        Returns:
+            str: CLOSED, OPEN or HALF_OPEN
+        """
+        with self._lock:
+            self._update_state(time.monotonic())
+            return self._state
+
+    def allow(self):
+        """
+        Check whether a call may go through, a call that is allowed must be ended
+        with record_success, record_failure or release
+
+        Returns:
+            bool: False if the call should fail fast
+        """
+        with self._lock:
+            self._update_state(time.monotonic())
+
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.HALF_OPEN and self._trials < self.half_open_max_calls:
+                self._trials += 1
+                return True
+
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        """
+        Record a call that succeeded, closing the breaker
+        """
+        with self._lock:
+            self.stats["successes"] += 1
+            self._failures = 0
+            self._state = self.CLOSED
+            self._trials = 0
+
+    def record_failure(self):
+        """
+        Record a call that failed, opening the breaker after failure_threshold
+        consecutive failures or after a failed trial call
+        """
+        with self._lock:
+            self.stats["failures"] += 1
+            now = time.monotonic()
+
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+
+            self._failures += 1
+            if self._state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open(now)
+
+    def release(self):
+        """
+        End a call whose outcome says nothing about the dependency, e.g. one the caller abandoned
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def get_stats(self):
+        """
+        Get breaker statistics
+
+        Returns:
+            dict: State with opened, rejected, success and failure counters
+        """
+        with self._lock:
+            self._update_state(time.monotonic())
+            stats = dict(self.stats)
+            stats["state"] = self._state
+        return stats
@@ -0,0 +1,291 @@
+"""
+Study Sphere AI - Content Cache Module
+This module caches generated study material in a memory LRU tier backed by an
+on-disk SQLite tier, so repeated requests for the same chapter and resource do
+not call the LLM again
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ContentCache:
+    """
+    Class to cache generated content with LRU, TTL and size-based eviction
+    """
+
+    def __init__(self, db_path=None, max_memory_entries=512, max_disk_entries=50000, ttl=7 * 24 * 3600):
+        """
+        Initialize the ContentCache
+
+        Args:
+            db_path (str, optional): Path of the SQLite database, None keeps the cache in memory only
+            max_memory_entries (int): Maximum number of entries in the memory tier
+            max_disk_entries (int): Maximum number of entries in the disk tier
+            ttl (float): Seconds an entry stays valid, None disables expiry
+        """
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+
+        # Memory tier: key -> (content, version, created_at), least recently used first
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "expired": 0,
+            "stale_served": 0,
+            "puts": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+
+        self._db = None
+        if db_path:
+            self._open_database(db_path)
+
+    def _open_database(self, db_path):
+        """
+        Open the SQLite database and create the cache table
+
+        Args:
+            db_path (str): Path of the SQLite database
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS content_cache ("
+            "key TEXT PRIMARY KEY, "
+            "version TEXT NOT NULL, "
+            "content TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS content_cache_accessed ON content_cache (accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(class_num, subject, subsubject, chapter, resource_type, difficulty=None):
+        """
+        Build the cache key for a piece of study material
+
+        Args:
+            class_num (str): Class number
+            subject (str): Subject name
+            subsubject (str): Sub-subject name or None
+            chapter (str): Chapter name
+            resource_type (str): Type of resource
+            difficulty (str, optional): Difficulty level
+
+        Returns:
+            str: Cache key
+        """
+        return json.dumps([class_num, subject, subsubject, chapter, resource_type, difficulty], ensure_ascii=False)
+
+    def _is_expired(self, created_at, now):
+        """
+        Check whether an entry created at the given time has outlived the TTL
+
+        Args:
+            created_at (float): Creation time of the entry
+            now (float): Current time
+
+        Returns:
+            bool: True if the entry is expired
+        """
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, key, version):
+        """
+        Look up cached content
+
+        Stale and expired entries are misses but stay stored until they are
+        overwritten or evicted, so get_stale can still serve them
+
+        Args:
+            key (str): Cache key from make_key
+            version (str): Prompt version stamp the entry must carry
+
+        Returns:
+            str: Cached content, or None on a miss
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                content, entry_version, created_at = entry
+                if entry_version != version or self._is_expired(created_at, now):
+                    # Both tiers hold the same entry, so the disk tier has nothing fresher
+                    self.stats["stale" if entry_version != version else "expired"] += 1
+                    self.stats["misses"] += 1
+                    return None
+
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return content
+
+            if self._db is None:
+                self.stats["misses"] += 1
+                return None
+
+            row = self._db.execute(
+                "SELECT version, content, created_at FROM content_cache WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            entry_version, content, created_at = row
+            if entry_version != version or self._is_expired(created_at, now):
+                self.stats["stale" if entry_version != version else "expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._db.execute("UPDATE content_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+
+            # Promote to the memory tier
+            self._remember(key, content, version, created_at)
+            self.stats["disk_hits"] += 1
+            return content
+
+    def get_stale(self, key):
+        """
+        Look up cached content whatever its version and age, for requests that cannot be generated
+
+        Args:
+            key (str): Cache key from make_key
+
+        Returns:
+            str: Cached content, possibly from an older prompt or past its TTL, or None if there is none
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self.stats["stale_served"] += 1
+                return entry[0]
+
+            if self._db is None:
+                return None
+
+            row = self._db.execute("SELECT content FROM content_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            self.stats["stale_served"] += 1
+            return row[0]
+
+    def put(self, key, version, content):
+        """
+        Store content in both tiers
+
+        Args:
+            key (str): Cache key from make_key
+            version (str): Prompt version stamp of the content
+            content (str): Content to cache
+        """
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, content, version, now)
+            self.stats["puts"] += 1
+
+            if self._db is None:
+                return
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO content_cache (key, version, content, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, version, content, now, now)
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def _remember(self, key, content, version, created_at):
+        """
+        Add an entry to the memory tier, evicting the least recently used entries
+
+        Args:
+            key (str): Cache key
+            content (str): Cached content
+            version (str): Prompt version stamp
+            created_at (float): Creation time of the entry
+        """
+        self._memory[key] = (content, version, created_at)
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def _evict_disk(self, now):
+        """
+        Remove expired entries and the least recently used entries above the size limit
+
+        Args:
+            now (float): Current time
+        """
+        if self.ttl is not None:
+            cursor = self._db.execute("DELETE FROM content_cache WHERE created_at < ?", (now - self.ttl,))
+            self.stats["disk_evictions"] += cursor.rowcount
+
+        count = self._db.execute("SELECT COUNT(*) FROM content_cache").fetchone()[0]
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            cursor = self._db.execute(
+                "DELETE FROM content_cache WHERE key IN "
+                "(SELECT key FROM content_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            self.stats["disk_evictions"] += cursor.rowcount
+
+    def clear(self):
+        """
+        Remove all entries from both tiers
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM content_cache")
+                self._db.commit()
+
+    def get_stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            dict: Hit, miss and eviction counters
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """
+        Close the database connection
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
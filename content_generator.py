@@ -3,17 +3,29 @@ Study Sphere AI - Content Generator Module
 This module handles content generation for the Study Sphere AI bot
 """
 
+import contextlib
 import re
+import hashlib
+from admission import AdmissionController
 from deepseek_api import DeepSeekAPI
+from content_cache import ContentCache
+from single_flight import SingleFlight, SingleFlightCancelled, SingleFlightTimeout
 from response_template import format_response, save_response_to_file
 import os
 
+
+class GenerationCancelled(Exception):
+    """
+    Raised from a progress callback to abandon a speculative generation
+    """
+
+
 class ContentGenerator:
     """
     Class to handle content generation for the Study Sphere AI bot
     """
     
-    def __init__(self, api_key, base_url, model):
+    def __init__(self, api_key, base_url, model, cache=None, coalesce_timeout=120, api=None, admission=None):
         """
         Initialize the ContentGenerator class
         
@@ -21,10 +33,23 @@ class ContentGenerator:
             api_key (str): Deep Seek API key
             base_url (str): Base URL for API calls
             model (str): Model to use for API calls
+            cache (ContentCache, optional): Cache of generated study material
+            coalesce_timeout (float): Seconds a request waits for an identical generation already in flight
+            api (DeepSeekAPI or ModelRouter, optional): Shared API client, one is created from the
+                credentials if not given
+            admission (AdmissionController, optional): Global cap and priority queue of generations,
+                generations run unqueued if not given
         """
-        self.api = DeepSeekAPI(api_key, base_url, model)
+        self.api = api if api is not None else DeepSeekAPI(api_key, base_url, model)
+        self.cache = cache
+        
+        # Concurrent requests for the same material share one LLM call
+        self.single_flight = SingleFlight()
+        self.coalesce_timeout = coalesce_timeout
+        
+        self.admission = admission
 
-    def generate_content(self, hierarchy, resource_type, difficulty=None):
+    def generate_content(self, hierarchy, resource_type, difficulty=None, on_progress=None, with_file=False):
         """
         Generate content based on hierarchy and resource type
         
@@ -32,11 +57,253 @@ class ContentGenerator:
             hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
             resource_type (str): Type of resource to generate
             difficulty (str, optional): Difficulty level
+            on_progress (callable, optional): Stream the response, calling this with partial content
+            with_file (bool, optional): Also return the text file version of longer content
+            
+        Returns:
+            str: Generated content, or a tuple (content, text file path or None) with with_file
+        """
+        class_num, subject, subsubject, chapter = self._split_hierarchy(hierarchy)
+        key, version = self._cache_key(class_num, subject, subsubject, chapter, resource_type, difficulty)
+        
+        content = self.cache.get(key, version) if self.cache else None
+        
+        if content is None:
+            try:
+                # Only the request that starts the generation streams its progress
+                content = self.single_flight.do(
+                    key,
+                    lambda: self._generate_cached(
+                        key, version, class_num, subject, subsubject, chapter, resource_type, difficulty, on_progress,
+                        priority=AdmissionController.INTERACTIVE
+                    ),
+                    self.coalesce_timeout
+                )
+            except (SingleFlightTimeout, SingleFlightCancelled) as e:
+                print(f"⚠️ {e}")
+                content = None
+        
+        formatted_content, file_path = self._finish_content(content, class_num, subject, subsubject, chapter, resource_type, difficulty)
+        return (formatted_content, file_path) if with_file else formatted_content
+    
+    def warm_cache(self, hierarchy, resource_type, difficulty=None, cancelled=None, priority=AdmissionController.BULK):
+        """
+        Generate content into the cache ahead of a request for it
+        
+        A request arriving while the generation runs joins it instead of starting
+        another one. The generation is abandoned if cancelled returns True while
+        no request has joined it.
+        
+        Args:
+            hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
+            resource_type (str): Type of resource to generate
+            difficulty (str, optional): Difficulty level
+            cancelled (callable, optional): Checked as the content streams in, without it
+                the content is generated in one request
+            priority (int, optional): Admission priority, SPECULATIVE for prefetches and BULK for pregeneration
+            
+        Returns:
+            bool: True if the content is cached or being generated by another caller
+        """
+        if not self.cache:
+            return False
+        
+        class_num, subject, subsubject, chapter = self._split_hierarchy(hierarchy)
+        key, version = self._cache_key(class_num, subject, subsubject, chapter, resource_type, difficulty)
+        
+        if self.single_flight.in_flight(key) or self.cache.get(key, version) is not None:
+            return True
+        
+        def on_progress(partial_content):
+            # Detaching first means no request can join a generation about to be dropped
+            if cancelled is not None and cancelled() and self.single_flight.detach(key):
+                raise GenerationCancelled(f"Generation of {key} cancelled")
+        
+        # The slot is taken before the generation is registered, so a user asking for the
+        # same content meanwhile generates it at interactive priority instead of joining a queued job
+        admission = self.admission.admit(priority) if self.admission is not None else contextlib.nullcontext(True)
+        with admission as admitted:
+            if not admitted or (cancelled is not None and cancelled()):
+                return False
+            
+            # Never wait on another caller's generation while holding a slot
+            started, content = self.single_flight.lead(
+                key,
+                lambda: self._generate_cached(
+                    key, version, class_num, subject, subsubject, chapter, resource_type, difficulty,
+                    on_progress if cancelled is not None else None
+                )
+            )
+            if not started:
+                return True
+        
+        return bool(content)
+    
+    def _generate_cached(self, key, version, class_num, subject, subsubject, chapter, resource_type, difficulty, on_progress=None,
+                         priority=None):
+        """
+        Generate study material and cache it, run once per key by the single flight group
+        
+        Args:
+            key (str): Cache key
+            version (str): Prompt version stamp or None
+            class_num (str): Class number
+            subject (str): Subject name
+            subsubject (str): Sub-subject name or None
+            chapter (str): Chapter name
+            resource_type (str): Type of resource
+            difficulty (str): Difficulty level or None
+            on_progress (callable, optional): Stream the response, calling this with partial content
+            priority (int, optional): Admission priority, None if the caller already holds a slot
+            
+        Returns:
+            str: Generated study material, older cached material if it was shed, or None if
+                generation failed or was shed with nothing cached
+        """
+        # An identical request may have filled the cache while this one was queued
+        cached = self.cache.get(key, version) if self.cache else None
+        if cached is not None:
+            return cached
+        
+        admission = contextlib.nullcontext(True)
+        if self.admission is not None and priority is not None:
+            admission = self.admission.admit(priority)
+        
+        with admission as admitted:
+            if not admitted:
+                return self._shed(key, resource_type, chapter)
+            
+            # Generate study material
+            generated = self.api.generate_study_material(
+                class_num, 
+                subject, 
+                chapter, 
+                resource_type, 
+                difficulty, 
+                subsubject,
+                on_progress,
+                use_fallback=False
+            )
+        
+        # Only cache real generations, fallback content is applied afterwards
+        if generated and self.cache:
+            self.cache.put(key, version, generated)
+        return generated
+    
+    def _shed(self, key, resource_type, chapter):
+        """
+        Serve a request the admission controller shed
+        
+        Args:
+            key (str): Cache key
+            resource_type (str): Type of resource
+            chapter (str): Chapter name
+            
+        Returns:
+            str: Content cached from an older prompt or past its TTL, None to apply fallback content
+        """
+        stale = self.cache.get_stale(key) if self.cache else None
+        if stale is not None:
+            print(f"⚠️ LLM queue too long, serving cached {resource_type} for {chapter}")
+        else:
+            print(f"⚠️ LLM queue too long, shedding {resource_type} for {chapter}")
+        return stale
+    
+    async def generate_content_async(self, hierarchy, resource_type, difficulty=None, with_file=False):
+        """
+        Async counterpart of generate_content, sharing the same formatting
+        
+        Args:
+            hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
+            resource_type (str): Type of resource to generate
+            difficulty (str, optional): Difficulty level
+            with_file (bool, optional): Also return the text file version of longer content
+            
+        Returns:
+            str: Generated content, or a tuple (content, text file path or None) with with_file
+        """
+        class_num, subject, subsubject, chapter = self._split_hierarchy(hierarchy)
+        key, version = self._cache_key(class_num, subject, subsubject, chapter, resource_type, difficulty)
+        
+        content = self.cache.get(key, version) if self.cache else None
+        
+        if content is None:
+            async def generate_material():
+                # Generate study material without blocking the event loop
+                return await self.api.generate_study_material_async(
+                    class_num, 
+                    subject, 
+                    chapter, 
+                    resource_type, 
+                    difficulty, 
+                    subsubject,
+                    use_fallback=False
+                )
+            
+            async def generate():
+                cached = self.cache.get(key, version) if self.cache else None
+                if cached is not None:
+                    return cached
+                
+                if self.admission is not None:
+                    async with self.admission.admit_async(AdmissionController.INTERACTIVE) as admitted:
+                        if not admitted:
+                            return self._shed(key, resource_type, chapter)
+                        generated = await generate_material()
+                else:
+                    generated = await generate_material()
+                
+                if generated and self.cache:
+                    self.cache.put(key, version, generated)
+                return generated
+            
+            try:
+                content = await self.single_flight.do_async(key, generate, self.coalesce_timeout)
+            except (SingleFlightTimeout, SingleFlightCancelled) as e:
+                print(f"⚠️ {e}")
+                content = None
+        
+        formatted_content, file_path = self._finish_content(content, class_num, subject, subsubject, chapter, resource_type, difficulty)
+        return (formatted_content, file_path) if with_file else formatted_content
+    
+    def _cache_key(self, class_num, subject, subsubject, chapter, resource_type, difficulty):
+        """
+        Build the cache key and prompt version stamp for a piece of study material
+        
+        The version stamp hashes the model and the exact prompt, so any change to
+        DeepSeekAPI._build_prompt invalidates entries generated from the old prompt.
+        The key also identifies identical in-flight generations
+        
+        Args:
+            class_num (str): Class number
+            subject (str): Subject name
+            subsubject (str): Sub-subject name or None
+            chapter (str): Chapter name
+            resource_type (str): Type of resource
+            difficulty (str): Difficulty level or None
+            
+        Returns:
+            tuple: (key, version), version is None without a cache
+        """
+        key = ContentCache.make_key(class_num, subject, subsubject, chapter, resource_type, difficulty)
+        if not self.cache:
+            return key, None
+            
+        prompt = self.api._build_prompt(class_num, subject, chapter, resource_type, difficulty, subsubject)
+        version = hashlib.sha256(f"{self.api.model}\n{prompt}".encode('utf-8')).hexdigest()[:16]
+        
+        return key, version
+    
+    def _split_hierarchy(self, hierarchy):
+        """
+        Extract hierarchy components
+        
+        Args:
+            hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
             
         Returns:
-            str: Generated content
+            tuple: (class_num, subject, subsubject or None, chapter)
         """
-        # Extract hierarchy components
         class_num = hierarchy[0]
         subject = hierarchy[1]
         
@@ -48,16 +315,24 @@ class ContentGenerator:
             subsubject = None
             chapter = hierarchy[2]
         
-        # Generate study material
-        content = self.api.generate_study_material(
-            class_num, 
-            subject, 
-            chapter, 
-            resource_type, 
-            difficulty, 
-            subsubject
-        )
+        return class_num, subject, subsubject, chapter
+    
+    def _finish_content(self, content, class_num, subject, subsubject, chapter, resource_type, difficulty):
+        """
+        Apply fallback content and formatting to generated study material
         
+        Args:
+            content (str): Generated study material
+            class_num (str): Class number
+            subject (str): Subject name
+            subsubject (str): Sub-subject name or None
+            chapter (str): Chapter name
+            resource_type (str): Type of resource
+            difficulty (str): Difficulty level or None
+            
+        Returns:
+            tuple: (formatted content, path of the text file version or None)
+        """
         # If content is empty after API call, use fallback
 
         if not content:
@@ -74,8 +349,9 @@ class ContentGenerator:
         formatted_content = self._format_content(content, resource_type)
         
         # Create a text file version for longer content
+        file_path = None
         if len(formatted_content) > 3000:
-            self._create_text_file_response(
+            file_path = self._create_text_file_response(
                 class_num, 
                 subject, 
                 chapter, 
@@ -85,7 +361,7 @@ class ContentGenerator:
                 subsubject
             )
         
-        return formatted_content
+        return formatted_content, file_path
     
     def _format_content(self, content, resource_type):
         """
@@ -534,7 +810,7 @@ class ContentGenerator:
             subsubject (str, optional): Sub-subject name
             
         Returns:
-            str: Path to created text file
+            str: Path to created text file, or None if it could not be written
         """
         # Format response using template
         formatted_response = format_response(
@@ -561,6 +837,7 @@ class ContentGenerator:
         
         # Save to file
         file_path = f"/tmp/study_sphere/{filename}"
-        save_response_to_file(formatted_response, file_path)
+        if not save_response_to_file(formatted_response, file_path):
+            return None
         
         return file_path
@@ -3,37 +3,243 @@ Study Sphere AI - Deep Seek API Module
 This module handles all Deep Seek API interactions for the Study Sphere AI bot
 """
 
+import asyncio
+import contextlib
 import json
-import urllib.request
+import threading
 import urllib.parse
 import re
 import time
-import ssl
 import random
+from collections import deque
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyTracker
+from http_pool import AsyncHTTPConnectionPool, HTTPConnectionPool, HTTPStatusError, create_insecure_ssl_context
+
+# Patterns used by DeepSeekAPI.clean_response, compiled once at import
+_BOXED_PATTERN = re.compile(r'\\boxed\{(.*?)\}', re.DOTALL)
+_ENVIRONMENT_PATTERN = re.compile(r'\\begin\{.*?\}(.*?)\\end\{.*?\}', re.DOTALL)
+_LATEX_COMMAND_PATTERN = re.compile(r'\\[a-zA-Z]+(\{.*?\}|\[.*?\])?')
+_CODE_BLOCK_PATTERN = re.compile(r'```(?:json|python|markdown|latex|math)?\n?(.*?)```', re.DOTALL)
+_BOLD_PATTERN = re.compile(r'\*\*(.*?)\*\*')
+_ITALIC_PATTERN = re.compile(r'\*(.*?)\*')
+_UNDERLINE_PATTERN = re.compile(r'__(.*?)__')
+_UNDERSCORE_PATTERN = re.compile(r'_(.*?)_')
+# Matches the escaped dot of "1\. " starting at the backslash, so the search
+# can skip ahead to backslashes instead of trying every digit
+_ESCAPED_NUMBER_PATTERN = re.compile(r'\\(?<=\d\\)(?=\. )')
+_BULLET_PATTERN = re.compile(r'^\s*[-•●◦○*]\s+', re.MULTILINE)
+_BLANK_LINES_PATTERN = re.compile(r'\n\n\n+')
+_PUNCTUATION_SPACING_PATTERN = re.compile(r'([.,:;!?])([a-zA-Z])')
+_SECTION_HEADER_PATTERN = re.compile(r'^([A-Z][A-Z\s]+)$', re.MULTILINE)
+_MULTIPLE_SPACES_PATTERN = re.compile(r'  +')
+_NUMBERED_ITEM_PATTERN = re.compile(r'\n(\d+\.)')
+_BRACES_PATTERN = re.compile(r'\{([^{}]*)\}')
+_BRACKETS_PATTERN = re.compile(r'\[([^\[\]]*)\]')
+
+# LaTeX artifacts left after cleaning, applied in order because removing one
+# token can expose another (e.g. "\te\boxedxt")
+_LATEX_REPLACEMENTS = (
+    ('\\boxed', ''),
+    ('\\text', ''),
+    ('\\frac', ''),
+    ('\\sqrt', 'sqrt'),
+    ('\\sum', 'sum'),
+    ('\\int', 'integral'),
+    ('\\infty', 'infinity'),
+    ('\\approx', '≈'),
+    ('\\times', '×'),
+    ('\\div', '÷'),
+    ('\\pm', '±'),
+    ('\\cdot', '·'),
+    ('\\ldots', '...'),
+    ('\\rightarrow', '→'),
+    ('\\leftarrow', '←'),
+)
+
+
+# Request settings per resource type. Output length drives generation time, so each
+# type asks for about what its prompt produces instead of one large budget
+DEFAULT_GENERATION_PROFILE = {"max_tokens": 2048, "temperature": 0.5, "stop": None}
+GENERATION_PROFILES = {
+    # Five numbered questions, stopping at a sixth keeps the answer to what was asked
+    "Important Questions": {"max_tokens": 500, "temperature": 0.6, "stop": ["\n6."]},
+    "Previous Year Questions": {"max_tokens": 600, "temperature": 0.5, "stop": ["\n6."]},
+    "Sample Paper": {"max_tokens": 1600, "temperature": 0.6, "stop": None},
+    "Chapter Summary": {"max_tokens": 800, "temperature": 0.4, "stop": None},
+    "Study Notes": {"max_tokens": 1000, "temperature": 0.4, "stop": None},
+    "Formula Sheet": {"max_tokens": 800, "temperature": 0.2, "stop": None},
+    "Diagram Sheet": {"max_tokens": 700, "temperature": 0.4, "stop": None},
+    "Mind Map": {"max_tokens": 700, "temperature": 0.5, "stop": None},
+    "Quick Revision Notes": {"max_tokens": 600, "temperature": 0.3, "stop": None}
+}
+
+# Completion token counts kept per resource type for the usage percentiles
+TOKEN_USAGE_WINDOW = 200
+
+
+class _HedgeLost(Exception):
+    """
+    Raised inside an attempt that lost a hedged race, to cut its stream off
+    """
+
+
+class _HedgeAttempt:
+    """
+    One attempt of a hedged streamed call, which the winning attempt cuts off
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lost = False
+        self._end_call = None
+        self._abort = None
+
+    def _register(self, end_call=None, abort=None):
+        """
+        Register how to end the attempt, raising _HedgeLost if it was cut off already
+
+        Args:
+            end_call (callable, optional): Frees the concurrency slot of the attempt
+            abort (callable, optional): Aborts the exchange of the attempt
+        """
+        with self._lock:
+            if self.lost:
+                raise _HedgeLost()
+            self._end_call = end_call or self._end_call
+            self._abort = abort or self._abort
+
+    def holding(self, end_call):
+        """
+        Record that the attempt got a concurrency slot
+
+        Args:
+            end_call (callable): Frees the slot
+        """
+        self._register(end_call=end_call)
+
+    def sent(self, abort):
+        """
+        Record that the attempt sent its request
+
+        Args:
+            abort (callable): Aborts the exchange from another thread
+        """
+        self._register(abort=abort)
+
+    def finish(self):
+        """
+        Stop accepting cut-offs once the stream was read, raising _HedgeLost if it was cut off meanwhile
+        """
+        with self._lock:
+            self._abort = None
+            if self.lost:
+                raise _HedgeLost()
+
+    def cut_off(self):
+        """
+        Cut the attempt off from the winning one, closing its connection and freeing its slot
+        """
+        with self._lock:
+            self.lost = True
+            if self._abort is not None:
+                self._abort()
+            end_call = self._end_call
+        
+        if end_call is not None:
+            end_call()
+
 
 class DeepSeekAPI:
     """
     Class to handle all Deep Seek API interactions
     """
 
-    def __init__(self, api_key, base_url, model):
+    def __init__(self, api_key, base_url, model, ssl_context=None, pool_size=4, idle_timeout=60, max_concurrent=8,
+                 timeout=120, min_timeout=10, breaker=None, latency=None, hedging=None, generation_profiles=None):
         """
         Initialize the DeepSeekAPI with API credentials
         
+        One instance is meant to be shared by every component calling the API, so
+        they share its connections, its concurrency limit and its statistics
+        
         Args:
             api_key (str): Deep Seek API key
             base_url (str): Base URL for API calls
             model (str): Model to use for API calls
+            ssl_context (ssl.SSLContext, optional): SSL context shared with other clients,
+                one ignoring certificate verification is created if not given
+            pool_size (int, optional): Number of keep-alive connections kept open
+            idle_timeout (float, optional): Seconds before an idle connection is dropped
+            max_concurrent (int, optional): Most API calls in flight at once, further calls wait
+            timeout (float, optional): Socket timeout of API calls in seconds, used until enough
+                latencies are known and as the upper bound of the adaptive timeout
+            min_timeout (float, optional): Lower bound of the adaptive timeout in seconds
+            breaker (CircuitBreaker, optional): Breaker failing calls fast while the API is down
+            latency (LatencyTracker, optional): Latencies the adaptive timeout is derived from
+            hedging (HedgingPolicy, optional): Send a second request when a call is slow, racing the first
+            generation_profiles (dict, optional): Settings per resource type replacing those of
+                GENERATION_PROFILES, e.g. {"Sample Paper": {"max_tokens": 2048}}
         """
         self.api_key = api_key
         self.base_url = base_url
         self.model = model
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        
+        # While the breaker is open calls fail fast and the caller uses fallback content
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.latency = latency if latency is not None else LatencyTracker()
+        
+        # Request settings per resource type, with the configured settings on top of the defaults
+        self.generation_profiles = {
+            resource_type: {**DEFAULT_GENERATION_PROFILE, **GENERATION_PROFILES.get(resource_type, {}), **overrides}
+            for resource_type, overrides in (generation_profiles or {}).items()
+        }
+        for resource_type, profile in GENERATION_PROFILES.items():
+            self.generation_profiles.setdefault(resource_type, dict(DEFAULT_GENERATION_PROFILE, **profile))
+        
+        # Slow calls race a hedge, streamed calls are hedged on the time to their first content
+        self.hedging = hedging
+        self.first_token_latency = LatencyTracker()
         
         # Create SSL context that ignores certificate verification
-        # This is sometimes needed for API calls in certain environments
-        self.ssl_context = ssl.create_default_context()
-        self.ssl_context.check_hostname = False
-        self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.ssl_context = ssl_context if ssl_context is not None else create_insecure_ssl_context()
+        
+        # Persistent connections so each call skips the TCP and TLS handshake
+        self.request_path = urllib.parse.urlsplit(base_url).path or "/"
+        self.pool = HTTPConnectionPool(
+            base_url,
+            pool_size=pool_size,
+            idle_timeout=idle_timeout,
+            ssl_context=self.ssl_context
+        )
+        
+        # Event-loop bound pool and semaphore for the async calls, created on first use
+        self.pool_settings = {"pool_size": pool_size, "idle_timeout": idle_timeout}
+        self._async_pool = None
+        self._async_slots = None
+        
+        # Calls beyond max_concurrent wait for a slot instead of piling onto the API
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        
+        # Call statistics shared by every component using this client
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "streamed": 0,
+            "failures": 0,
+            "retries": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "latency": 0.0,
+            "slot_wait": 0.0,
+            "max_slot_wait": 0.0
+        }
+        
+        # Tokens used per resource type, to right-size the generation profiles
+        self.token_usage = {}
         
         # Fallback content for when API fails
         self.fallback_content = {
@@ -49,47 +255,695 @@ class DeepSeekAPI:
         }
     
 
-    def generate_content(self, prompt, max_retries=1, retry_delay=2):
+    def generation_profile(self, resource_type):
         """
-        Generate content using Deep Seek API
+        Get the request settings of a resource type
+        
+        Args:
+            resource_type (str): Type of resource, None for free-form prompts
+            
+        Returns:
+            dict: max_tokens, temperature and stop sequences
+        """
+        return self.generation_profiles.get(resource_type, DEFAULT_GENERATION_PROFILE)
+    
+    def _build_request(self, prompt, stream=False, model=None, resource_type=None):
+        """
+        Build the request body and headers for a completion call
+        
+        Args:
+            prompt (str): Prompt to send
+            stream (bool, optional): Whether to request a server-sent event stream
+            model (str, optional): Model to ask instead of the client's model
+            resource_type (str, optional): Type of resource, selects the generation profile
+            
+        Returns:
+            tuple: (encoded payload, headers)
         """
+        profile = self.generation_profile(resource_type)
         payload = {
-            "model": self.model,
+            "model": model or self.model,
             "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.5,
-            "max_tokens": 2048
+            "temperature": profile["temperature"],
+            "max_tokens": profile["max_tokens"]
         }
         
+        if profile["stop"]:
+            payload["stop"] = profile["stop"]
+        
+        if stream:
+            payload["stream"] = True
+            # Ask for the token counts in the last event, as non-streamed responses carry them
+            payload["stream_options"] = {"include_usage": True}
+        
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
         
-        data = json.dumps(payload).encode('utf-8')
+        return json.dumps(payload).encode('utf-8'), headers
+    
+    def _call_started(self, waited, streamed):
+        """
+        Record a call that got a concurrency slot
+        
+        Args:
+            waited (float): Seconds spent waiting for the slot
+            streamed (bool): Whether the call streams its response
+        """
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            if streamed:
+                self.stats["streamed"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            self.stats["slot_wait"] += waited
+            self.stats["max_slot_wait"] = max(self.stats["max_slot_wait"], waited)
+    
+    def _call_finished(self, started):
+        """
+        Record the end of a call
+        
+        Args:
+            started (float): Monotonic time the call got its slot
+        """
+        with self._stats_lock:
+            self.stats["in_flight"] -= 1
+            self.stats["latency"] += time.monotonic() - started
+    
+    def _count(self, name):
+        """
+        Increase a call counter
+        
+        Args:
+            name (str): Counter name
+        """
+        with self._stats_lock:
+            self.stats[name] += 1
+    
+    def _call_timeout(self):
+        """
+        Get the timeout of the next call from the latencies seen so far
+        
+        Returns:
+            float: Timeout in seconds
+        """
+        return self.latency.adaptive_timeout(self.timeout, self.min_timeout)
+    
+    def _call_succeeded(self, seconds):
+        """
+        Record a successful call with the breaker and the latency tracker
+        
+        Args:
+            seconds (float): Call duration
+        """
+        self.breaker.record_success()
+        self.latency.record(seconds)
+    
+    def _call_failed(self):
+        """
+        Record a failed call with the breaker
+        
+        Returns:
+            bool: True if another attempt may be made
+        """
+        self._count("failures")
+        self.breaker.record_failure()
+        return self.breaker.state == CircuitBreaker.CLOSED
+    
+    def _retry_failed_call(self, error, attempt, max_retries):
+        """
+        Record a failed call and decide whether to retry it straight away
+        
+        Retries are not delayed, the caller holds a concurrency slot and an
+        admission slot that would sit idle meanwhile. A timed out call is not
+        retried: it already used the whole adaptive timeout, and a backend that
+        keeps failing opens the breaker so the next calls fail fast instead.
+        
+        Args:
+            error (Exception): Error the call failed with
+            attempt (int): Number of the attempt that failed, from 0
+            max_retries (int): Most retries allowed
+            
+        Returns:
+            bool: True if the call should be made again
+        """
+        if not self._call_failed() or attempt >= max_retries or isinstance(error, TimeoutError):
+            return False
+        
+        self._count("retries")
+        print("Retrying...")
+        return True
+    
+    @contextlib.contextmanager
+    def _call_slot(self, streamed=False):
+        """
+        Hold one of the max_concurrent call slots for the duration of a call
+        
+        The breaker is checked once the slot is granted, so calls queued behind
+        the ones that opened it fail fast too
+        
+        Args:
+            streamed (bool, optional): Whether the call streams its response
+            
+        Yields:
+            callable: Ends the call and frees its slot, from any thread, before the with block exits
+            
+        Raises:
+            CircuitOpenError: If the breaker rejects the call
+        """
+        queued = time.monotonic()
+        self._slots.acquire()
+        ended = threading.Lock()
+        started = None
+        
+        def end_call():
+            # Runs once, from the call itself or from the attempt that won a hedged race against it
+            if not ended.acquire(blocking=False):
+                return
+            if started is not None:
+                self._call_finished(started)
+            self._slots.release()
+        
+        try:
+            if not self.breaker.allow():
+                raise CircuitOpenError("API circuit open")
+            
+            started = time.monotonic()
+            self._call_started(started - queued, streamed)
+            yield end_call
+        finally:
+            end_call()
+    
+    @contextlib.asynccontextmanager
+    async def _call_slot_async(self):
+        """
+        Async counterpart of _call_slot, waiting on the event loop for a slot
+        """
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrent)
+        
+        queued = time.monotonic()
+        async with self._async_slots:
+            if not self.breaker.allow():
+                raise CircuitOpenError("API circuit open")
+            
+            started = time.monotonic()
+            self._call_started(started - queued, False)
+            try:
+                yield
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            finally:
+                self._call_finished(started)
+    
+    def _record_usage(self, resource_type, usage, finish_reason):
+        """
+        Record the tokens a completion used
+        
+        Args:
+            resource_type (str): Type of resource, None for free-form prompts
+            usage (dict): Token counts reported by the API, None if not reported
+            finish_reason (str): Why generation ended, "length" when max_tokens cut it off
+        """
+        resource_type = resource_type or "Other"
+        truncated = finish_reason == "length"
+        if truncated:
+            max_tokens = self.generation_profile(resource_type)["max_tokens"]
+            print(f"⚠️ {resource_type} hit its {max_tokens} token budget, the content is cut off")
+        
+        with self._stats_lock:
+            entry = self.token_usage.get(resource_type)
+            if entry is None:
+                entry = self.token_usage[resource_type] = {
+                    "calls": 0,
+                    "reported": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "truncated": 0,
+                    "recent": deque(maxlen=TOKEN_USAGE_WINDOW)
+                }
+            
+            entry["calls"] += 1
+            if truncated:
+                entry["truncated"] += 1
+            if usage:
+                completion_tokens = usage.get("completion_tokens") or 0
+                entry["reported"] += 1
+                entry["prompt_tokens"] += usage.get("prompt_tokens") or 0
+                entry["completion_tokens"] += completion_tokens
+                entry["recent"].append(completion_tokens)
+    
+    def _parse_response(self, body, resource_type=None):
+        """
+        Extract and clean the generated text from a completion response
+        
+        Args:
+            body (bytes): Raw response body
+            resource_type (str, optional): Type of resource the token usage is recorded under
+            
+        Returns:
+            str: Cleaned content
+        """
+        response_data = json.loads(body.decode('utf-8'))
+        choice = response_data['choices'][0]
+        content = choice['message']['content']
+        self._record_usage(resource_type, response_data.get('usage'), choice.get('finish_reason'))
+        return self.clean_response(content)
+
+    def generate_content(self, prompt, max_retries=1, resource_type=None):
+        """
+        Generate content using Deep Seek API
+        
+        resource_type selects the generation profile and the token usage statistics
+        """
+        if self.hedging is not None:
+            # Hedged calls are streamed so the attempt that loses the race can be cut off
+            return self.generate_content_stream(
+                prompt, None, max_retries=max_retries, resource_type=resource_type
+            )
+        
+        data, headers = self._build_request(prompt, resource_type=resource_type)
         
         for attempt in range(max_retries + 1):
             try:
-                req = urllib.request.Request(
-                    self.base_url,
-                    data=data,
-                    headers=headers,
-                    method='POST'
-                )
-                with urllib.request.urlopen(req, context=self.ssl_context) as response:
-                    response_data = json.loads(response.read().decode('utf-8'))
-                    content = response_data['choices'][0]['message']['content']
-                    cleaned_content = self.clean_response(content)
-                    return cleaned_content
+                with self._call_slot():
+                    started = time.monotonic()
+                    status, body = self.pool.request("POST", self.request_path, data, headers, self._call_timeout())
+                    elapsed = time.monotonic() - started
+                if status >= 400:
+                    raise HTTPStatusError(status, body.decode('utf-8', 'replace'))
+                content = self._parse_response(body, resource_type)
+            except CircuitOpenError:
+                print("API circuit open. Using fallback content.")
+                return None
             except Exception as e:
                 print(f"API Error: {str(e)}")
-                if attempt < max_retries:
-                    print(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
+                if self._retry_failed_call(e, attempt, max_retries):
+                    continue
+                print("Max retries reached. Using fallback content.")
+                return None
+            
+            self._call_succeeded(elapsed)
+            return content
+        return None
+
+    def generate_content_stream(self, prompt, on_progress, progress_interval=1.0, max_retries=1, resource_type=None):
+        """
+        Generate content using the streaming API, reporting partial content as it arrives
+        
+        Args:
+            prompt (str): Prompt to send
+            on_progress (callable): Called with the cleaned text of all complete lines so far, may be None
+            progress_interval (float, optional): Minimum seconds between progress reports
+            max_retries (int, optional): Retries when the stream fails before any content
+            resource_type (str, optional): Type of resource, selects the generation profile
+            
+        Returns:
+            str: Cleaned content, or None if generation failed
+        """
+        data, headers = self._build_request(prompt, stream=True, resource_type=resource_type)
+        headers["Accept"] = "text/event-stream"
+        
+        hedge_data = None
+        if self.hedging is not None:
+            hedge_data = self._build_request(
+                prompt, stream=True, model=self.hedging.alternate_model, resource_type=resource_type
+            )[0]
+        
+        for attempt in range(max_retries + 1):
+            parts = []
+            abandoned = False
+            last_report = 0.0
+            reported_length = 0
+            
+            def on_delta(delta):
+                nonlocal abandoned, last_report, reported_length
+                parts.append(delta)
+                
+                # Only clean complete lines, and no more often than progress_interval
+                if on_progress is None or "\n" not in delta or time.monotonic() - last_report < progress_interval:
+                    return
+                raw = "".join(parts)
+                complete = raw[:raw.rfind("\n")]
+                if len(complete) > reported_length:
+                    try:
+                        on_progress(self.clean_response(complete))
+                    except Exception:
+                        # The caller gave up on the content, which says nothing about the API
+                        abandoned = True
+                        raise
+                    reported_length = len(complete)
+                    last_report = time.monotonic()
+            
+            try:
+                if self.hedging is not None:
+                    elapsed = self._stream_hedged(data, hedge_data, headers, on_delta, resource_type)
                 else:
-                    print("Max retries reached. Using fallback content.")
+                    elapsed = self._stream_call(data, headers, on_delta, resource_type=resource_type)
+            except CircuitOpenError:
+                print("API circuit open. Using fallback content.")
+                return None
+            except Exception as e:
+                if abandoned:
+                    self.breaker.release()
+                    print(f"Streaming stopped: {str(e)}")
                     return None
+                print(f"API Error: {str(e)}")
+                if self._retry_failed_call(e, attempt, 0 if parts else max_retries):
+                    continue
+                print("Streaming failed. Using fallback content.")
+                return None
+            
+            self._call_succeeded(elapsed)
+            return self.clean_response("".join(parts))
         return None
+    
+    def _stream_call(self, data, headers, on_delta, attempt=None, resource_type=None):
+        """
+        Make one streamed completion call
+        
+        Args:
+            data (bytes): Encoded request payload
+            headers (dict): Request headers
+            on_delta (callable): Called with each piece of generated content
+            attempt (_HedgeAttempt, optional): Attempt of a hedged call, the winning attempt
+                cuts this one off, which fails it with _HedgeLost or a connection error
+            resource_type (str, optional): Type of resource the token usage is recorded under
+            
+        Returns:
+            float: Seconds the call took
+        """
+        stop = None
+        on_send = None
+        
+        with self._call_slot(streamed=True) as end_call:
+            if attempt is not None:
+                attempt.holding(end_call)
+                stop = lambda: attempt.lost
+                on_send = attempt.sent
+            
+            started = time.monotonic()
+            with self.pool.stream("POST", self.request_path, data, headers, self._call_timeout(), on_send) as response:
+                if response.status >= 400:
+                    raise HTTPStatusError(response.status, response.read().decode('utf-8', 'replace'))
+                
+                first_token = True
+                details = {}
+                for delta in self._iter_stream_deltas(response, stop, details):
+                    if first_token:
+                        self.first_token_latency.record(time.monotonic() - started)
+                        first_token = False
+                    on_delta(delta)
+                
+                # Read the end of the stream so the connection can be reused
+                response.read()
+                if attempt is not None:
+                    attempt.finish()
+            
+            self._record_usage(resource_type, details.get("usage"), details.get("finish_reason"))
+            return time.monotonic() - started
+    
+    def _stream_hedged(self, data, hedge_data, headers, on_delta, resource_type=None):
+        """
+        Make a streamed call that is hedged when its first content is late
+        
+        If the call has produced no content after the hedging delay, and the
+        budget allows, an identical request races it. The first attempt to
+        produce content streams to on_delta and cuts the other one off, which
+        closes its connection and frees its slot straight away, as the async
+        path does by cancelling the losing task.
+        
+        Args:
+            data (bytes): Encoded request payload
+            hedge_data (bytes): Encoded payload of the hedge
+            headers (dict): Request headers
+            on_delta (callable): Called with each piece of generated content of the winning attempt
+            resource_type (str, optional): Type of resource the token usage is recorded under
+            
+        Returns:
+            float: Seconds the winning attempt took
+        """
+        self.hedging.record_call()
+        delay = self.hedging.delay(self.first_token_latency)
+        if delay is None:
+            return self._stream_call(data, headers, on_delta, resource_type=resource_type)
+        
+        condition = threading.Condition()
+        winner = None
+        outcomes = {}
+        contenders = [_HedgeAttempt(), _HedgeAttempt()]
+        
+        def run(index, body):
+            def claim(delta):
+                nonlocal winner
+                with condition:
+                    won = winner is None
+                    if won:
+                        winner = index
+                        condition.notify_all()
+                    elif winner != index:
+                        raise _HedgeLost()
+                if won:
+                    contenders[1 - index].cut_off()
+                on_delta(delta)
+            
+            try:
+                outcome = (self._stream_call(body, headers, claim, contenders[index], resource_type=resource_type), None)
+            except Exception as e:
+                if contenders[index].lost and not isinstance(e, CircuitOpenError):
+                    # Cut off by the winner, which says nothing about the API
+                    self.breaker.release()
+                outcome = (None, e)
+            
+            with condition:
+                outcomes[index] = outcome
+                condition.notify_all()
+        
+        def start(index, body):
+            threading.Thread(target=run, args=(index, body), name=f"llm-attempt-{index}", daemon=True).start()
+        
+        start(0, data)
+        attempts = 1
+        
+        with condition:
+            condition.wait_for(lambda: winner is not None or outcomes, delay)
+            if winner is None and not outcomes and self.breaker.state == CircuitBreaker.CLOSED \
+                    and self.hedging.try_hedge():
+                start(1, hedge_data)
+                attempts = 2
+            
+            # Wait for the winner to finish, or for every attempt to fail before producing content
+            condition.wait_for(lambda: winner in outcomes if winner is not None else len(outcomes) == attempts)
+        
+        if winner is None:
+            raise outcomes[0][1]
+        if winner == 1:
+            self.hedging.record_hedge_win()
+        
+        elapsed, error = outcomes[winner]
+        if error is not None:
+            raise error
+        return elapsed
+    
+    def _iter_stream_deltas(self, response, stop=None, details=None):
+        """
+        Yield content deltas from an OpenAI-style server-sent event stream
+        
+        Args:
+            response: File-like HTTP response
+            stop (callable, optional): Checked before every line and at the end of the
+                stream, raising _HedgeLost when it returns True
+            details (dict, optional): Filled with the usage and finish_reason reported by the stream
+            
+        Yields:
+            str: Next piece of generated content
+        """
+        for raw_line in response:
+            if stop is not None and stop():
+                raise _HedgeLost()
+            
+            line = raw_line.decode('utf-8').strip()
+            
+            # Blank lines separate events and ':' lines are keep-alive comments
+            if not line.startswith("data:"):
+                continue
+                
+            event = line[5:].strip()
+            if event == "[DONE]":
+                return
+                
+            chunk = json.loads(event)
+            if "error" in chunk:
+                raise RuntimeError(f"Stream error: {chunk['error']}")
+                
+            choices = chunk.get("choices") or [{}]
+            if details is not None:
+                if chunk.get("usage"):
+                    details["usage"] = chunk["usage"]
+                if choices[0].get("finish_reason"):
+                    details["finish_reason"] = choices[0]["finish_reason"]
+            
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+        
+        # An aborted response without chunked encoding just ends early
+        if stop is not None and stop():
+            raise _HedgeLost()
 
+    async def generate_content_async(self, prompt, max_retries=1, resource_type=None):
+        """
+        Async counterpart of generate_content, waiting on the event loop instead of a thread
+        """
+        data, headers = self._build_request(prompt, resource_type=resource_type)
+        
+        hedge_data = None
+        if self.hedging is not None:
+            hedge_data = self._build_request(prompt, model=self.hedging.alternate_model, resource_type=resource_type)[0]
+        
+        if self._async_pool is None:
+            self._async_pool = AsyncHTTPConnectionPool(self.base_url, ssl_context=self.ssl_context, **self.pool_settings)
+        
+        for attempt in range(max_retries + 1):
+            try:
+                if self.hedging is not None:
+                    body, elapsed = await self._request_hedged_async(data, hedge_data, headers)
+                else:
+                    body, elapsed = await self._request_async(data, headers)
+                content = self._parse_response(body, resource_type)
+            except CircuitOpenError:
+                print("API circuit open. Using fallback content.")
+                return None
+            except Exception as e:
+                print(f"API Error: {str(e)}")
+                if self._retry_failed_call(e, attempt, max_retries):
+                    continue
+                print("Max retries reached. Using fallback content.")
+                return None
+            
+            self._call_succeeded(elapsed)
+            return content
+        return None
+    
+    async def _request_async(self, data, headers):
+        """
+        Make one completion call on the event loop
+        
+        Args:
+            data (bytes): Encoded request payload
+            headers (dict): Request headers
+            
+        Returns:
+            tuple: (response body, seconds the call took)
+        """
+        async with self._call_slot_async():
+            started = time.monotonic()
+            status, body = await self._async_pool.request("POST", self.request_path, data, headers, self._call_timeout())
+            elapsed = time.monotonic() - started
+        
+        if status >= 400:
+            raise HTTPStatusError(status, body.decode('utf-8', 'replace'))
+        return body, elapsed
+    
+    async def _request_hedged_async(self, data, hedge_data, headers):
+        """
+        Make a completion call that is hedged when it is slow
+        
+        If the call has not answered after the hedging delay, and the budget
+        allows, an identical request races it. The first successful answer is
+        used and the other request is cancelled, which closes its connection.
+        
+        Args:
+            data (bytes): Encoded request payload
+            hedge_data (bytes): Encoded payload of the hedge
+            headers (dict): Request headers
+            
+        Returns:
+            tuple: (response body, seconds the winning call took)
+        """
+        self.hedging.record_call()
+        delay = self.hedging.delay(self.latency)
+        primary = asyncio.ensure_future(self._request_async(data, headers))
+        
+        if delay is None:
+            return await primary
+        
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or self.breaker.state != CircuitBreaker.CLOSED or not self.hedging.try_hedge():
+            return await primary
+        
+        hedge = asyncio.ensure_future(self._request_async(hedge_data, headers))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedging.record_hedge_win()
+                        return task.result()
+            
+            # Both attempts failed
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self):
+        """
+        Get call and connection statistics
+        
+        Returns:
+            dict: Call counters, concurrency and latency figures with the connection pool stats
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+        
+        stats["avg_latency"] = stats["latency"] / stats["requests"] if stats["requests"] else 0.0
+        stats["avg_slot_wait"] = stats["slot_wait"] / stats["requests"] if stats["requests"] else 0.0
+        stats["connections"] = dict(self.pool.stats)
+        stats["breaker"] = self.breaker.get_stats()
+        stats["latencies"] = self.latency.get_stats()
+        stats["timeout"] = self._call_timeout()
+        stats["first_token_latencies"] = self.first_token_latency.get_stats()
+        if self.hedging is not None:
+            stats["hedging"] = self.hedging.get_stats()
+        stats["tokens"] = self.get_token_stats()
+        return stats
+    
+    def get_token_stats(self):
+        """
+        Get token usage per resource type next to its budget
+        
+        Returns:
+            dict: Per resource type the calls, truncated calls, average, p50, p90 and
+                largest completion tokens over the recent window, and max_tokens
+        """
+        stats = {}
+        with self._stats_lock:
+            for resource_type, entry in self.token_usage.items():
+                recent = sorted(entry["recent"])
+                stats[resource_type] = {
+                    "calls": entry["calls"],
+                    "truncated": entry["truncated"],
+                    "prompt_tokens": entry["prompt_tokens"],
+                    "completion_tokens": entry["completion_tokens"],
+                    "avg_completion_tokens": entry["completion_tokens"] / entry["reported"] if entry["reported"] else None,
+                    "p50_completion_tokens": recent[len(recent) // 2] if recent else None,
+                    "p90_completion_tokens": recent[min(len(recent) - 1, len(recent) * 9 // 10)] if recent else None,
+                    "max_completion_tokens": recent[-1] if recent else None,
+                    "max_tokens": self.generation_profile(resource_type)["max_tokens"]
+                }
+        return stats
+    
+    def close(self):
+        """
+        Close pooled connections
+        """
+        self.pool.close()
+    
     def clean_response(self, content):
         """
         Clean the API response from unwanted formatting
@@ -102,94 +956,105 @@ class DeepSeekAPI:
         """
         if not content:
             return "No content was generated. Please try again."
-            
-        # Print original content for debugging
-        print(f"Original content length: {len(content)}")
-        print(f"Original content preview: {content[:200]}...")
         
-        # Enhanced cleaning process
+        # Guarded steps are skipped when the characters they act on are absent,
+        # which avoids most passes on typical completions
         
         # Step 1: Remove all LaTeX wrappers and commands
-        content = re.sub(r'\\boxed\{(.*?)\}', r'\1', content, flags=re.DOTALL)
-        content = re.sub(r'\\begin\{.*?\}(.*?)\\end\{.*?\}', r'\1', content, flags=re.DOTALL)
-        content = re.sub(r'\\[a-zA-Z]+(\{.*?\}|\[.*?\])?', '', content)
+        if '\\' in content:
+            content = _BOXED_PATTERN.sub(r'\1', content)
+            content = _ENVIRONMENT_PATTERN.sub(r'\1', content)
+            content = _LATEX_COMMAND_PATTERN.sub('', content)
         
         # Step 2: Remove code blocks but keep the content inside
-        content = re.sub(r'```(?:json|python|markdown|latex|math)?\n?(.*?)```', r'\1', content, flags=re.DOTALL)
+        if '```' in content:
+            content = _CODE_BLOCK_PATTERN.sub(r'\1', content)
         
         # Step 3: Remove Markdown formatting characters while preserving structure
-        content = re.sub(r'\*\*(.*?)\*\*', r'\1', content)
-        content = re.sub(r'\*(.*?)\*', r'\1', content)
-        content = re.sub(r'__(.*?)__', r'\1', content)
-        content = re.sub(r'_(.*?)_', r'\1', content)
+        if '*' in content:
+            content = _BOLD_PATTERN.sub(r'\1', content)
+            content = _ITALIC_PATTERN.sub(r'\1', content)
+        if '_' in content:
+            content = _UNDERLINE_PATTERN.sub(r'\1', content)
+            content = _UNDERSCORE_PATTERN.sub(r'\1', content)
         
         # Step 4: Clean up LaTeX and special characters
-        content = content.replace('\\\\', '')
-        
         # Step 5: Fix common formatting issues
-        content = re.sub(r'(\d+)\\\. ', r'\1. ', content)
+        if '\\' in content:
+            content = content.replace('\\\\', '')
+            content = _ESCAPED_NUMBER_PATTERN.sub('', content)
         
         # Step 6: Standardize bullet points
-        content = re.sub(r'^\s*[-•●◦○*]\s+', '• ', content, flags=re.MULTILINE)
+        content = _BULLET_PATTERN.sub('• ', content)
         
         # Step 7: Remove excessive whitespace
-        content = re.sub(r'\n{3,}', '\n\n', content)
+        content = _BLANK_LINES_PATTERN.sub('\n\n', content)
         content = '\n'.join([line.strip() for line in content.split('\n')])
         
         # Step 8: Fix spacing after punctuation
-        content = re.sub(r'([.,:;!?])([a-zA-Z])', r'\1 \2', content)
+        content = _PUNCTUATION_SPACING_PATTERN.sub(r'\1 \2', content)
         
         # Step 9: Standardize section headers
-        content = re.sub(r'^([A-Z][A-Z\s]+)$', r'\n\1\n', content, flags=re.MULTILINE)
-        
-        # Step 10: Remove non-ASCII characters
-        content = re.sub(r'[^\x00-\x7F]+', '', content)
-        
-        # Step 11: Fix double spaces
-        content = re.sub(r' {2,}', ' ', content)
-        
-        # Step 12: Ensure proper spacing around list items
-        content = re.sub(r'\n(\d+\.)', r'\n\n\1', content)
-        content = re.sub(r'\n(•)', r'\n\n\1', content)
-        
-        # Step 13: Remove any remaining LaTeX artifacts
-        content = content.replace('\\boxed', '')
-        content = content.replace('\\text', '')
-        content = content.replace('\\frac', '')
-        content = content.replace('\\sqrt', 'sqrt')
-        content = content.replace('\\sum', 'sum')
-        content = content.replace('\\int', 'integral')
-        content = content.replace('\\infty', 'infinity')
-        content = content.replace('\\approx', '≈')
-        content = content.replace('\\times', '×')
-        content = content.replace('\\div', '÷')
-        content = content.replace('\\pm', '±')
-        content = content.replace('\\cdot', '·')
-        content = content.replace('\\ldots', '...')
-        content = content.replace('\\rightarrow', '→')
-        content = content.replace('\\leftarrow', '←')
-        
-        # Step 14: Clean up remaining braces
-        content = re.sub(r'\{([^{}]*)\}', r'\1', content)
-        content = re.sub(r'\[([^\[\]]*)\]', r'\1', content)
-        
-        # Step 15: Final cleanup of double spaces or excessive newlines
-        content = re.sub(r' {2,}', ' ', content)
-        content = re.sub(r'\n{3,}', '\n\n', content)
+        content = _SECTION_HEADER_PATTERN.sub(r'\n\1\n', content)
+        
+        # Step 10: Remove non-ASCII characters, this also drops the bullets from step 6
+        if not content.isascii():
+            content = content.encode('ascii', 'ignore').decode('ascii')
+        
+        # Step 11: Ensure proper spacing around list items
+        content = _NUMBERED_ITEM_PATTERN.sub(r'\n\n\1', content)
+        
+        # Step 12: Remove any remaining LaTeX artifacts
+        if '\\' in content:
+            for token, replacement in _LATEX_REPLACEMENTS:
+                content = content.replace(token, replacement)
+        
+        # Step 13: Clean up remaining braces
+        if '{' in content:
+            content = _BRACES_PATTERN.sub(r'\1', content)
+        if '[' in content:
+            content = _BRACKETS_PATTERN.sub(r'\1', content)
+        
+        # Step 14: Final cleanup of double spaces or excessive newlines, none of the
+        # steps above depend on runs of spaces so they are collapsed only once here
+        content = _MULTIPLE_SPACES_PATTERN.sub(' ', content)
+        content = _BLANK_LINES_PATTERN.sub('\n\n', content)
 
         content = content.replace("#"," ")
         return content
 
-    def generate_study_material(self, class_num, subject, chapter, resource_type, difficulty=None, subsubject=None):
+    def generate_study_material(self, class_num, subject, chapter, resource_type, difficulty=None, subsubject=None, on_progress=None, use_fallback=True):
         """
         Generate study material based on parameters
+        
+        When on_progress is given the response is streamed and on_progress is called
+        with the cleaned partial content as it arrives. With use_fallback=False None is
+        returned instead of fallback content when generation fails.
         """
         prompt = self._build_prompt(class_num, subject, chapter, resource_type, difficulty, subsubject)
         print(f"Sending prompt to API: {prompt[:200]}...")
         
-        content = self.generate_content(prompt)
+        if on_progress is not None:
+            content = self.generate_content_stream(prompt, on_progress, resource_type=resource_type)
+        else:
+            content = self.generate_content(prompt, resource_type=resource_type)
         
-        if not content:
+        if not content and use_fallback:
+            fallback_method = self.fallback_content.get(resource_type, self._generate_fallback_generic)
+            content = fallback_method(class_num, subject, chapter, difficulty, subsubject)
+        
+        return content
+
+    async def generate_study_material_async(self, class_num, subject, chapter, resource_type, difficulty=None, subsubject=None, use_fallback=True):
+        """
+        Async counterpart of generate_study_material
+        """
+        prompt = self._build_prompt(class_num, subject, chapter, resource_type, difficulty, subsubject)
+        print(f"Sending prompt to API: {prompt[:200]}...")
+        
+        content = await self.generate_content_async(prompt, resource_type=resource_type)
+        
+        if not content and use_fallback:
             fallback_method = self.fallback_content.get(resource_type, self._generate_fallback_generic)
             content = fallback_method(class_num, subject, chapter, difficulty, subsubject)
         
@@ -4,22 +4,27 @@ This module handles error handling and message splitting for the Study Sphere AI
 """
 
 import traceback
-import time
+
+# Caption of content delivered as a document
+DOCUMENT_CAPTION = "📄 <b>Your study material is attached</b>\n\nOpen the file to read the complete content."
 
 class ErrorHandler:
     """
     Class to handle errors and message splitting for the Study Sphere AI bot
     """
     
-    def __init__(self, telegram_api):
+    def __init__(self, telegram_api, max_chunked_messages=2):
         """
         Initialize the ErrorHandler with the Telegram API
         
         Args:
             telegram_api: Instance of TelegramAPI class
+            max_chunked_messages (int, optional): Most messages a response is split into
+                before it is sent as a document instead
         """
         self.telegram_api = telegram_api
         self.max_message_length = 4096  # Telegram's maximum message length
+        self.max_chunked_messages = max_chunked_messages
     
     def handle_error(self, chat_id, error, error_type="General Error"):
         """
@@ -82,7 +87,7 @@ class ErrorHandler:
         Args:
             chat_id (int): Chat ID to send message to
             text (str): Message text to send
-            reply_markup (dict, optional): Inline keyboard markup
+            reply_markup (dict or str, optional): Inline keyboard markup
             
         Returns:
             bool: True if message was sent successfully, False otherwise
@@ -105,16 +110,12 @@ class ErrorHandler:
                 # Only add reply markup to the last chunk
                 chunk_reply_markup = reply_markup if i == len(chunks) - 1 else None
                 
-                # Send chunk
+                # Send chunk, TelegramAPI queues it until the chat's rate limit allows
                 result = self.telegram_api.send_message(chat_id, chunk, chunk_reply_markup)
                 
                 # If sending fails, return the error
                 if not result.get("ok", False):
                     return result
-                
-                # Small delay between messages to avoid rate limiting
-                if i < len(chunks) - 1:
-                    time.sleep(0.5)
             
             return {"ok": True, "result": "Message sent in multiple parts"}
             
@@ -175,14 +176,16 @@ class ErrorHandler:
         
         return chunks
     
-    def handle_api_response(self, chat_id, response, reply_markup=None):
+    def handle_api_response(self, chat_id, response, reply_markup=None, document_path=None):
         """
         Handle API response and send appropriate message to user
         
         Args:
             chat_id (int): Chat ID to send message to
             response (str): API response
-            reply_markup (dict, optional): Inline keyboard markup
+            reply_markup (dict or str, optional): Inline keyboard markup
+            document_path (str, optional): Text file version of the response, sent instead
+                of the messages when the response would need too many of them
             
         Returns:
             bool: True if response was handled successfully, False otherwise
@@ -194,6 +197,14 @@ class ErrorHandler:
                 self.telegram_api.send_message(chat_id, error_message, reply_markup)
                 return False
             
+            # Long responses go out as one document instead of a run of chunked messages
+            if document_path and len(response) > self.max_message_length:
+                if len(self._split_text(response)) > self.max_chunked_messages:
+                    result = self.telegram_api.send_document(chat_id, document_path, DOCUMENT_CAPTION, reply_markup)
+                    if result.get("ok", False):
+                        return True
+                    print(f"⚠️ Sending {document_path} as a document failed, sending messages instead")
+            
             # Split and send the response
             return self.split_and_send_message(chat_id, response, reply_markup)
             
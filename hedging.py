@@ -0,0 +1,99 @@
+"""
+Study Sphere AI - Hedging Module
+This module decides when a slow LLM call gets a second, identical request racing
+it, keeping the extra requests within a budget relative to normal traffic
+"""
+
+import threading
+
+
+class HedgingPolicy:
+    """
+    Class to decide when and how often a call is hedged
+
+    Every call earns budget_ratio hedge tokens, up to max_tokens, and every hedge
+    spends one, so hedges stay at most budget_ratio of the calls made plus a
+    small burst. A call is hedged once it has gone unanswered for the chosen
+    latency percentile.
+    """
+
+    def __init__(self, percent=90, budget_ratio=0.1, max_tokens=5, min_delay=1.0, alternate_model=None):
+        """
+        Initialize the HedgingPolicy
+
+        Args:
+            percent (float): Latency percentile after which a call is hedged
+            budget_ratio (float): Most hedges per call made
+            max_tokens (float): Most hedges that can be saved up for a burst
+            min_delay (float): Shortest wait before hedging, in seconds
+            alternate_model (str, optional): Model the hedge is sent to, the call's own model if not given
+        """
+        self.percent = percent
+        self.budget_ratio = budget_ratio
+        self.max_tokens = max_tokens
+        self.min_delay = min_delay
+        self.alternate_model = alternate_model
+
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0}
+
+    def delay(self, latency):
+        """
+        Get how long a call waits before it is hedged
+
+        Args:
+            latency (LatencyTracker): Latencies of the quantity being raced
+
+        Returns:
+            float: Seconds to wait, None if too few latencies are known to hedge
+        """
+        seconds = latency.percentile(self.percent)
+        if seconds is None:
+            return None
+        return max(self.min_delay, seconds)
+
+    def record_call(self):
+        """
+        Count a call that may be hedged, adding to the hedge budget
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            self._tokens = min(self.max_tokens, self._tokens + self.budget_ratio)
+
+    def try_hedge(self):
+        """
+        Spend budget on a hedge
+
+        Returns:
+            bool: True if the hedge may be sent
+        """
+        with self._lock:
+            if self._tokens < 1:
+                self.stats["over_budget"] += 1
+                return False
+
+            self._tokens -= 1
+            self.stats["hedged"] += 1
+            return True
+
+    def record_hedge_win(self):
+        """
+        Count a hedge that answered before the call it raced
+        """
+        with self._lock:
+            self.stats["hedge_wins"] += 1
+
+    def get_stats(self):
+        """
+        Get hedging statistics
+
+        Returns:
+            dict: Call, hedge, hedge win and over-budget counters with the share of calls hedged
+        """
+        with self._lock:
+            stats = dict(self.stats)
+
+        stats["hedge_rate"] = stats["hedged"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
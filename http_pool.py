@@ -0,0 +1,468 @@
+"""
+Study Sphere AI - HTTP Connection Pool Module
+This module keeps persistent HTTP/1.1 keep-alive connections to a single host so
+API calls can reuse an open TLS session instead of paying a new handshake each time
+"""
+
+import asyncio
+import contextlib
+import functools
+import http.client
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+
+# Errors raised when a kept-alive connection was closed by the server while idle
+RECONNECT_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+class HTTPStatusError(Exception):
+    """
+    Raised when the server answers with an HTTP error status
+    """
+
+    def __init__(self, code, body):
+        """
+        Initialize the error with the response status and body
+
+        Args:
+            code (int): HTTP status code
+            body (str): Decoded response body
+        """
+        super().__init__(f"HTTP Error {code}: {http.client.responses.get(code, 'Unknown')}")
+        self.code = code
+        self.body = body
+
+
+def create_insecure_ssl_context():
+    """
+    Create an SSL context that ignores certificate verification
+
+    Returns:
+        ssl.SSLContext: SSL context used for API calls
+    """
+    # This is sometimes needed for API calls in certain environments
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _shutdown_socket(sock):
+    """
+    Shut a socket down from another thread, so a read blocked on it fails at once
+
+    Args:
+        sock (socket.socket): Socket of a connection in use
+    """
+    try:
+        # The plain socket call, SSLSocket.shutdown would drop the TLS state under the reading thread
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class HTTPConnectionPool:
+    """
+    Class to hold a pool of persistent keep-alive connections to one host
+    """
+
+    def __init__(self, base_url, pool_size=4, idle_timeout=60, max_reconnects=1, ssl_context=None):
+        """
+        Initialize the HTTPConnectionPool
+
+        Args:
+            base_url (str): Scheme and host of the server, e.g. https://api.telegram.org
+            pool_size (int): Maximum number of idle connections kept open
+            idle_timeout (float): Seconds after which an idle connection is discarded
+            max_reconnects (int): Times a request is retried on a fresh connection
+                when a reused connection turns out to be reset
+            ssl_context (ssl.SSLContext, optional): SSL context for HTTPS connections
+        """
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.max_reconnects = max_reconnects
+        self.ssl_context = ssl_context
+
+        # Idle connections as (connection, last_used) pairs, most recent last
+        self._idle = []
+        self._lock = threading.Lock()
+
+        # Connection statistics
+        self.stats = {"created": 0, "reused": 0, "reconnects": 0}
+
+    def _new_connection(self, timeout):
+        """
+        Open a new connection to the host
+
+        Args:
+            timeout (float): Socket timeout in seconds
+
+        Returns:
+            http.client.HTTPConnection: New connection
+        """
+        with self._lock:
+            self.stats["created"] += 1
+
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout):
+        """
+        Take an idle connection from the pool or open a new one
+
+        Args:
+            timeout (float): Socket timeout in seconds
+
+        Returns:
+            tuple: (connection, reused)
+        """
+        now = time.monotonic()
+        expired = []
+        conn = None
+
+        with self._lock:
+            while self._idle:
+                candidate, last_used = self._idle.pop()
+                if now - last_used > self.idle_timeout:
+                    expired.append(candidate)
+                    continue
+                conn = candidate
+                self.stats["reused"] += 1
+                break
+
+        for stale in expired:
+            stale.close()
+
+        if conn is None:
+            return self._new_connection(timeout), False
+
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn):
+        """
+        Return a connection to the pool, closing it if the pool is full
+
+        Args:
+            conn (http.client.HTTPConnection): Connection to return
+        """
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+
+        conn.close()
+
+    def _send(self, method, path, body, headers, timeout, on_send=None):
+        """
+        Send a request over a pooled connection and read the response headers
+
+        Args:
+            method (str): HTTP method
+            path (str): Request path including any query string
+            body (bytes or callable): Request body, or a function returning an iterable of chunks
+            headers (dict): Request headers
+            timeout (float): Socket timeout in seconds
+            on_send (callable, optional): Called once the request is sent with a function
+                that aborts the exchange from another thread
+
+        Returns:
+            tuple: (connection, http.client.HTTPResponse)
+        """
+        attempt = 0
+
+        while True:
+            conn, reused = self._acquire(timeout)
+            try:
+                conn.request(method, path, body=body() if callable(body) else body, headers=headers or {})
+                if on_send is not None:
+                    on_send(functools.partial(_shutdown_socket, conn.sock))
+                return conn, conn.getresponse()
+            except RECONNECT_ERRORS:
+                conn.close()
+                # A reused connection may have been closed by the server while idle
+                if reused and attempt < self.max_reconnects:
+                    attempt += 1
+                    with self._lock:
+                        self.stats["reconnects"] += 1
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+    def _finish(self, conn, response):
+        """
+        Return a connection to the pool if its response was read to the end
+
+        Args:
+            conn (http.client.HTTPConnection): Connection the response came on
+            response (http.client.HTTPResponse): Response of the request
+        """
+        if response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            self._release(conn)
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        Send a request over a pooled connection and read the full response
+
+        Args:
+            method (str): HTTP method
+            path (str): Request path including any query string
+            body (bytes or callable, optional): Request body, or a function returning an
+                iterable of byte chunks to stream, called again if the request is retried
+            headers (dict, optional): Request headers, must give Content-Length for a streamed body
+            timeout (float, optional): Socket timeout in seconds
+
+        Returns:
+            tuple: (status, body bytes)
+        """
+        conn, response = self._send(method, path, body, headers, timeout)
+        try:
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+
+        self._finish(conn, response)
+        return response.status, data
+
+    @contextlib.contextmanager
+    def stream(self, method, path, body=None, headers=None, timeout=None, on_send=None):
+        """
+        Send a request over a pooled connection and read the response incrementally
+
+        The connection goes back to the pool if the response was read to the end,
+        and is closed if the caller stopped early
+
+        Args:
+            method (str): HTTP method
+            path (str): Request path including any query string
+            body (bytes or callable, optional): Request body, as for request
+            headers (dict, optional): Request headers
+            timeout (float, optional): Socket timeout in seconds
+            on_send (callable, optional): Called once the request is sent with a function that
+                aborts the exchange from another thread, failing the reads of the response
+
+        Yields:
+            http.client.HTTPResponse: Response to read from
+        """
+        conn, response = self._send(method, path, body, headers, timeout, on_send)
+        try:
+            yield response
+        except BaseException:
+            conn.close()
+            raise
+
+        self._finish(conn, response)
+
+    def close(self):
+        """
+        Close all idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for conn, _ in idle:
+            conn.close()
+
+
+class AsyncHTTPConnectionPool:
+    """
+    Class to hold a pool of persistent keep-alive connections to one host for asyncio code
+    """
+
+    def __init__(self, base_url, pool_size=4, idle_timeout=60, max_reconnects=1, ssl_context=None):
+        """
+        Initialize the AsyncHTTPConnectionPool
+
+        Args:
+            base_url (str): Scheme and host of the server, e.g. https://api.telegram.org
+            pool_size (int): Maximum number of idle connections kept open
+            idle_timeout (float): Seconds after which an idle connection is discarded
+            max_reconnects (int): Times a request is retried on a fresh connection
+                when a reused connection turns out to be reset
+            ssl_context (ssl.SSLContext, optional): SSL context for HTTPS connections
+        """
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.max_reconnects = max_reconnects
+        self.ssl_context = ssl_context
+
+        # Idle connections as (reader, writer, last_used), most recent last
+        self._idle = []
+
+        # Connection statistics
+        self.stats = {"created": 0, "reused": 0, "reconnects": 0}
+
+    async def _acquire(self):
+        """
+        Take an idle connection from the pool or open a new one
+
+        Returns:
+            tuple: (reader, writer, reused)
+        """
+        now = time.monotonic()
+
+        while self._idle:
+            reader, writer, last_used = self._idle.pop()
+            if now - last_used > self.idle_timeout or writer.is_closing():
+                writer.close()
+                continue
+            self.stats["reused"] += 1
+            return reader, writer, True
+
+        self.stats["created"] += 1
+        ssl_context = self.ssl_context if self.scheme == "https" else None
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=ssl_context)
+        return reader, writer, False
+
+    def _release(self, reader, writer):
+        """
+        Return a connection to the pool, closing it if the pool is full
+
+        Args:
+            reader (asyncio.StreamReader): Connection reader
+            writer (asyncio.StreamWriter): Connection writer
+        """
+        if len(self._idle) < self.pool_size:
+            self._idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+
+    async def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        Send a request over a pooled connection and read the full response
+
+        Args:
+            method (str): HTTP method
+            path (str): Request path including any query string
+            body (bytes, optional): Request body
+            headers (dict, optional): Request headers
+            timeout (float, optional): Timeout for the whole exchange in seconds
+
+        Returns:
+            tuple: (status, body bytes)
+        """
+        attempt = 0
+
+        while True:
+            reader, writer, reused = await self._acquire()
+            try:
+                status, data, keep_alive = await asyncio.wait_for(
+                    self._exchange(reader, writer, method, path, body, headers or {}),
+                    timeout
+                )
+            except (asyncio.IncompleteReadError,) + RECONNECT_ERRORS:
+                writer.close()
+                # A reused connection may have been closed by the server while idle
+                if reused and attempt < self.max_reconnects:
+                    attempt += 1
+                    self.stats["reconnects"] += 1
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            if keep_alive:
+                self._release(reader, writer)
+            else:
+                writer.close()
+
+            return status, data
+
+    async def _exchange(self, reader, writer, method, path, body, headers):
+        """
+        Write one HTTP/1.1 request and read its response
+
+        Args:
+            reader (asyncio.StreamReader): Connection reader
+            writer (asyncio.StreamWriter): Connection writer
+            method (str): HTTP method
+            path (str): Request path including any query string
+            body (bytes): Request body or None
+            headers (dict): Request headers
+
+        Returns:
+            tuple: (status, body bytes, keep_alive)
+        """
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}"]
+        for name, value in headers.items():
+            lines.append(f"{name}: {value}")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+        writer.write(request + body if body else request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+
+        parts = status_line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise http.client.BadStatusLine(status_line.decode("latin-1"))
+        version, status = parts[0], int(parts[1])
+
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and response_headers.get("connection", "").lower() != "close"
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Skip trailers up to the final blank line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b"".join(chunks)
+        elif "content-length" in response_headers:
+            data = await reader.readexactly(int(response_headers["content-length"]))
+        else:
+            data = await reader.read()
+            keep_alive = False
+
+        return status, data, keep_alive
+
+    async def close(self):
+        """
+        Close all idle connections
+        """
+        idle, self._idle = self._idle, []
+
+        for _, writer, _ in idle:
+            writer.close()
@@ -5,6 +5,7 @@ This module handles the hierarchical menu navigation system for the Study Sphere
 
 import json
 from course_data import COURSE_DATA, RESOURCE_TYPES, DIFFICULTY_LEVELS
+from catalogue_index import get_catalogue_index
 
 class MenuNavigation:
     """
@@ -18,14 +19,82 @@ class MenuNavigation:
         self.course_data = COURSE_DATA
         self.resource_types = RESOURCE_TYPES
         self.difficulty_levels = DIFFICULTY_LEVELS
+        
+        # Callback tokens for every catalogue node, built once per process
+        self.catalogue_index = get_catalogue_index()
+        
+        # Keyboards serialized to JSON, keyed by menu level and the nodes they depend on
+        self._keyboards = {}
+    
+    def _cached_keyboard(self, key):
+        """
+        Get a keyboard that was already built
+        
+        Args:
+            key (tuple): Menu level and the nodes the keyboard depends on
+            
+        Returns:
+            str: Serialized keyboard markup or None if not built yet
+        """
+        return self._keyboards.get(key)
+    
+    def _remember_keyboard(self, key, markup):
+        """
+        Serialize a keyboard once and keep it for later taps
+        
+        The catalogue is static, so a keyboard never changes once built and the
+        JSON string can go straight into every request that shows it
+        
+        Args:
+            key (tuple): Menu level and the nodes the keyboard depends on
+            markup (dict): Inline keyboard markup
+            
+        Returns:
+            str: Serialized keyboard markup
+        """
+        serialized = json.dumps(markup, ensure_ascii=False, separators=(",", ":"))
+        self._keyboards[key] = serialized
+        return serialized
+    
+    def warm_keyboards(self):
+        """
+        Build every keyboard reachable from the catalogue ahead of the first tap
+        
+        Returns:
+            int: Number of keyboards held in memory
+        """
+        self.build_class_keyboard()
+        self.build_post_response_keyboard()
+        
+        for class_num, subjects in self.course_data.items():
+            self.build_subject_keyboard(class_num)
+            self.build_difficulty_keyboard([class_num])
+            
+            for subject, subject_info in subjects.items():
+                self.build_resource_type_keyboard([class_num, subject])
+                
+                if "Chapters" in subject_info:
+                    self.build_chapter_keyboard([class_num, subject])
+                
+                if "Subsubjects" in subject_info:
+                    self.build_subsubject_keyboard(class_num, subject)
+                    for subsubject in subject_info["Subsubjects"]:
+                        self.build_chapter_keyboard([class_num, subject, subsubject])
+        
+        return len(self._keyboards)
     
     def build_class_keyboard(self):
         """
         Build keyboard for class selection
         
         Returns:
-            dict: Inline keyboard markup for class selection
+            str: Serialized inline keyboard markup for class selection
         """
+        key = ("class",)
+        keyboard = self._cached_keyboard(key)
+        if keyboard is not None:
+            return keyboard
+        
         buttons = []
         row = []
         
@@ -47,7 +116,7 @@ class MenuNavigation:
             "callback_data": "p:start"
         }])
         
-        return {"inline_keyboard": buttons}
+        return self._remember_keyboard(key, {"inline_keyboard": buttons})
     
     def build_subject_keyboard(self, class_num):
         """
@@ -57,8 +126,13 @@ class MenuNavigation:
             class_num (str): Selected class number
             
         Returns:
-            dict: Inline keyboard markup for subject selection
+            str: Serialized inline keyboard markup for subject selection
         """
+        key = ("subject", class_num)
+        keyboard = self._cached_keyboard(key)
+        if keyboard is not None:
+            return keyboard
+        
         buttons = []
         
         # Get subjects for the selected class
@@ -68,11 +142,11 @@ class MenuNavigation:
         for subject in subjects:
             # Add appropriate emoji based on subject
             emoji = self._get_subject_emoji(subject)
-            # Truncate subject name if needed to keep callback data short
-            short_subject = subject[:20]  # Limit to 20 chars
+            # Numeric node ID keeps callback data well within Telegram's 64 bytes
+            subject_id = self.catalogue_index.node_id("subject", class_num, subject)
             buttons.append([{
                 "text": f"{emoji} {subject}",
-                "callback_data": f"s:{class_num}:{short_subject}"
+                "callback_data": f"s:{subject_id}"
             }])
         
         # Add back button
@@ -87,7 +161,7 @@ class MenuNavigation:
             "callback_data": "p:start"
         }])
         
-        return {"inline_keyboard": buttons}
+        return self._remember_keyboard(key, {"inline_keyboard": buttons})
     
     def build_subsubject_keyboard(self, class_num, subject):
         """
@@ -98,8 +172,13 @@ class MenuNavigation:
             subject (str): Selected subject
             
         Returns:
-            dict: Inline keyboard markup for sub-subject selection
+            str: Serialized inline keyboard markup for sub-subject selection
         """
+        key = ("subsubject", class_num, subject)
+        keyboard = self._cached_keyboard(key)
+        if keyboard is not None:
+            return keyboard
+        
         buttons = []
         
         # Get sub-subjects for the selected subject
@@ -109,11 +188,10 @@ class MenuNavigation:
         for subsubject in subsubjects:
             # Add appropriate emoji based on sub-subject
             emoji = self._get_subject_emoji(subsubject)
-            # Truncate subsubject name if needed
-            short_subsubject = subsubject[:20]  # Limit to 20 chars
+            subsubject_id = self.catalogue_index.node_id("subsubject", class_num, subject, subsubject)
             buttons.append([{
                 "text": f"{emoji} {subsubject}",
-                "callback_data": f"ss:{class_num}:{short_subsubject}"
+                "callback_data": f"ss:{subsubject_id}"
             }])
         
         # Add back button
@@ -128,7 +206,7 @@ class MenuNavigation:
             "callback_data": "p:start"
         }])
         
-        return {"inline_keyboard": buttons}
+        return self._remember_keyboard(key, {"inline_keyboard": buttons})
     
     def build_chapter_keyboard(self, hierarchy):
         """
@@ -138,8 +216,13 @@ class MenuNavigation:
             hierarchy (list): List containing [class_num, subject, (optional) subsubject]
             
         Returns:
-            dict: Inline keyboard markup for chapter selection
+            str: Serialized inline keyboard markup for chapter selection
         """
+        key = ("chapter",) + tuple(hierarchy[:3])
+        keyboard = self._cached_keyboard(key)
+        if keyboard is not None:
+            return keyboard
+        
         buttons = []
         
         # Extract hierarchy components
@@ -147,6 +230,7 @@ class MenuNavigation:
         subject = hierarchy[1]
         
         # Determine if we have a sub-subject
+        subsubject = None
         if len(hierarchy) == 3:
             subsubject = hierarchy[2]
             chapters = self.course_data.get(class_num, {}).get(subject, {}).get("Subsubjects", {}).get(subsubject, {}).get("Chapters", [])
@@ -157,11 +241,10 @@ class MenuNavigation:
         
         # Add chapter buttons (one per row)
         for chapter in chapters:
-            # Truncate chapter name if needed
-            short_chapter = chapter[:20]  # Limit to 20 chars
+            chapter_id = self.catalogue_index.node_id("chapter", class_num, subject, subsubject, chapter)
             buttons.append([{
                 "text": f"📖 {chapter}",
-                "callback_data": f"ch:{class_num}:{short_chapter}"
+                "callback_data": f"ch:{chapter_id}"
             }])
         
         # Add back button
@@ -176,7 +259,7 @@ class MenuNavigation:
             "callback_data": "p:start"
         }])
         
-        return {"inline_keyboard": buttons}
+        return self._remember_keyboard(key, {"inline_keyboard": buttons})
     
     def build_resource_type_keyboard(self, hierarchy):
         """
@@ -186,8 +269,14 @@ class MenuNavigation:
             hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
             
         Returns:
-            dict: Inline keyboard markup for resource type selection
+            str: Serialized inline keyboard markup for resource type selection
         """
+        # The keyboard depends only on the class and subject, not the chapter
+        key = ("resource", hierarchy[0], hierarchy[1])
+        keyboard = self._cached_keyboard(key)
+        if keyboard is not None:
+            return keyboard
+        
         buttons = []
         
         # Extract class_num for back button
@@ -205,11 +294,10 @@ class MenuNavigation:
         for resource_type in resource_types:
             # Add appropriate emoji based on resource type
             emoji = self._get_resource_emoji(resource_type)
-            # Truncate resource type if needed
-            short_resource = resource_type[:20]  # Limit to 20 chars
+            resource_id = self.catalogue_index.node_id("resource", resource_type)
             buttons.append([{
                 "text": f"{emoji} {resource_type}",
-                "callback_data": f"r:{class_num}:{short_resource}"
+                "callback_data": f"r:{resource_id}"
             }])
         
         # Add back button
@@ -224,7 +312,7 @@ class MenuNavigation:
             "callback_data": "p:start"
         }])
         
-        return {"inline_keyboard": buttons}
+        return self._remember_keyboard(key, {"inline_keyboard": buttons})
     
     def build_difficulty_keyboard(self, hierarchy):
         """
@@ -234,8 +322,13 @@ class MenuNavigation:
             hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter, resource_type]
             
         Returns:
-            dict: Inline keyboard markup for difficulty selection
+            str: Serialized inline keyboard markup for difficulty selection
         """
+        key = ("difficulty", hierarchy[0])
+        keyboard = self._cached_keyboard(key)
+        if keyboard is not None:
+            return keyboard
+        
         buttons = []
         
         # Extract class_num for back button
@@ -264,15 +357,20 @@ class MenuNavigation:
             "callback_data": "p:start"
         }])
         
-        return {"inline_keyboard": buttons}
+        return self._remember_keyboard(key, {"inline_keyboard": buttons})
     
     def build_post_response_keyboard(self):
         """
         Build keyboard for post-response options
         
         Returns:
-            dict: Inline keyboard markup for post-response options
+            str: Serialized inline keyboard markup for post-response options
         """
+        key = ("post",)
+        keyboard = self._cached_keyboard(key)
+        if keyboard is not None:
+            return keyboard
+        
         buttons = [
             [{"text": "📚 Choose Another Chapter", "callback_data": "p:ch"}],
             [{"text": "📘 Reselect Subject", "callback_data": "p:s"}],
@@ -280,7 +378,7 @@ class MenuNavigation:
             [{"text": "🔄 Start Over", "callback_data": "p:start"}]
         ]
         
-        return {"inline_keyboard": buttons}
+        return self._remember_keyboard(key, {"inline_keyboard": buttons})
     
     def _get_subject_emoji(self, subject):
         """
@@ -0,0 +1,261 @@
+"""
+Study Sphere AI - Model Router Module
+This module spreads generations over several LLM backends, sending each request
+to the backend expected to answer fastest and falling back to the next one when
+it fails
+"""
+
+import random
+import threading
+import time
+
+
+class ModelBackend:
+    """
+    Class to hold one LLM backend and its rolling latency and error scores
+    """
+
+    def __init__(self, name, client, weights=None, default_weight=1.0):
+        """
+        Initialize the ModelBackend
+
+        Args:
+            name (str): Name used in logs and statistics
+            client (DeepSeekAPI): Client for the backend's endpoint, model and key
+            weights (dict, optional): Preference per resource type, higher is preferred
+                and 0 never uses the backend for that resource type
+            default_weight (float): Preference for resource types not in weights
+        """
+        self.name = name
+        self.client = client
+        self.weights = weights or {}
+        self.default_weight = default_weight
+
+        # Exponentially weighted averages, latency per resource type since a sample paper
+        # takes far longer than a formula sheet, and a type has none until its first success
+        self.latency = {}
+        self.error_rate = 0.0
+
+        self.stats = {"calls": 0, "failures": 0}
+
+    def weight(self, resource_type):
+        """
+        Get the preference of the backend for a resource type
+
+        Args:
+            resource_type (str): Type of resource to generate
+
+        Returns:
+            float: Weight, 0 if the backend must not be used
+        """
+        return self.weights.get(resource_type, self.default_weight)
+
+    def healthy(self):
+        """
+        Check whether the backend's circuit breaker lets calls through
+
+        Returns:
+            bool: False while the breaker is open
+        """
+        return self.client.breaker.state != self.client.breaker.OPEN
+
+    def score(self, resource_type):
+        """
+        Get the expected cost of sending a request to the backend, lower is better
+
+        Args:
+            resource_type (str): Type of resource to generate
+
+        Returns:
+            float: Expected latency divided by the weight, 0 for a backend not tried yet on the resource type
+        """
+        latency = self.latency.get(resource_type)
+        if latency is None:
+            return 0.0
+
+        # Failed calls have to be repeated elsewhere, which makes unreliable backends slower
+        expected = latency / max(1.0 - self.error_rate, 0.05)
+        return expected / self.weight(resource_type)
+
+
+class ModelRouter:
+    """
+    Class to route generations to the fastest healthy backend
+
+    Each backend keeps exponentially weighted averages of its latency per
+    resource type and of its error rate. A request goes to the backend with
+    the lowest expected latency for the resource type divided by its weight
+    for it; backends whose circuit breaker is open are tried last. A small share of requests goes
+    to a random backend so the scores of backends not currently chosen stay
+    up to date.
+
+    Prompts, response cleaning and fallback content come from the default
+    backend, the first one given, and cache entries are stamped with its model.
+    """
+
+    def __init__(self, backends, smoothing=0.2, explore_ratio=0.05):
+        """
+        Initialize the ModelRouter
+
+        Args:
+            backends (list): ModelBackend instances, the first one is the default
+            smoothing (float): Weight of the newest call in the rolling averages
+            explore_ratio (float): Share of requests sent to a random usable backend
+        """
+        if not backends:
+            raise ValueError("ModelRouter needs at least one backend")
+
+        self.backends = backends
+        self.smoothing = smoothing
+        self.explore_ratio = explore_ratio
+        self._lock = threading.Lock()
+
+        # Prompts, cleaning and fallback content are the same for every backend
+        default = backends[0].client
+        self.model = default.model
+        self.fallback_content = default.fallback_content
+        self.clean_response = default.clean_response
+        self._build_prompt = default._build_prompt
+        self._generate_fallback_generic = default._generate_fallback_generic
+
+    def rank(self, resource_type):
+        """
+        Order the backends that may generate a resource type by preference
+
+        Args:
+            resource_type (str): Type of resource to generate
+
+        Returns:
+            list: ModelBackend instances, the one to try first at the front
+        """
+        with self._lock:
+            usable = [backend for backend in self.backends if backend.weight(resource_type) > 0]
+            if not usable:
+                usable = list(self.backends)
+
+            ranked = sorted(usable, key=lambda backend: (not backend.healthy(), backend.score(resource_type)))
+
+        if len(ranked) > 1 and random.random() < self.explore_ratio:
+            explored = random.choice(ranked[1:])
+            ranked.remove(explored)
+            ranked.insert(0, explored)
+
+        return ranked
+
+    def _record(self, backend, resource_type, elapsed, succeeded):
+        """
+        Update a backend's rolling scores after a call
+
+        Args:
+            backend (ModelBackend): Backend that was called
+            resource_type (str): Type of resource the call generated
+            elapsed (float): Seconds the call took
+            succeeded (bool): Whether the call produced content
+        """
+        with self._lock:
+            backend.stats["calls"] += 1
+            backend.error_rate += self.smoothing * ((0.0 if succeeded else 1.0) - backend.error_rate)
+
+            if succeeded:
+                latency = backend.latency.get(resource_type)
+                if latency is None:
+                    backend.latency[resource_type] = elapsed
+                else:
+                    backend.latency[resource_type] = latency + self.smoothing * (elapsed - latency)
+            else:
+                backend.stats["failures"] += 1
+
+    def generate_study_material(self, class_num, subject, chapter, resource_type, difficulty=None, subsubject=None,
+                                on_progress=None, use_fallback=True):
+        """
+        Generate study material on the preferred backend, trying the others when it fails
+
+        Takes the same arguments as DeepSeekAPI.generate_study_material
+        """
+        prompt = self._build_prompt(class_num, subject, chapter, resource_type, difficulty, subsubject)
+        print(f"Sending prompt to API: {prompt[:200]}...")
+
+        abandoned = False
+
+        def report(partial_content):
+            nonlocal abandoned
+            try:
+                on_progress(partial_content)
+            except Exception:
+                # The caller gave up on the content, so no other backend is tried
+                abandoned = True
+                raise
+
+        content = None
+        for backend in self.rank(resource_type):
+            started = time.monotonic()
+            if on_progress is not None:
+                content = backend.client.generate_content_stream(prompt, report, resource_type=resource_type)
+            else:
+                content = backend.client.generate_content(prompt, resource_type=resource_type)
+
+            if abandoned:
+                return None
+
+            self._record(backend, resource_type, time.monotonic() - started, bool(content))
+            if content:
+                break
+            print(f"⚠️ Backend {backend.name} failed, trying the next one")
+
+        if not content and use_fallback:
+            fallback_method = self.fallback_content.get(resource_type, self._generate_fallback_generic)
+            content = fallback_method(class_num, subject, chapter, difficulty, subsubject)
+
+        return content
+
+    async def generate_study_material_async(self, class_num, subject, chapter, resource_type, difficulty=None,
+                                            subsubject=None, use_fallback=True):
+        """
+        Async counterpart of generate_study_material
+        """
+        prompt = self._build_prompt(class_num, subject, chapter, resource_type, difficulty, subsubject)
+        print(f"Sending prompt to API: {prompt[:200]}...")
+
+        content = None
+        for backend in self.rank(resource_type):
+            started = time.monotonic()
+            content = await backend.client.generate_content_async(prompt, resource_type=resource_type)
+
+            self._record(backend, resource_type, time.monotonic() - started, bool(content))
+            if content:
+                break
+            print(f"⚠️ Backend {backend.name} failed, trying the next one")
+
+        if not content and use_fallback:
+            fallback_method = self.fallback_content.get(resource_type, self._generate_fallback_generic)
+            content = fallback_method(class_num, subject, chapter, difficulty, subsubject)
+
+        return content
+
+    def get_stats(self):
+        """
+        Get routing statistics
+
+        Returns:
+            dict: Per backend name, its routing scores and counters with its client's statistics
+        """
+        stats = {}
+        with self._lock:
+            for backend in self.backends:
+                stats[backend.name] = dict(
+                    backend.stats,
+                    model=backend.client.model,
+                    latency=dict(backend.latency),
+                    error_rate=backend.error_rate
+                )
+
+        for backend in self.backends:
+            stats[backend.name]["client"] = backend.client.get_stats()
+        return stats
+
+    def close(self):
+        """
+        Close the pooled connections of every backend
+        """
+        for backend in self.backends:
+            backend.client.close()
@@ -3,55 +3,121 @@ Study Sphere AI - Navigation Handler Module
 This module handles navigation between different menu levels for the Study Sphere AI bot
 """
 
+from collections import namedtuple
+
+from course_data import DIFFICULTY_LEVELS
+from state_store import UserState, UserStateStore
+from telegram_api import ThrottledMessageEditor
+
+# Content generation left to the caller when navigation runs with deferred generation
+GenerationRequest = namedtuple("GenerationRequest", ["chat_id", "hierarchy", "resource_type", "difficulty", "message_id"])
+
+# Telegram's maximum message length
+MAX_MESSAGE_LENGTH = 4096
+
+# Actions whose callback data identifies the node on its own, so they work without stored state
+STATELESS_ACTIONS = ("class", "subject", "subsubject", "chapter")
+
+# Resource types the user picks a difficulty for, the others are generated as "mixed"
+DIFFICULTY_RESOURCES = ("Important Questions", "Previous Year Questions", "Sample Paper")
+
 class NavigationHandler:
     """
     Class to handle navigation between different menu levels
     """
-    def __init__(self, menu_navigation, user_experience):
+    def __init__(self, menu_navigation, user_experience, stream_responses=False, stream_edit_interval=1.5, state_store=None,
+                 edit_menus=True, prefetcher=None):
         """
         Initialize the NavigationHandler with required components
         
         Args:
             menu_navigation: Instance of MenuNavigation class
             user_experience: Instance of UserExperience class
+            stream_responses (bool, optional): Stream generated content into the
+                "generating" message while it is produced
+            stream_edit_interval (float, optional): Minimum seconds between edits of that message
+            state_store (optional): Store for per-chat navigation state, a bounded
+                in-memory UserStateStore by default
+            edit_menus (bool, optional): Show each menu by editing the previous menu
+                message instead of sending a new message
+            prefetcher (SpeculativePrefetcher, optional): Generates the likely resources
+                of a chapter in the background while its resource menu is shown
         """
         self.menu_navigation = menu_navigation
         self.ux = user_experience
+        self.stream_responses = stream_responses
+        self.stream_edit_interval = stream_edit_interval
+        self.edit_menus = edit_menus
+        self.prefetcher = prefetcher
         
         # Store user navigation state
-        self.user_states = {}
+        self.user_states = state_store if state_store is not None else UserStateStore()
     
-    def handle_start(self, chat_id, telegram_api):
+    def handle_start(self, chat_id, telegram_api, message_id=None):
         """
         Handle /start command
         
         Args:
             chat_id (int): Chat ID
             telegram_api: Instance of TelegramAPI class
+            message_id (int, optional): Menu message to show the class selection in,
+                a new message is sent by default
             
         Returns:
             bool: True if handled successfully
         """
+        if self.prefetcher is not None:
+            self.prefetcher.cancel(chat_id)
+        
         # Reset user state
-        self.user_states[chat_id] = {
-            "current_level": "start",
-            "hierarchy": [],
-            "last_message_id": None
-        }
+        user_state = UserState()
+        user_state.last_message_id = message_id
+        self.user_states[chat_id] = user_state
         
         # Send welcome message with class selection keyboard
         welcome_message = self.ux.get_welcome_message()
         class_keyboard = self.menu_navigation.build_class_keyboard()
         
-        result = telegram_api.send_message(chat_id, welcome_message, class_keyboard)
+        try:
+            return self._show_menu(chat_id, welcome_message, class_keyboard, telegram_api, user_state)
+        finally:
+            # The menu message ID is only known once the menu was sent
+            self.user_states.save(chat_id, user_state)
+    
+    def _show_menu(self, chat_id, message, keyboard, telegram_api, user_state):
+        """
+        Show a menu, editing the chat's current menu message when there is one
+        
+        Editing keeps the chat to a single menu message and costs one API call
+        per tap. If the edit fails, for example because the message was deleted
+        or is too old to edit, the menu is sent as a new message.
+        
+        Args:
+            chat_id (int): Chat ID
+            message (str): Menu text
+            keyboard (dict or str): Menu keyboard
+            telegram_api: Instance of TelegramAPI class
+            user_state (UserState): Current user state
+            
+        Returns:
+            bool: True if the menu was shown
+        """
+        if self.edit_menus and user_state.last_message_id:
+            result = telegram_api.edit_message_text(chat_id, user_state.last_message_id, message, keyboard)
+            
+            # Tapping a button whose menu is already shown leaves the message unchanged
+            if result.get("ok", False) or "message is not modified" in str(result.get("error", "")):
+                return True
+        
+        result = telegram_api.send_message(chat_id, message, keyboard)
         
         if result.get("ok", False) and "result" in result:
-            self.user_states[chat_id]["last_message_id"] = result["result"]["message_id"]
+            user_state.last_message_id = result["result"]["message_id"]
             return True
         
         return False
     
-    def handle_callback(self, chat_id, callback_data, telegram_api, content_generator, error_handler):
+    def handle_callback(self, chat_id, callback_data, telegram_api, content_generator, error_handler, defer_generation=False):
         """
         Handle callback queries from inline keyboards
         
@@ -61,24 +127,53 @@ class NavigationHandler:
             telegram_api: Instance of TelegramAPI class
             content_generator: Instance of ContentGenerator class
             error_handler: Instance of ErrorHandler class
+            defer_generation (bool, optional): Return a GenerationRequest instead of
+                generating content, so the caller can generate it asynchronously
             
         Returns:
-            bool: True if handled successfully
+            bool: True if handled successfully, or a GenerationRequest when deferred
         """
         # Parse callback data
         action, parameters = self.menu_navigation.parse_callback_data(callback_data)
         
         # Get current user state
-        user_state = self.user_states.get(chat_id, {
-            "current_level": "start",
-            "hierarchy": [],
-            "last_message_id": None
-        })
-        
-        # Store user state if not exists
-        if chat_id not in self.user_states:
+        user_state = self.user_states.get(chat_id)
+        
+        if user_state is None:
+            # The state expired or was evicted, so restart unless the button carries everything needed
+            if action not in STATELESS_ACTIONS:
+                return self.handle_start(chat_id, telegram_api)
+            
+            user_state = UserState()
             self.user_states[chat_id] = user_state
         
+        try:
+            return self._dispatch_callback(
+                chat_id, action, parameters, telegram_api, content_generator, error_handler, user_state, defer_generation
+            )
+        finally:
+            # Handlers update the state in place, some of it after Telegram calls, so it is
+            # saved once they are done. A handler that restarted the chat saved its new state
+            self.user_states.save(chat_id, user_state)
+    
+    def _dispatch_callback(self, chat_id, action, parameters, telegram_api, content_generator, error_handler, user_state,
+                           defer_generation=False):
+        """
+        Run the handler of a callback action
+        
+        Args:
+            chat_id (int): Chat ID
+            action (str): Action parsed from the callback data
+            parameters (list): Parameters parsed from the callback data
+            telegram_api: Instance of TelegramAPI class
+            content_generator: Instance of ContentGenerator class
+            error_handler: Instance of ErrorHandler class
+            user_state (UserState): Current user state
+            defer_generation (bool, optional): Return a GenerationRequest instead of generating content
+            
+        Returns:
+            bool: True if handled successfully, or a GenerationRequest when deferred
+        """
         # Handle different actions
         if action == "class":
             return self._handle_class_selection(chat_id, parameters, telegram_api, user_state)
@@ -93,10 +188,10 @@ class NavigationHandler:
             return self._handle_chapter_selection(chat_id, parameters, telegram_api, user_state)
             
         elif action == "resource":
-            return self._handle_resource_selection(chat_id, parameters, telegram_api, content_generator, error_handler, user_state)
+            return self._handle_resource_selection(chat_id, parameters, telegram_api, content_generator, error_handler, user_state, defer_generation)
             
         elif action == "difficulty":
-            return self._handle_difficulty_selection(chat_id, parameters, telegram_api, content_generator, error_handler, user_state)
+            return self._handle_difficulty_selection(chat_id, parameters, telegram_api, content_generator, error_handler, user_state, defer_generation)
             
         elif action == "back":
             return self._handle_back_navigation(chat_id, parameters, telegram_api, user_state)
@@ -106,11 +201,11 @@ class NavigationHandler:
             
         elif action == "retry":
             # Retry last action
-            if user_state["current_level"] == "generating":
+            if user_state.current_level == "generating":
                 # Get stored parameters for retry
-                hierarchy = user_state.get("hierarchy", [])
-                resource_type = user_state.get("resource_type")
-                difficulty = user_state.get("difficulty")
+                hierarchy = user_state.hierarchy
+                resource_type = user_state.resource_type
+                difficulty = user_state.difficulty
                 
                 if hierarchy and resource_type and difficulty:
                     return self._handle_difficulty_selection(
@@ -119,7 +214,8 @@ class NavigationHandler:
                         telegram_api, 
                         content_generator,
                         error_handler,
-                        user_state
+                        user_state,
+                        defer_generation
                     )
             
             # If retry not possible, go back to start
@@ -136,7 +232,7 @@ class NavigationHandler:
             chat_id (int): Chat ID
             parameters (list): Parameters from callback data
             telegram_api: Instance of TelegramAPI class
-            user_state (dict): Current user state
+            user_state (UserState): Current user state
             
         Returns:
             bool: True if handled successfully
@@ -147,20 +243,14 @@ class NavigationHandler:
         class_num = parameters[0]
         
         # Update user state
-        user_state["current_level"] = "class"
-        user_state["hierarchy"] = [class_num]
+        user_state.current_level = "class"
+        user_state.hierarchy = [class_num]
         
         # Send subject selection message
         message = self.ux.get_subject_selection_message(class_num)
         keyboard = self.menu_navigation.build_subject_keyboard(class_num)
         
-        result = telegram_api.send_message(chat_id, message, keyboard)
-        
-        if result.get("ok", False) and "result" in result:
-            user_state["last_message_id"] = result["result"]["message_id"]
-            return True
-        
-        return False
+        return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
     
     def _handle_subject_selection(self, chat_id, parameters, telegram_api, user_state):
         """
@@ -170,27 +260,34 @@ class NavigationHandler:
             chat_id (int): Chat ID
             parameters (list): Parameters from callback data
             telegram_api: Instance of TelegramAPI class
-            user_state (dict): Current user state
+            user_state (UserState): Current user state
             
         Returns:
             bool: True if handled successfully
         """
-        if len(parameters) < 2:
-            return False
-            
-        class_num = parameters[0]
-        subject_short = parameters[1]
-        
-        # Get the full subject name from the shortened version
-        subject = self._get_full_subject_name(class_num, subject_short)
+        node = self._resolve_node_id("subject", parameters)
         
-        if not subject:
-            # If we can't find the subject, try to use the short name directly
-            subject = subject_short
+        if node:
+            class_num, subject = node
+        else:
+            # Buttons on older messages carry the class and a name token
+            if len(parameters) < 2:
+                return False
+                
+            class_num = parameters[0]
+            # Names may contain ":" so the token is everything after the class
+            subject_short = ":".join(parameters[1:])
+            
+            # Get the full subject name from the shortened version
+            subject = self._get_full_subject_name(class_num, subject_short)
+            
+            if not subject:
+                # If we can't find the subject, try to use the short name directly
+                subject = subject_short
         
         # Update user state
-        user_state["current_level"] = "subject"
-        user_state["hierarchy"] = [class_num, subject]
+        user_state.current_level = "subject"
+        user_state.hierarchy = [class_num, subject]
         
         # Check if subject has subsubjects
         subject_info = self.menu_navigation.course_data.get(class_num, {}).get(subject, {})
@@ -204,13 +301,7 @@ class NavigationHandler:
             message = self.ux.get_chapter_selection_message(class_num, subject)
             keyboard = self.menu_navigation.build_chapter_keyboard([class_num, subject])
         
-        result = telegram_api.send_message(chat_id, message, keyboard)
-        
-        if result.get("ok", False) and "result" in result:
-            user_state["last_message_id"] = result["result"]["message_id"]
-            return True
-        
-        return False
+        return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
     
     def _handle_subsubject_selection(self, chat_id, parameters, telegram_api, user_state):
         """
@@ -220,46 +311,47 @@ class NavigationHandler:
             chat_id (int): Chat ID
             parameters (list): Parameters from callback data
             telegram_api: Instance of TelegramAPI class
-            user_state (dict): Current user state
+            user_state (UserState): Current user state
             
         Returns:
             bool: True if handled successfully
         """
-        if len(parameters) < 2:
-            return False
-            
-        class_num = parameters[0]
-        subsubject_short = parameters[1]
+        node = self._resolve_node_id("subsubject", parameters)
         
-        # Get current hierarchy from user state
-        hierarchy = user_state.get("hierarchy", [])
-        if len(hierarchy) < 2:
-            return False
+        if node:
+            class_num, subject, subsubject = node
+        else:
+            # Buttons on older messages carry the class and a name token
+            if len(parameters) < 2:
+                return False
+                
+            class_num = parameters[0]
+            # Names may contain ":" so the token is everything after the class
+            subsubject_short = ":".join(parameters[1:])
             
-        subject = hierarchy[1]
-        
-        # Get the full subsubject name from the shortened version
-        subsubject = self._get_full_subsubject_name(class_num, subject, subsubject_short)
-        
-        if not subsubject:
-            # If we can't find the subsubject, try to use the short name directly
-            subsubject = subsubject_short
+            # Get current hierarchy from user state
+            hierarchy = user_state.hierarchy
+            if len(hierarchy) < 2:
+                return False
+                
+            subject = hierarchy[1]
+            
+            # Get the full subsubject name from the shortened version
+            subsubject = self._get_full_subsubject_name(class_num, subject, subsubject_short)
+            
+            if not subsubject:
+                # If we can't find the subsubject, try to use the short name directly
+                subsubject = subsubject_short
         
         # Update user state
-        user_state["current_level"] = "subsubject"
-        user_state["hierarchy"] = [class_num, subject, subsubject]
+        user_state.current_level = "subsubject"
+        user_state.hierarchy = [class_num, subject, subsubject]
         
         # Send chapter selection message
         message = self.ux.get_chapter_selection_message(class_num, subject, subsubject)
         keyboard = self.menu_navigation.build_chapter_keyboard([class_num, subject, subsubject])
         
-        result = telegram_api.send_message(chat_id, message, keyboard)
-        
-        if result.get("ok", False) and "result" in result:
-            user_state["last_message_id"] = result["result"]["message_id"]
-            return True
-        
-        return False
+        return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
     
     def _handle_chapter_selection(self, chat_id, parameters, telegram_api, user_state):
         """
@@ -269,48 +361,59 @@ class NavigationHandler:
             chat_id (int): Chat ID
             parameters (list): Parameters from callback data
             telegram_api: Instance of TelegramAPI class
-            user_state (dict): Current user state
+            user_state (UserState): Current user state
             
         Returns:
             bool: True if handled successfully
         """
-        if len(parameters) < 2:
-            return False
-            
-        class_num = parameters[0]
-        chapter_short = parameters[1]
+        node = self._resolve_node_id("chapter", parameters)
         
-        # Get current hierarchy from user state
-        hierarchy = user_state.get("hierarchy", [])
-        if len(hierarchy) < 2:
-            return False
-            
-        subject = hierarchy[1]
-        
-        # Check if we have a subsubject
-        if len(hierarchy) >= 3:
-            subsubject = hierarchy[2]
-            # Get the full chapter name from the shortened version
-            chapter = self._get_full_chapter_name(class_num, subject, chapter_short, subsubject)
-            if chapter:
+        if node:
+            class_num, subject, subsubject, chapter = node
+            if subsubject:
                 hierarchy = [class_num, subject, subsubject, chapter]
             else:
-                # If we can't find the chapter, try to use the short name directly
-                chapter = chapter_short
-                hierarchy = [class_num, subject, subsubject, chapter]
-        else:
-            # Get the full chapter name from the shortened version
-            chapter = self._get_full_chapter_name(class_num, subject, chapter_short)
-            if chapter:
                 hierarchy = [class_num, subject, chapter]
+        else:
+            # Buttons on older messages carry the class and a name token
+            if len(parameters) < 2:
+                return False
+                
+            class_num = parameters[0]
+            # Names may contain ":" so the token is everything after the class
+            chapter_short = ":".join(parameters[1:])
+            
+            # Get current hierarchy from user state
+            hierarchy = user_state.hierarchy
+            if len(hierarchy) < 2:
+                return False
+                
+            subject = hierarchy[1]
+            
+            # Check if we have a subsubject
+            if len(hierarchy) >= 3:
+                subsubject = hierarchy[2]
+                # Get the full chapter name from the shortened version
+                chapter = self._get_full_chapter_name(class_num, subject, chapter_short, subsubject)
+                if chapter:
+                    hierarchy = [class_num, subject, subsubject, chapter]
+                else:
+                    # If we can't find the chapter, try to use the short name directly
+                    chapter = chapter_short
+                    hierarchy = [class_num, subject, subsubject, chapter]
             else:
-                # If we can't find the chapter, try to use the short name directly
-                chapter = chapter_short
-                hierarchy = [class_num, subject, chapter]
+                # Get the full chapter name from the shortened version
+                chapter = self._get_full_chapter_name(class_num, subject, chapter_short)
+                if chapter:
+                    hierarchy = [class_num, subject, chapter]
+                else:
+                    # If we can't find the chapter, try to use the short name directly
+                    chapter = chapter_short
+                    hierarchy = [class_num, subject, chapter]
         
         # Update user state
-        user_state["current_level"] = "chapter"
-        user_state["hierarchy"] = hierarchy
+        user_state.current_level = "chapter"
+        user_state.hierarchy = hierarchy
         
         # Get hierarchy description
         hierarchy_desc = self.menu_navigation.get_hierarchy_description(hierarchy)
@@ -319,15 +422,33 @@ class NavigationHandler:
         message = self.ux.get_resource_type_selection_message(hierarchy_desc, chapter)
         keyboard = self.menu_navigation.build_resource_type_keyboard(hierarchy)
         
-        result = telegram_api.send_message(chat_id, message, keyboard)
+        shown = self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
         
-        if result.get("ok", False) and "result" in result:
-            user_state["last_message_id"] = result["result"]["message_id"]
-            return True
+        if shown and self.prefetcher is not None:
+            # The user is a tap or two from a generation, so start the likely ones now
+            self.prefetcher.prefetch(chat_id, hierarchy, self._prefetch_candidates(hierarchy))
         
-        return False
+        return shown
     
-    def _handle_resource_selection(self, chat_id, parameters, telegram_api, content_generator, error_handler, user_state):
+    def _prefetch_candidates(self, hierarchy):
+        """
+        List the resources that can be requested for a chapter
+        
+        Args:
+            hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
+            
+        Returns:
+            list: (resource_type, difficulty) pairs
+        """
+        candidates = []
+        for resource_type in self.menu_navigation._get_subject_specific_resources(hierarchy[1]):
+            if resource_type in DIFFICULTY_RESOURCES:
+                candidates.extend((resource_type, level["value"]) for level in DIFFICULTY_LEVELS)
+            else:
+                candidates.append((resource_type, "mixed"))
+        return candidates
+    
+    def _handle_resource_selection(self, chat_id, parameters, telegram_api, content_generator, error_handler, user_state, defer_generation=False):
         """
         Handle resource type selection
         
@@ -337,42 +458,47 @@ class NavigationHandler:
             telegram_api: Instance of TelegramAPI class
             content_generator: Instance of ContentGenerator class
             error_handler: Instance of ErrorHandler class
-            user_state (dict): Current user state
+            user_state (UserState): Current user state
+            defer_generation (bool, optional): Return a GenerationRequest instead of generating
             
         Returns:
             bool: True if handled successfully
         """
-        if len(parameters) < 2:
-            return False
-            
-        class_num = parameters[0]
-        resource_short = parameters[1]
-        
-        # Get the full resource type from the shortened version
-        resource_type = self._get_full_resource_type(resource_short)
+        # Get current hierarchy from user state
+        hierarchy = user_state.hierarchy
         
-        if not resource_type:
-            # If we can't find the resource type, try to use the short name directly
-            resource_type = resource_short
+        node = self._resolve_node_id("resource", parameters)
         
-        # Get current hierarchy from user state
-        hierarchy = user_state.get("hierarchy", [])
+        if node:
+            resource_type = node[0]
+            class_num = hierarchy[0] if hierarchy else None
+        else:
+            # Buttons on older messages carry the class and a name token
+            if len(parameters) < 2:
+                return False
+                
+            class_num = parameters[0]
+            # Names may contain ":" so the token is everything after the class
+            resource_short = ":".join(parameters[1:])
+            
+            # Get the full resource type from the shortened version
+            resource_type = self._get_full_resource_type(resource_short)
+            
+            if not resource_type:
+                # If we can't find the resource type, try to use the short name directly
+                resource_type = resource_short
         
         # Update user state
-        user_state["current_level"] = "resource"
-        user_state["resource_type"] = resource_type
+        user_state.current_level = "resource"
+        user_state.resource_type = resource_type
         
         # Check if resource type needs difficulty selection
-        if resource_type in ["Important Questions", "Previous Year Questions", "Sample Paper"]:
+        if resource_type in DIFFICULTY_RESOURCES:
             # Send difficulty selection message
             message = self.ux.get_difficulty_selection_message(resource_type)
             keyboard = self.menu_navigation.build_difficulty_keyboard(hierarchy + [resource_type])
             
-            result = telegram_api.send_message(chat_id, message, keyboard)
-            
-            if result.get("ok", False) and "result" in result:
-                user_state["last_message_id"] = result["result"]["message_id"]
-                return True
+            return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
         else:
             # For other resource types, generate content directly with "mixed" difficulty
             return self._handle_difficulty_selection(
@@ -381,12 +507,13 @@ class NavigationHandler:
                 telegram_api, 
                 content_generator,  # Pass the content_generator object
                 error_handler,      # Pass the error_handler object
-                user_state
+                user_state,
+                defer_generation
             )
         
         return False
     
-    def _handle_difficulty_selection(self, chat_id, parameters, telegram_api, content_generator, error_handler, user_state):
+    def _handle_difficulty_selection(self, chat_id, parameters, telegram_api, content_generator, error_handler, user_state, defer_generation=False):
         """
         Handle difficulty selection and content generation
         
@@ -396,54 +523,144 @@ class NavigationHandler:
             telegram_api: Instance of TelegramAPI class
             content_generator: Instance of ContentGenerator class
             error_handler: Instance of ErrorHandler class
-            user_state (dict): Current user state
+            user_state (UserState): Current user state
+            defer_generation (bool, optional): Return a GenerationRequest instead of generating
             
         Returns:
-            bool: True if handled successfully
+            bool: True if handled successfully, or a GenerationRequest when deferred
         """
-        if len(parameters) < 2:
+        request = self._begin_generation(chat_id, parameters, telegram_api, user_state)
+        
+        if request is None:
             return False
             
+        if defer_generation:
+            # The caller generates the content and hands it to deliver_content
+            return request
+        
+        try:
+            # Check if content_generator is provided
+            if content_generator is None:
+                error_msg = "Content generator is not available. Please try again later."
+                telegram_api.send_message(chat_id, f"❌ {error_msg}")
+                return False
+                
+            if self.stream_responses and request.message_id:
+                # Show the content in the "generating" message as it streams in
+                editor = ThrottledMessageEditor(
+                    telegram_api,
+                    chat_id,
+                    request.message_id,
+                    header=self.ux.get_generating_message(request.resource_type, request.hierarchy[-1]),
+                    min_interval=self.stream_edit_interval
+                )
+                content, document_path = content_generator.generate_content(
+                    request.hierarchy,
+                    request.resource_type,
+                    request.difficulty,
+                    on_progress=editor,
+                    with_file=True
+                )
+                
+                return self.deliver_content(chat_id, content, telegram_api, error_handler, request.message_id, request.resource_type, document_path)
+                
+            # Generate content
+            content, document_path = content_generator.generate_content(request.hierarchy, request.resource_type, request.difficulty, with_file=True)
+            
+            return self.deliver_content(chat_id, content, telegram_api, error_handler, resource_type=request.resource_type, document_path=document_path)
+            
+        except Exception as e:
+            return self.handle_generation_error(chat_id, e, telegram_api, error_handler)
+    
+    def _begin_generation(self, chat_id, parameters, telegram_api, user_state):
+        """
+        Validate a generation request, update user state and notify the user
+        
+        Args:
+            chat_id (int): Chat ID
+            parameters (list): Parameters from callback data
+            telegram_api: Instance of TelegramAPI class
+            user_state (UserState): Current user state
+            
+        Returns:
+            GenerationRequest: Request to generate, or None if it is not valid
+        """
+        if len(parameters) < 2:
+            return None
+            
         class_num = parameters[0]
         difficulty = parameters[1]
         
         # Get current hierarchy and resource type from user state
-        hierarchy = user_state.get("hierarchy", [])
-        resource_type = user_state.get("resource_type")
+        hierarchy = user_state.hierarchy
+        resource_type = user_state.resource_type
         
         if not hierarchy or not resource_type:
-            return False
+            return None
         
         # Update user state
-        user_state["current_level"] = "generating"
-        user_state["difficulty"] = difficulty
+        user_state.current_level = "generating"
+        user_state.difficulty = difficulty
+        
+        if self.prefetcher is not None:
+            self.prefetcher.record(hierarchy, resource_type, difficulty)
         
         # Get chapter (last element in hierarchy)
         chapter = hierarchy[-1]
         
         # Send generating message
         generating_message = self.ux.get_generating_message(resource_type, chapter)
-        telegram_api.send_message(chat_id, generating_message)
+        message_id = None
+        
+        if self.edit_menus and user_state.last_message_id:
+            # Turn the menu into the generating message, which also removes its buttons
+            result = telegram_api.edit_message_text(chat_id, user_state.last_message_id, generating_message)
+            if result.get("ok", False):
+                message_id = user_state.last_message_id
+        
+        if message_id is None:
+            result = telegram_api.send_message(chat_id, generating_message)
+            message_id = result["result"]["message_id"] if result.get("ok", False) and "result" in result else None
+        
+        # Menus opened after the content are sent below it rather than replacing it
+        user_state.last_message_id = None
         
         # Show typing indicator
         telegram_api.send_chat_action(chat_id, "typing")
         
-        try:
-            # Check if content_generator is provided
-            if content_generator is None:
-                error_msg = "Content generator is not available. Please try again later."
-                telegram_api.send_message(chat_id, f"❌ {error_msg}")
-                return False
-                
-            # Generate content
-            content = content_generator.generate_content(hierarchy, resource_type)
-            
-            # Format content with emojis
-            formatted_content = content  # Fixed typo: was content_generator
-            
-            # Build post-response keyboard
-            post_keyboard = self.menu_navigation.build_post_response_keyboard()
+        return GenerationRequest(chat_id, list(hierarchy), resource_type, difficulty, message_id)
+    
+    def deliver_content(self, chat_id, content, telegram_api, error_handler, preview_message_id=None, resource_type=None,
+                        document_path=None):
+        """
+        Send generated content followed by the post-response options
+        
+        Args:
+            chat_id (int): Chat ID
+            content (str): Generated content
+            telegram_api: Instance of TelegramAPI class
+            error_handler: Instance of ErrorHandler class
+            preview_message_id (int, optional): Message the content was streamed into
+            resource_type (str, optional): Type of resource, used for the completion note
+            document_path (str, optional): Text file version of the content, sent as a
+                document when the content is too long for a few messages
             
+        Returns:
+            bool: True if handled successfully
+        """
+        # Format content with emojis
+        formatted_content = content  # Fixed typo: was content_generator
+        
+        # Build post-response keyboard
+        post_keyboard = self.menu_navigation.build_post_response_keyboard()
+        
+        # Replace a streamed preview with the final content when it fits in one message
+        delivered = False
+        if preview_message_id and len(formatted_content) <= MAX_MESSAGE_LENGTH and not formatted_content.startswith("❌ Error:"):
+            result = telegram_api.edit_message_text(chat_id, preview_message_id, formatted_content, post_keyboard)
+            delivered = result.get("ok", False)
+        
+        if not delivered:
             # Check if error_handler is provided
             if error_handler is None:
                 # Fallback if error_handler is not available
@@ -457,30 +674,49 @@ class NavigationHandler:
                     telegram_api.send_message(chat_id, formatted_content, post_keyboard)
             else:
                 # Use error handler to handle API response
-                error_handler.handle_api_response(chat_id, formatted_content, post_keyboard)
-            
-            # Update user state
-            user_state["current_level"] = "completed"
+                error_handler.handle_api_response(chat_id, formatted_content, post_keyboard, document_path)
             
-            # Send post-response message
-            post_message = self.ux.get_post_response_message()
-            telegram_api.send_message(chat_id, post_message)
-            
-            return True
+            # The full content went out as new messages, so close the streamed preview
+            if preview_message_id:
+                telegram_api.edit_message_text(chat_id, preview_message_id, self.ux.get_generation_complete_message(resource_type or "Content"))
+        
+        # Update user state
+        user_state = self.user_states.get(chat_id)
+        if user_state is not None:
+            user_state.current_level = "completed"
+            self.user_states.save(chat_id, user_state)
+        
+        # Send post-response message
+        post_message = self.ux.get_post_response_message()
+        telegram_api.send_message(chat_id, post_message)
+        
+        return True
+    
+    def handle_generation_error(self, chat_id, error, telegram_api, error_handler):
+        """
+        Report a content generation failure to the user
+        
+        Args:
+            chat_id (int): Chat ID
+            error (Exception): The error that occurred
+            telegram_api: Instance of TelegramAPI class
+            error_handler: Instance of ErrorHandler class
             
-        except Exception as e:
-            # Handle error
-            error_msg = f"Error generating content: {str(e)}"
-            print(f"❌ {error_msg}")
+        Returns:
+            bool: Always False
+        """
+        # Handle error
+        error_msg = f"Error generating content: {str(error)}"
+        print(f"❌ {error_msg}")
+        
+        # Check if error_handler is provided
+        if error_handler is None:
+            # Fallback if error_handler is not available
+            telegram_api.send_message(chat_id, f"❌ {error_msg}")
+        else:
+            error_handler.handle_error(chat_id, error, "Content Generation Error")
             
-            # Check if error_handler is provided
-            if error_handler is None:
-                # Fallback if error_handler is not available
-                telegram_api.send_message(chat_id, f"❌ {error_msg}")
-            else:
-                error_handler.handle_error(chat_id, e, "Content Generation Error")
-                
-            return False
+        return False
     
     def _handle_back_navigation(self, chat_id, parameters, telegram_api, user_state):
         """
@@ -490,7 +726,7 @@ class NavigationHandler:
             chat_id (int): Chat ID
             parameters (list): Parameters from callback data
             telegram_api: Instance of TelegramAPI class
-            user_state (dict): Current user state
+            user_state (UserState): Current user state
             
         Returns:
             bool: True if handled successfully
@@ -500,9 +736,13 @@ class NavigationHandler:
             
         target_level = parameters[0]
         
+        # Backing out of a chapter makes its speculative generations pointless
+        if self.prefetcher is not None and target_level != "r":
+            self.prefetcher.cancel(chat_id)
+        
         if target_level == "c":
             # Go back to class selection
-            return self.handle_start(chat_id, telegram_api)
+            return self.handle_start(chat_id, telegram_api, user_state.last_message_id)
             
         elif target_level == "s":
             # Go back to subject selection
@@ -512,18 +752,14 @@ class NavigationHandler:
             class_num = parameters[1]
             
             # Update user state
-            user_state["current_level"] = "class"
-            user_state["hierarchy"] = [class_num]
+            user_state.current_level = "class"
+            user_state.hierarchy = [class_num]
             
             # Send subject selection message
             message = self.ux.get_subject_selection_message(class_num)
             keyboard = self.menu_navigation.build_subject_keyboard(class_num)
             
-            result = telegram_api.send_message(chat_id, message, keyboard)
-            
-            if result.get("ok", False) and "result" in result:
-                user_state["last_message_id"] = result["result"]["message_id"]
-                return True
+            return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
                 
         elif target_level == "ss":
             # Go back to subsubject selection
@@ -533,25 +769,21 @@ class NavigationHandler:
             class_num = parameters[1]
             
             # Get current hierarchy from user state
-            hierarchy = user_state.get("hierarchy", [])
+            hierarchy = user_state.hierarchy
             if len(hierarchy) < 2:
                 return False
                 
             subject = hierarchy[1]
             
             # Update user state
-            user_state["current_level"] = "subject"
-            user_state["hierarchy"] = [class_num, subject]
+            user_state.current_level = "subject"
+            user_state.hierarchy = [class_num, subject]
             
             # Send subsubject selection message
             message = self.ux.get_subsubject_selection_message(class_num, subject)
             keyboard = self.menu_navigation.build_subsubject_keyboard(class_num, subject)
             
-            result = telegram_api.send_message(chat_id, message, keyboard)
-            
-            if result.get("ok", False) and "result" in result:
-                user_state["last_message_id"] = result["result"]["message_id"]
-                return True
+            return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
                 
         elif target_level == "ch":
             # Go back to chapter selection
@@ -561,7 +793,7 @@ class NavigationHandler:
             class_num = parameters[1]
             
             # Get current hierarchy from user state
-            hierarchy = user_state.get("hierarchy", [])
+            hierarchy = user_state.hierarchy
             if len(hierarchy) < 2:
                 return False
                 
@@ -573,8 +805,8 @@ class NavigationHandler:
                 subsubject = hierarchy[2]
                 
                 # Update user state
-                user_state["current_level"] = "subsubject"
-                user_state["hierarchy"] = [class_num, subject, subsubject]
+                user_state.current_level = "subsubject"
+                user_state.hierarchy = [class_num, subject, subsubject]
                 
                 # Send chapter selection message
                 message = self.ux.get_chapter_selection_message(class_num, subject, subsubject)
@@ -582,18 +814,14 @@ class NavigationHandler:
             else:
                 # class, subject
                 # Update user state
-                user_state["current_level"] = "subject"
-                user_state["hierarchy"] = [class_num, subject]
+                user_state.current_level = "subject"
+                user_state.hierarchy = [class_num, subject]
                 
                 # Send chapter selection message
                 message = self.ux.get_chapter_selection_message(class_num, subject)
                 keyboard = self.menu_navigation.build_chapter_keyboard([class_num, subject])
             
-            result = telegram_api.send_message(chat_id, message, keyboard)
-            
-            if result.get("ok", False) and "result" in result:
-                user_state["last_message_id"] = result["result"]["message_id"]
-                return True
+            return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
                 
         elif target_level == "r":
             # Go back to resource selection
@@ -603,10 +831,10 @@ class NavigationHandler:
             class_num = parameters[1]
             
             # Get current hierarchy from user state
-            hierarchy = user_state.get("hierarchy", [])
+            hierarchy = user_state.hierarchy
             
             # Update user state
-            user_state["current_level"] = "chapter"
+            user_state.current_level = "chapter"
             
             # Get chapter (last element in hierarchy)
             chapter = hierarchy[-1]
@@ -618,11 +846,7 @@ class NavigationHandler:
             message = self.ux.get_resource_type_selection_message(hierarchy_desc, chapter)
             keyboard = self.menu_navigation.build_resource_type_keyboard(hierarchy)
             
-            result = telegram_api.send_message(chat_id, message, keyboard)
-            
-            if result.get("ok", False) and "result" in result:
-                user_state["last_message_id"] = result["result"]["message_id"]
-                return True
+            return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
         
         return False
     
@@ -634,7 +858,7 @@ class NavigationHandler:
             chat_id (int): Chat ID
             parameters (list): Parameters from callback data
             telegram_api: Instance of TelegramAPI class
-            user_state (dict): Current user state
+            user_state (UserState): Current user state
             
         Returns:
             bool: True if handled successfully
@@ -646,7 +870,7 @@ class NavigationHandler:
         
         if option == "ch":
             # Go back to chapter selection
-            hierarchy = user_state.get("hierarchy", [])
+            hierarchy = user_state.hierarchy
             
             if len(hierarchy) < 2:
                 return self.handle_start(chat_id, telegram_api)
@@ -660,8 +884,8 @@ class NavigationHandler:
                 subsubject = hierarchy[2]
                 
                 # Update user state
-                user_state["current_level"] = "subsubject"
-                user_state["hierarchy"] = [class_num, subject, subsubject]
+                user_state.current_level = "subsubject"
+                user_state.hierarchy = [class_num, subject, subsubject]
                 
                 # Send chapter selection message
                 message = self.ux.get_chapter_selection_message(class_num, subject, subsubject)
@@ -669,22 +893,18 @@ class NavigationHandler:
             else:
                 # class, subject
                 # Update user state
-                user_state["current_level"] = "subject"
-                user_state["hierarchy"] = [class_num, subject]
+                user_state.current_level = "subject"
+                user_state.hierarchy = [class_num, subject]
                 
                 # Send chapter selection message
                 message = self.ux.get_chapter_selection_message(class_num, subject)
                 keyboard = self.menu_navigation.build_chapter_keyboard([class_num, subject])
             
-            result = telegram_api.send_message(chat_id, message, keyboard)
-            
-            if result.get("ok", False) and "result" in result:
-                user_state["last_message_id"] = result["result"]["message_id"]
-                return True
+            return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
                 
         elif option == "s":
             # Go back to subject selection
-            hierarchy = user_state.get("hierarchy", [])
+            hierarchy = user_state.hierarchy
             
             if len(hierarchy) < 1:
                 return self.handle_start(chat_id, telegram_api)
@@ -692,18 +912,14 @@ class NavigationHandler:
             class_num = hierarchy[0]
             
             # Update user state
-            user_state["current_level"] = "class"
-            user_state["hierarchy"] = [class_num]
+            user_state.current_level = "class"
+            user_state.hierarchy = [class_num]
             
             # Send subject selection message
             message = self.ux.get_subject_selection_message(class_num)
             keyboard = self.menu_navigation.build_subject_keyboard(class_num)
             
-            result = telegram_api.send_message(chat_id, message, keyboard)
-            
-            if result.get("ok", False) and "result" in result:
-                user_state["last_message_id"] = result["result"]["message_id"]
-                return True
+            return self._show_menu(chat_id, message, keyboard, telegram_api, user_state)
                 
         elif option == "c" or option == "start":
             # Go back to class selection
@@ -711,124 +927,73 @@ class NavigationHandler:
         
         return False
     
-    # Helper methods to get full names from shortened versions
+    def _resolve_node_id(self, level, parameters):
+        """
+        Get the catalogue node a numeric callback ID refers to
+        
+        Args:
+            level (str): Level the node is expected at
+            parameters (list): Parameters from callback data
+            
+        Returns:
+            tuple: Node path, or None if the parameters are not a known node ID
+        """
+        if len(parameters) != 1:
+            return None
+        
+        return self.menu_navigation.catalogue_index.resolve_id(level, parameters[0])
+    
+    # Helper methods to get full names from legacy callback tokens
     def _get_full_subject_name(self, class_num, subject_short):
         """
-        Get full subject name from shortened version
+        Get full subject name from its callback token
         
         Args:
             class_num (str): Class number
-            subject_short (str): Shortened subject name
+            subject_short (str): Callback token of the subject
             
         Returns:
             str: Full subject name or None if not found
         """
-        subjects = list(self.menu_navigation.course_data.get(class_num, {}).keys())
-        
-        # First try direct match
-        if subject_short in subjects:
-            return subject_short
-        
-        # Try to find a subject that starts with the shortened version
-        for subject in subjects:
-            if subject.lower().startswith(subject_short.lower()):
-                return subject
-                
-        # Try to find a subject that contains the shortened version
-        for subject in subjects:
-            if subject_short.lower() in subject.lower():
-                return subject
-        
-        return None
+        return self.menu_navigation.catalogue_index.resolve_subject(class_num, subject_short)
     
     def _get_full_subsubject_name(self, class_num, subject, subsubject_short):
         """
-        Get full subsubject name from shortened version
+        Get full subsubject name from its callback token
         
         Args:
             class_num (str): Class number
             subject (str): Subject name
-            subsubject_short (str): Shortened subsubject name
+            subsubject_short (str): Callback token of the subsubject
             
         Returns:
             str: Full subsubject name or None if not found
         """
-        subsubjects = list(self.menu_navigation.course_data.get(class_num, {}).get(subject, {}).get("Subsubjects", {}).keys())
-        
-        # First try direct match
-        if subsubject_short in subsubjects:
-            return subsubject_short
-        
-        # Try to find a subsubject that starts with the shortened version
-        for subsubject in subsubjects:
-            if subsubject.lower().startswith(subsubject_short.lower()):
-                return subsubject
-                
-        # Try to find a subsubject that contains the shortened version
-        for subsubject in subsubjects:
-            if subsubject_short.lower() in subsubject.lower():
-                return subsubject
-        
-        return None
+        return self.menu_navigation.catalogue_index.resolve_subsubject(class_num, subject, subsubject_short)
     
     def _get_full_chapter_name(self, class_num, subject, chapter_short, subsubject=None):
         """
-        Get full chapter name from shortened version
+        Get full chapter name from its callback token
         
         Args:
             class_num (str): Class number
             subject (str): Subject name
-            chapter_short (str): Shortened chapter name
+            chapter_short (str): Callback token of the chapter
             subsubject (str, optional): Subsubject name
             
         Returns:
             str: Full chapter name or None if not found
         """
-        if subsubject:
-            chapters = self.menu_navigation.course_data.get(class_num, {}).get(subject, {}).get("Subsubjects", {}).get(subsubject, {}).get("Chapters", [])
-        else:
-            chapters = self.menu_navigation.course_data.get(class_num, {}).get(subject, {}).get("Chapters", [])
-        
-        # First try direct match
-        if chapter_short in chapters:
-            return chapter_short
-        
-        # Try to find a chapter that starts with the shortened version
-        for chapter in chapters:
-            if chapter.lower().startswith(chapter_short.lower()):
-                return chapter
-                
-        # Try to find a chapter that contains the shortened version
-        for chapter in chapters:
-            if chapter_short.lower() in chapter.lower():
-                return chapter
-        
-        return None
+        return self.menu_navigation.catalogue_index.resolve_chapter(class_num, subject, chapter_short, subsubject)
     
     def _get_full_resource_type(self, resource_short):
         """
-        Get full resource type from shortened version
+        Get full resource type from its callback token
         
         Args:
-            resource_short (str): Shortened resource type
+            resource_short (str): Callback token of the resource type
             
         Returns:
             str: Full resource type or None if not found
         """
-        resource_types = self.menu_navigation.resource_types
-        
-        # First try direct match
-        if resource_short in resource_types:
-            return resource_short
-        
-        # Try to find a resource type that starts with the shortened version
-        for resource_type in resource_types:
-            if resource_type.lower().startswith(resource_short.lower()):
-                return resource_type
-                
-        # Try to find a resource type that contains the shortened version
-        for resource_type in resource_types:
-            if resource_short.lower() in resource_type.lower():
-                return resource_type
-        
-        return None
+        return self.menu_navigation.catalogue_index.resolve_resource(resource_short)
@@ -0,0 +1,262 @@
+"""
+Study Sphere AI - Prefetcher Module
+This module speculatively generates the resources a user is most likely to ask
+for next, so the content is cached or already in flight when the request comes
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+from admission import AdmissionController
+
+
+class _PrefetchJob:
+    """
+    Speculative generation queued for one chat
+    """
+
+    def __init__(self, chat_id, hierarchy, resource_type, difficulty):
+        self.chat_id = chat_id
+        self.hierarchy = hierarchy
+        self.resource_type = resource_type
+        self.difficulty = difficulty
+        self.cancelled = threading.Event()
+
+
+class SpeculativePrefetcher:
+    """
+    Class to warm the content cache for the resources of a chapter ranked by popularity
+
+    Requests are counted per chapter and across all chapters. When a user opens a
+    chapter, the highest ranked resources that have been requested before are
+    generated on a small pool of background threads.
+    """
+
+    def __init__(self, content_generator, max_concurrent=2, max_per_chapter=2, min_requests=1, max_queue=100,
+                 max_tracked=10000):
+        """
+        Initialize the SpeculativePrefetcher
+
+        Args:
+            content_generator: Instance of ContentGenerator class, with a cache
+            max_concurrent (int): Most speculative generations running at once
+            max_per_chapter (int): Most resources prefetched when a chapter is opened
+            min_requests (int): Requests a resource needs before it is prefetched
+            max_queue (int): Most queued jobs, further jobs are dropped
+            max_tracked (int): Most chapters whose request counts are kept
+        """
+        self.content_generator = content_generator
+        self.max_concurrent = max_concurrent
+        self.max_per_chapter = max_per_chapter
+        self.min_requests = min_requests
+        self.max_queue = max_queue
+        self.max_tracked = max_tracked
+
+        # Popularity: (resource_type, difficulty) counts overall and per chapter
+        self._overall = Counter()
+        self._chapters = OrderedDict()
+
+        # Recently prefetched (chapter, resource_type, difficulty), to count prefetches that were used
+        self._prefetched = OrderedDict()
+
+        self._queue = deque()
+        self._running = {}
+        self._workers = []
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._closed = False
+
+        self.stats = {
+            "scheduled": 0,
+            "started": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "dropped": 0,
+            "used": 0
+        }
+
+    def record(self, hierarchy, resource_type, difficulty=None):
+        """
+        Count a real request for a resource
+
+        Args:
+            hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
+            resource_type (str): Type of resource requested
+            difficulty (str, optional): Difficulty level
+        """
+        chapter = tuple(hierarchy)
+        choice = (resource_type, difficulty)
+
+        with self._lock:
+            self._overall[choice] += 1
+
+            counts = self._chapters.get(chapter)
+            if counts is None:
+                counts = self._chapters[chapter] = Counter()
+                if len(self._chapters) > self.max_tracked:
+                    self._chapters.popitem(last=False)
+            else:
+                self._chapters.move_to_end(chapter)
+            counts[choice] += 1
+
+            if self._prefetched.pop(chapter + choice, None) is not None:
+                self.stats["used"] += 1
+
+    def rank(self, hierarchy, candidates):
+        """
+        Order the resources of a chapter by how often they are requested
+
+        Args:
+            hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
+            candidates (list): (resource_type, difficulty) pairs available for the chapter
+
+        Returns:
+            list: Candidates requested at least min_requests times, most popular first
+        """
+        with self._lock:
+            counts = self._chapters.get(tuple(hierarchy), Counter())
+            scored = [
+                (counts[choice], self._overall[choice], choice)
+                for choice in candidates
+                if self._overall[choice] >= self.min_requests
+            ]
+
+        # Requests for this chapter come first, overall popularity breaks ties
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [choice for _, _, choice in scored]
+
+    def prefetch(self, chat_id, hierarchy, candidates):
+        """
+        Queue speculative generations for the chapter a user opened
+
+        Jobs still queued or running for the chat's previous chapter are cancelled
+
+        Args:
+            chat_id (int): Chat that opened the chapter
+            hierarchy (list): List containing [class_num, subject, (optional) subsubject, chapter]
+            candidates (list): (resource_type, difficulty) pairs available for the chapter
+
+        Returns:
+            int: Number of jobs queued
+        """
+        choices = self.rank(hierarchy, candidates)[:self.max_per_chapter]
+        self.cancel(chat_id)
+
+        if not choices:
+            return 0
+
+        queued = 0
+        with self._lock:
+            if self._closed:
+                return 0
+
+            for resource_type, difficulty in choices:
+                if len(self._queue) >= self.max_queue:
+                    self.stats["dropped"] += 1
+                    continue
+                self._queue.append(_PrefetchJob(chat_id, list(hierarchy), resource_type, difficulty))
+                self.stats["scheduled"] += 1
+                queued += 1
+
+            self._start_workers()
+            self._not_empty.notify(queued)
+
+        return queued
+
+    def cancel(self, chat_id):
+        """
+        Cancel the chat's queued and running jobs, used when the user backs out of a chapter
+
+        A running generation another request has joined still completes
+
+        Args:
+            chat_id (int): Chat whose jobs are cancelled
+
+        Returns:
+            int: Number of jobs cancelled
+        """
+        with self._lock:
+            kept = deque(job for job in self._queue if job.chat_id != chat_id)
+            cancelled = len(self._queue) - len(kept)
+            self._queue = kept
+
+            for job in self._running.values():
+                if job.chat_id == chat_id and not job.cancelled.is_set():
+                    job.cancelled.set()
+                    cancelled += 1
+
+            self.stats["cancelled"] += cancelled
+
+        return cancelled
+
+    def _start_workers(self):
+        """
+        Start worker threads up to the concurrency cap, the caller must hold the lock
+        """
+        while len(self._workers) < self.max_concurrent:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"prefetch-{len(self._workers) + 1}",
+                daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self):
+        """
+        Run queued jobs until the prefetcher is closed
+        """
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._not_empty.wait()
+                if self._closed:
+                    return
+                job = self._queue.popleft()
+                self._running[threading.get_ident()] = job
+                self.stats["started"] += 1
+
+            try:
+                warmed = self.content_generator.warm_cache(
+                    job.hierarchy,
+                    job.resource_type,
+                    job.difficulty,
+                    cancelled=job.cancelled.is_set,
+                    priority=AdmissionController.SPECULATIVE
+                )
+            except Exception as e:
+                print(f"❌ Prefetch of {job.resource_type} failed: {e}")
+                warmed = False
+
+            with self._lock:
+                del self._running[threading.get_ident()]
+                if warmed:
+                    self.stats["completed"] += 1
+                    self._prefetched[tuple(job.hierarchy) + (job.resource_type, job.difficulty)] = time.time()
+                    if len(self._prefetched) > self.max_tracked:
+                        self._prefetched.popitem(last=False)
+
+    def get_stats(self):
+        """
+        Get prefetch statistics
+
+        Returns:
+            dict: Job counters with the current queue length and running jobs
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["queued"] = len(self._queue)
+            stats["running"] = len(self._running)
+        return stats
+
+    def close(self):
+        """
+        Drop queued jobs, cancel running ones and stop the worker threads
+        """
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+            for job in self._running.values():
+                job.cancelled.set()
+            self._not_empty.notify_all()
@@ -0,0 +1,280 @@
+"""
+Study Sphere AI - Pregenerate Module
+This module generates study material for the whole catalogue into the content
+cache ahead of time, so peak-hour requests are served without calling the LLM
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+
+from admission import AdmissionController
+from course_data import COURSE_DATA, DIFFICULTY_LEVELS
+from navigation_handler import DIFFICULTY_RESOURCES
+from rate_limiter import TokenBucket
+
+
+def iter_catalogue_jobs(menu_navigation, course_data=COURSE_DATA, classes=None):
+    """
+    List every piece of study material a user can request
+
+    Args:
+        menu_navigation: Instance of MenuNavigation class, decides the resources of each subject
+        course_data (dict): Catalogue of classes, subjects, sub-subjects and chapters
+        classes (list, optional): Only walk these class numbers
+
+    Yields:
+        tuple: (hierarchy, resource_type, difficulty)
+    """
+    for class_num, subjects in course_data.items():
+        if classes and class_num not in classes:
+            continue
+
+        for subject, subject_info in subjects.items():
+            chapters = [[class_num, subject, chapter] for chapter in subject_info.get("Chapters", [])]
+            for subsubject, subsubject_info in subject_info.get("Subsubjects", {}).items():
+                chapters.extend(
+                    [class_num, subject, subsubject, chapter] for chapter in subsubject_info.get("Chapters", [])
+                )
+
+            resources = menu_navigation._get_subject_specific_resources(subject)
+
+            for hierarchy in chapters:
+                for resource_type in resources:
+                    if resource_type in DIFFICULTY_RESOURCES:
+                        for level in DIFFICULTY_LEVELS:
+                            yield hierarchy, resource_type, level["value"]
+                    else:
+                        # Matches what the menus request for resources without a difficulty
+                        yield hierarchy, resource_type, "mixed"
+
+
+class Pregenerator:
+    """
+    Class to warm the content cache for a list of jobs with a bounded, rate-limited worker pool
+    """
+
+    def __init__(self, content_generator, checkpoint_path, workers=4, requests_per_minute=20, progress_interval=30):
+        """
+        Initialize the Pregenerator
+
+        Args:
+            content_generator: Instance of ContentGenerator class, with a cache
+            checkpoint_path (str): File recording finished jobs, so an interrupted run resumes,
+                a job is only skipped while its cached content is current
+            workers (int): Number of generations running at once
+            requests_per_minute (float): Most generations started per minute
+            progress_interval (float): Seconds between progress reports
+        """
+        self.content_generator = content_generator
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.progress_interval = progress_interval
+
+        self._bucket = TokenBucket(requests_per_minute / 60.0, 1)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self.stats = {"total": 0, "skipped": 0, "done": 0, "failed": 0}
+
+    def _load_checkpoint(self):
+        """
+        Read the jobs finished by earlier runs whose content has not outlived the cache TTL
+
+        Returns:
+            dict: Job key -> prompt version stamp the job was generated with
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+
+        ttl = self.content_generator.cache.ttl
+        oldest = time.time() - ttl if ttl is not None else None
+
+        finished = {}
+        with open(self.checkpoint_path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                # Lines of older checkpoints carry no version or time and are done again
+                if not isinstance(entry, dict):
+                    continue
+                if oldest is not None and entry["finished_at"] < oldest:
+                    continue
+                finished[entry["key"]] = entry["version"]
+        return finished
+
+    def _job_key(self, job):
+        """
+        Build the checkpoint key and prompt version stamp of a job
+
+        The version stamp is the one the content cache checks, so a changed prompt
+        or model makes earlier checkpoint entries stale along with the cached content
+
+        Args:
+            job (tuple): (hierarchy, resource_type, difficulty)
+
+        Returns:
+            tuple: (job key, version stamp)
+        """
+        hierarchy, resource_type, difficulty = job
+        class_num, subject, subsubject, chapter = self.content_generator._split_hierarchy(hierarchy)
+        return self.content_generator._cache_key(class_num, subject, subsubject, chapter, resource_type, difficulty)
+
+    def _wait_for_slot(self):
+        """
+        Block the calling worker until the rate limit allows another generation
+
+        Returns:
+            bool: False if the run is stopping
+        """
+        while not self._stopping.is_set():
+            with self._lock:
+                now = time.monotonic()
+                delay = self._bucket.delay(now)
+                if delay <= 0:
+                    self._bucket.take(now)
+                    return True
+            self._stopping.wait(delay)
+        return False
+
+    def run(self, jobs):
+        """
+        Generate every job not finished by an earlier run
+
+        Args:
+            jobs (iterable): (hierarchy, resource_type, difficulty) tuples
+
+        Returns:
+            dict: Total, skipped, done and failed counts
+        """
+        finished = self._load_checkpoint()
+        pending = []
+        for job in jobs:
+            self.stats["total"] += 1
+            key, version = self._job_key(job)
+            if key in finished and finished[key] == version:
+                self.stats["skipped"] += 1
+            else:
+                pending.append(job)
+
+        print(
+            f"🔄 Pregenerating {len(pending)} of {self.stats['total']} items "
+            f"({self.stats['skipped']} already done) with {self.workers} workers"
+        )
+
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        remaining = iter(pending)
+        started = time.monotonic()
+
+        with open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            def work():
+                while self._wait_for_slot():
+                    with self._lock:
+                        job = next(remaining, None)
+                    if job is None:
+                        return
+
+                    try:
+                        warmed = self.content_generator.warm_cache(*job, priority=AdmissionController.BULK)
+                    except Exception as e:
+                        print(f"❌ Pregenerating {job[1]} for {' > '.join(job[0])} failed: {e}")
+                        warmed = False
+
+                    with self._lock:
+                        if warmed:
+                            self.stats["done"] += 1
+                            key, version = self._job_key(job)
+                            entry = {"key": key, "version": version, "finished_at": time.time()}
+                            checkpoint.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                            checkpoint.flush()
+                        else:
+                            self.stats["failed"] += 1
+
+            threads = [
+                threading.Thread(target=work, name=f"pregenerate-{number + 1}", daemon=True)
+                for number in range(self.workers)
+            ]
+            for thread in threads:
+                thread.start()
+
+            try:
+                alive = threads
+                last_report = time.monotonic()
+                while alive:
+                    alive[0].join(self.progress_interval)
+                    alive = [thread for thread in threads if thread.is_alive()]
+                    if alive and time.monotonic() - last_report >= self.progress_interval:
+                        self._report(len(pending), started)
+                        last_report = time.monotonic()
+            except KeyboardInterrupt:
+                print("⏹️ Stopping after the generations in progress, run again to resume")
+                self._stopping.set()
+                for thread in threads:
+                    thread.join()
+
+        self._report(len(pending), started)
+        return dict(self.stats)
+
+    def _report(self, pending, started):
+        """
+        Print progress and the estimated time left
+
+        Args:
+            pending (int): Number of jobs this run started with
+            started (float): Monotonic time the run started
+        """
+        with self._lock:
+            processed = self.stats["done"] + self.stats["failed"]
+            done = self.stats["done"]
+            failed = self.stats["failed"]
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        eta = (pending - processed) / rate if rate > 0 else float("inf")
+        eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta != float("inf") else "unknown"
+
+        print(
+            f"📊 {processed}/{pending} ({processed / pending * 100 if pending else 100:.1f}%), "
+            f"{done} cached, {failed} failed, {rate * 60:.1f}/min, ETA {eta_text}"
+        )
+
+
+def run_pregeneration(content_generator, menu_navigation, checkpoint_path, workers=4, requests_per_minute=20,
+                      classes=None, limit=None):
+    """
+    Pregenerate the catalogue into the content generator's cache
+
+    Args:
+        content_generator: Instance of ContentGenerator class, with a cache
+        menu_navigation: Instance of MenuNavigation class
+        checkpoint_path (str): File recording finished jobs
+        workers (int): Number of generations running at once
+        requests_per_minute (float): Most generations started per minute
+        classes (list, optional): Only pregenerate these class numbers
+        limit (int, optional): Stop after this many catalogue items
+
+    Returns:
+        dict: Total, skipped, done and failed counts
+    """
+    if not content_generator.cache:
+        raise ValueError("Pregeneration needs a content generator with a cache")
+
+    jobs = iter_catalogue_jobs(menu_navigation, classes=classes)
+    if limit:
+        jobs = itertools.islice(jobs, limit)
+
+    pregenerator = Pregenerator(
+        content_generator,
+        checkpoint_path,
+        workers=workers,
+        requests_per_minute=requests_per_minute
+    )
+    return pregenerator.run(jobs)
@@ -0,0 +1,372 @@
+"""
+Study Sphere AI - Rate Limiter Module
+This module paces outbound Telegram calls with a global token bucket and one
+token bucket per chat, queueing calls that would exceed Telegram's limits
+instead of letting them fail with 429 errors
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class TokenBucket:
+    """
+    Class to hand out tokens at a steady rate with a limited burst
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Initialize the TokenBucket full
+
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens held
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+        # Set when Telegram answers with retry_after, no tokens are handed out before it
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        """
+        Add the tokens accrued since the last update
+
+        Args:
+            now (float): Current monotonic time
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """
+        Get the seconds until a token is available
+
+        Args:
+            now (float): Current monotonic time
+
+        Returns:
+            float: Seconds to wait, 0 if a token is available now
+        """
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now):
+        """
+        Take one token
+
+        Args:
+            now (float): Current monotonic time
+        """
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, now, seconds):
+        """
+        Hand out no tokens for a while
+
+        Args:
+            now (float): Current monotonic time
+            seconds (float): Seconds to block
+        """
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def is_full(self, now):
+        """
+        Check whether the bucket has refilled completely
+
+        Args:
+            now (float): Current monotonic time
+
+        Returns:
+            bool: True if the bucket holds its full capacity and is not blocked
+        """
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class _ChatQueue:
+    """
+    Calls waiting to be sent to one chat
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.waiters = deque()
+        self.busy = False
+        self.last_used = time.monotonic()
+
+
+class OutboundScheduler:
+    """
+    Class to grant send slots to outbound calls within global and per-chat rate limits
+
+    Each chat has a FIFO of waiting calls and at most one call in flight, so
+    messages to a chat keep their order. A dispatcher thread grants slots as
+    tokens become available; callers wait for their slot on a future instead
+    of sleeping for a fixed time.
+    """
+
+    def __init__(self, global_rate=30, global_burst=30, per_chat_rate=1, per_chat_burst=3, idle_timeout=60):
+        """
+        Initialize the OutboundScheduler
+
+        Args:
+            global_rate (float): Calls per second across all chats
+            global_burst (float): Calls allowed at once across all chats
+            per_chat_rate (float): Calls per second to one chat
+            per_chat_burst (float): Calls allowed at once to one chat
+            idle_timeout (float): Seconds after which an idle chat's bucket is dropped
+        """
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.idle_timeout = idle_timeout
+
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats = {}
+        self._ready = set()
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = True
+        self._last_prune = time.monotonic()
+
+        self.stats = {
+            "granted": 0,
+            "throttled": 0,
+            "throttle_delay": 0.0,
+            "max_delay": 0.0,
+            "retry_after": 0,
+            "max_queue_depth": 0
+        }
+
+    def _ensure_started(self):
+        """
+        Start the dispatcher thread on first use
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch_loop, name="outbound-scheduler", daemon=True)
+            self._thread.start()
+
+    def request(self, chat_id, retry=False):
+        """
+        Queue a call to a chat
+
+        Args:
+            chat_id (int): Chat the call goes to
+            retry (bool): Put the call at the head of the chat's queue, used when
+                the call in flight is repeated after a 429 response
+
+        Returns:
+            Future: Resolves with the seconds spent queued once the call may be sent,
+                the caller must call release when the call is done
+        """
+        future = Future()
+
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Outbound scheduler is closed")
+
+            self._ensure_started()
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _ChatQueue(TokenBucket(self.per_chat_rate, self.per_chat_burst))
+
+            waiter = (future, time.monotonic())
+            if retry:
+                chat.waiters.appendleft(waiter)
+            else:
+                chat.waiters.append(waiter)
+
+            if not chat.busy:
+                self._ready.add(chat_id)
+
+            self._queued += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._queued)
+            self._condition.notify()
+
+        return future
+
+    def acquire(self, chat_id, retry=False):
+        """
+        Wait until a call to a chat may be sent
+
+        Args:
+            chat_id (int): Chat the call goes to
+            retry (bool): Whether the call in flight is being repeated
+
+        Returns:
+            float: Seconds spent queued
+        """
+        return self.request(chat_id, retry).result()
+
+    async def acquire_async(self, chat_id, retry=False):
+        """
+        Async counterpart of acquire, waiting without blocking the event loop
+
+        Args:
+            chat_id (int): Chat the call goes to
+            retry (bool): Whether the call in flight is being repeated
+
+        Returns:
+            float: Seconds spent queued
+        """
+        future = self.request(chat_id, retry)
+
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A slot granted just before the cancellation must still be given back
+            if not future.cancelled():
+                self.release(chat_id)
+            raise
+
+    def release(self, chat_id, retry_after=None):
+        """
+        Mark a chat's call as done so its next call can be granted
+
+        Args:
+            chat_id (int): Chat the call went to
+            retry_after (float, optional): Seconds Telegram asked to wait before the next call
+        """
+        with self._condition:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                return
+
+            now = time.monotonic()
+            chat.busy = False
+            chat.last_used = now
+
+            if retry_after:
+                chat.bucket.block(now, retry_after)
+                self.stats["retry_after"] += 1
+
+            if chat.waiters:
+                self._ready.add(chat_id)
+                self._condition.notify()
+
+    def _dispatch_loop(self):
+        """
+        Grant slots in order of readiness until the scheduler is closed
+        """
+        with self._condition:
+            while self._running:
+                timeout = self._grant_ready()
+                self._condition.wait(timeout)
+
+    def _grant_ready(self):
+        """
+        Grant every slot that is due, the caller must hold the lock
+
+        Returns:
+            float: Seconds until the next slot could be due, None if nothing is queued
+        """
+        while True:
+            now = time.monotonic()
+            self._prune(now)
+
+            if not self._ready:
+                return None
+
+            global_delay = self._global.delay(now)
+            if global_delay > 0:
+                return global_delay
+
+            # Among the chats whose bucket allows a call, serve the longest waiting first
+            best = None
+            next_due = None
+            for chat_id in self._ready:
+                chat = self._chats[chat_id]
+                delay = chat.bucket.delay(now)
+                if delay > 0:
+                    next_due = delay if next_due is None else min(next_due, delay)
+                elif best is None or chat.waiters[0][1] < self._chats[best].waiters[0][1]:
+                    best = chat_id
+
+            if best is None:
+                return next_due
+
+            chat = self._chats[best]
+            future, queued_at = chat.waiters.popleft()
+            self._ready.discard(best)
+            self._queued -= 1
+
+            if not future.set_running_or_notify_cancel():
+                # The caller gave up waiting, so the slot goes to the next call
+                if chat.waiters:
+                    self._ready.add(best)
+                continue
+
+            self._global.take(now)
+            chat.bucket.take(now)
+            chat.busy = True
+            chat.last_used = now
+
+            waited = now - queued_at
+            self.stats["granted"] += 1
+            if waited > 0.001:
+                self.stats["throttled"] += 1
+                self.stats["throttle_delay"] += waited
+                self.stats["max_delay"] = max(self.stats["max_delay"], waited)
+
+            future.set_result(waited)
+
+    def _prune(self, now):
+        """
+        Drop buckets of chats that have been idle long enough to refill, the caller must hold the lock
+
+        Args:
+            now (float): Current monotonic time
+        """
+        if now - self._last_prune < self.idle_timeout:
+            return
+
+        self._last_prune = now
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.busy and not chat.waiters and now - chat.last_used > self.idle_timeout
+            and chat.bucket.is_full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def get_stats(self):
+        """
+        Get queueing and throttling statistics
+
+        Returns:
+            dict: Slot, throttle and retry_after counters with the current queue depth
+        """
+        with self._condition:
+            stats = dict(self.stats)
+            stats["queue_depth"] = self._queued
+            stats["chats"] = len(self._chats)
+
+        stats["avg_delay"] = stats["throttle_delay"] / stats["throttled"] if stats["throttled"] else 0.0
+        return stats
+
+    def close(self):
+        """
+        Stop the dispatcher thread, calls still queued fail with RuntimeError
+        """
+        with self._condition:
+            self._running = False
+            for chat in self._chats.values():
+                while chat.waiters:
+                    future, _ = chat.waiters.popleft()
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(RuntimeError("Outbound scheduler is closed"))
+            self._ready.clear()
+            self._queued = 0
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -6,6 +6,9 @@ It can be used to create text files with properly formatted content when Telegra
 character limit is a concern.
 """
 
+import os
+import threading
+
 # Header Templates
 CLASS_HEADER = """
 ╔══════════════════════════════════════════════════════════════╗
@@ -372,8 +375,11 @@ def save_response_to_file(formatted_response, file_path):
         bool: True if successful, False otherwise
     """
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
+        # Write a temporary file and rename it, so a file being sent is never seen half written
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
             f.write(formatted_response)
+        os.replace(temp_path, file_path)
         return True
     except Exception as e:
         print(f"Error saving response to file: {e}")
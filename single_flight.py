@@ -0,0 +1,277 @@
+"""
+Study Sphere AI - Single Flight Module
+This module coalesces concurrent calls for the same key so that they share one
+execution of the underlying work and all callers receive its result
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+
+class SingleFlightTimeout(Exception):
+    """
+    Raised when a caller gives up waiting for a call started by another caller
+    """
+
+
+class SingleFlightCancelled(Exception):
+    """
+    Raised to callers waiting on a call whose leader was cancelled before it finished
+    """
+
+
+class _Call:
+    """
+    In-flight call shared by the callers of one key, from threads and event loops alike
+    """
+
+    def __init__(self):
+        self.future = concurrent.futures.Future()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Class to run at most one call per key at a time and share its outcome
+
+    Threads and coroutines share one registry, so a request handled on the event
+    loop joins a generation a prefetch thread started and the other way round
+    """
+
+    def __init__(self):
+        """
+        Initialize the SingleFlight group
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.stats = {"executions": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+
+    def _join(self, key, join=True):
+        """
+        Get the call in flight for key, registering a new one if there is none
+
+        Args:
+            key (hashable): Key identifying identical calls
+            join (bool, optional): Wait on a call already in flight, (None, False) is returned for it if not
+
+        Returns:
+            tuple: (call, True if the caller leads the call and must run it)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.stats["executions"] += 1
+                return call, True
+            if not join:
+                return None, False
+
+            call.waiters += 1
+            self.stats["coalesced"] += 1
+            return call, False
+
+    def _finish(self, key, call, result=None, error=None):
+        """
+        Hand the outcome of a call to its waiters and unregister it
+
+        Args:
+            key (hashable): Key identifying identical calls
+            call (_Call): Call that finished
+            result (Any, optional): Return value of the call
+            error (Exception, optional): Error raised by the call
+        """
+        with self._lock:
+            # A detached call no longer owns the key
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            if error is not None:
+                self.stats["errors"] += 1
+
+        if error is not None:
+            call.future.set_exception(error)
+        else:
+            call.future.set_result(result)
+
+    def _leave(self, call):
+        """
+        Stop counting a waiter that gave up on a call, so the call can still be detached
+
+        Args:
+            call (_Call): Call the waiter joined
+        """
+        with self._lock:
+            call.waiters -= 1
+
+    def _timed_out(self, key, call, timeout):
+        """
+        Count a waiter giving up and build its error
+
+        Args:
+            key (hashable): Key identifying identical calls
+            call (_Call): Call the waiter joined
+            timeout (float): Seconds the waiter waited
+
+        Returns:
+            SingleFlightTimeout: Error to raise
+        """
+        self._leave(call)
+        with self._lock:
+            self.stats["timeouts"] += 1
+        return SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight call {key!r}")
+
+    def _lead(self, key, call, function):
+        """
+        Run a call and hand its outcome to its waiters
+
+        Args:
+            key (hashable): Key identifying identical calls
+            call (_Call): Call registered for key by the caller
+            function (callable): Work to run
+
+        Returns:
+            Any: Return value of function
+        """
+        try:
+            result = function()
+        except Exception as e:
+            self._finish(key, call, error=e)
+        except BaseException:
+            self._finish(key, call, error=SingleFlightCancelled(f"In-flight call {key!r} was interrupted"))
+            raise
+        else:
+            self._finish(key, call, result)
+        return call.future.result()
+
+    def do(self, key, function, timeout=None):
+        """
+        Run function for key, or wait for the call already running for key
+
+        Args:
+            key (hashable): Key identifying identical calls
+            function (callable): Work to run when no call is in flight
+            timeout (float, optional): Maximum seconds to wait for another caller's call
+
+        Returns:
+            Any: Return value of the shared call
+
+        Raises:
+            SingleFlightTimeout: If the shared call did not finish within timeout
+            SingleFlightCancelled: If the caller running the shared call was cancelled
+            Exception: Any error raised by the shared call
+        """
+        call, leader = self._join(key)
+
+        if leader:
+            return self._lead(key, call, function)
+
+        try:
+            return call.future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise self._timed_out(key, call, timeout)
+
+    def lead(self, key, function):
+        """
+        Run function for key unless a call is already in flight for it, never waiting on another caller
+
+        Args:
+            key (hashable): Key identifying identical calls
+            function (callable): Work to run when no call is in flight
+
+        Returns:
+            tuple: (True, return value of function) if it ran, (False, None) if another call is in flight
+
+        Raises:
+            Exception: Any error raised by function
+        """
+        call, leader = self._join(key, join=False)
+        if not leader:
+            return False, None
+        return True, self._lead(key, call, function)
+
+    async def do_async(self, key, coroutine_function, timeout=None):
+        """
+        Async counterpart of do, sharing calls with threads and other event loops
+
+        Args:
+            key (hashable): Key identifying identical calls
+            coroutine_function (callable): Returns the coroutine to await when no call is in flight
+            timeout (float, optional): Maximum seconds to wait for another caller's call
+
+        Returns:
+            Any: Return value of the shared call
+
+        Raises:
+            SingleFlightTimeout: If the shared call did not finish within timeout
+            SingleFlightCancelled: If the caller running the shared call was cancelled
+            Exception: Any error raised by the shared call
+        """
+        call, leader = self._join(key)
+
+        if leader:
+            try:
+                result = await coroutine_function()
+            except asyncio.CancelledError:
+                # Waiters get an ordinary error, only the cancelled task sees CancelledError
+                self._finish(key, call, error=SingleFlightCancelled(f"In-flight call {key!r} was cancelled"))
+                raise
+            except Exception as e:
+                self._finish(key, call, error=e)
+            else:
+                self._finish(key, call, result)
+            return call.future.result()
+
+        try:
+            # Shield so a waiter timing out does not cancel the shared call
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(call.future)), timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out(key, call, timeout)
+        except asyncio.CancelledError:
+            self._leave(call)
+            raise
+
+    def detach(self, key):
+        """
+        Stop sharing the call in flight for key if no other caller is waiting on it
+
+        Callers arriving afterwards start a new call, so the detached call can be
+        abandoned without handing its outcome to anyone
+
+        Args:
+            key (hashable): Key identifying identical calls
+
+        Returns:
+            bool: True if the call was detached
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None or call.waiters:
+                return False
+            del self._calls[key]
+            return True
+
+    def in_flight(self, key):
+        """
+        Check whether a call is running for key
+
+        Args:
+            key (hashable): Key identifying identical calls
+
+        Returns:
+            bool: True if a call is in flight
+        """
+        with self._lock:
+            return key in self._calls
+
+    def get_stats(self):
+        """
+        Get coalescing statistics
+
+        Returns:
+            dict: Execution, coalesced, timeout and error counters
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
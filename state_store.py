@@ -0,0 +1,556 @@
+"""
+Study Sphere AI - User State Store Module
+This module keeps per-chat navigation state in a bounded store that evicts the
+least recently used chats and chats idle for longer than a TTL, optionally
+persisted to SQLite so restarts keep users where they were
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from catalogue_index import get_catalogue_index
+
+
+class UserState:
+    """
+    Class to hold one chat's navigation state
+
+    The hierarchy is kept as the catalogue ID of its deepest node and expanded to
+    names on access. Hierarchies outside the catalogue keep their names instead.
+    """
+
+    __slots__ = ("current_level", "node_id", "names", "last_message_id", "resource_type", "difficulty")
+
+    def __init__(self, current_level="start", hierarchy=None, last_message_id=None, resource_type=None, difficulty=None):
+        """
+        Initialize the UserState
+
+        Args:
+            current_level (str): Menu level the chat is at
+            hierarchy (list, optional): List containing [class_num, subject, (optional) subsubject, chapter]
+            last_message_id (int, optional): ID of the last menu message sent
+            resource_type (str, optional): Selected resource type
+            difficulty (str, optional): Selected difficulty level
+        """
+        self.current_level = current_level
+        self.last_message_id = last_message_id
+        self.resource_type = resource_type
+        self.difficulty = difficulty
+        self.hierarchy = hierarchy or []
+
+    @property
+    def hierarchy(self):
+        """
+        Get the navigation hierarchy
+
+        Returns:
+            list: List containing [class_num, subject, (optional) subsubject, chapter]
+        """
+        if self.names is not None:
+            return list(self.names)
+        if self.node_id is None:
+            return []
+        return get_catalogue_index().resolve_hierarchy(self.node_id)
+
+    @hierarchy.setter
+    def hierarchy(self, hierarchy):
+        self.node_id = get_catalogue_index().hierarchy_id(hierarchy) if hierarchy else None
+        self.names = tuple(hierarchy) if hierarchy and self.node_id is None else None
+
+    def to_dict(self):
+        """
+        Convert the state to a JSON-serializable dict
+
+        Returns:
+            dict: State fields
+        """
+        return {
+            "current_level": self.current_level,
+            "node_id": self.node_id,
+            "names": list(self.names) if self.names is not None else None,
+            "last_message_id": self.last_message_id,
+            "resource_type": self.resource_type,
+            "difficulty": self.difficulty
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a state from to_dict output or an older dict-based state
+
+        Args:
+            data (dict): State fields
+
+        Returns:
+            UserState: Navigation state
+        """
+        state = cls(
+            data.get("current_level", "start"),
+            data.get("hierarchy"),
+            data.get("last_message_id"),
+            data.get("resource_type"),
+            data.get("difficulty")
+        )
+
+        if "node_id" in data:
+            state.node_id = data["node_id"]
+            state.names = tuple(data["names"]) if data.get("names") is not None else None
+
+        return state
+
+
+def estimate_state_size(state):
+    """
+    Estimate the memory used by one navigation state
+
+    Args:
+        state (UserState or dict): Navigation state
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    if isinstance(state, dict):
+        values = state.values()
+    else:
+        values = [getattr(state, name) for name in state.__slots__]
+
+    size = sys.getsizeof(state)
+    for value in values:
+        size += sys.getsizeof(value)
+        if isinstance(value, (list, tuple)):
+            size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class UserStateStore:
+    """
+    Class to hold navigation state per chat with LRU, TTL and memory-based eviction
+
+    The store supports the dict operations NavigationHandler uses, so other
+    backends can replace it by offering the same interface
+    """
+
+    def __init__(self, max_entries=100000, ttl=24 * 3600, max_memory_bytes=64 * 1024 * 1024):
+        """
+        Initialize the UserStateStore
+
+        Args:
+            max_entries (int): Maximum number of chats kept
+            ttl (float): Seconds a chat's state survives without being accessed, None disables expiry
+            max_memory_bytes (int): Approximate memory ceiling for all states, None disables it
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+
+        # chat_id -> (state, last_access, size), least recently used first
+        self._states = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evicted_lru": 0,
+            "evicted_memory": 0
+        }
+
+    def get(self, chat_id, default=None):
+        """
+        Get the state of a chat
+
+        Args:
+            chat_id (int): Chat ID
+            default: Value returned when the chat has no state
+
+        Returns:
+            UserState: Navigation state, or default if missing or expired
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._states.get(chat_id)
+            if entry is None:
+                self.stats["misses"] += 1
+                return default
+
+            state, last_access, size = entry
+            if self._is_expired(last_access, now):
+                self._remove(chat_id)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return default
+
+            # Callers mutate the returned state in place, so refresh its size on access
+            self._store(chat_id, state, now, size)
+            self._evict(now)
+            self.stats["hits"] += 1
+            return state
+
+    def __getitem__(self, chat_id):
+        state = self.get(chat_id)
+        if state is None:
+            raise KeyError(chat_id)
+        return state
+
+    def __setitem__(self, chat_id, state):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._states.get(chat_id)
+            self._store(chat_id, state, now, entry[2] if entry else 0)
+            self._evict(now)
+
+    def __delitem__(self, chat_id):
+        with self._lock:
+            if chat_id not in self._states:
+                raise KeyError(chat_id)
+            self._remove(chat_id)
+
+    def save(self, chat_id, state):
+        """
+        Record the changes a handler made to a state it got from the store
+
+        Args:
+            chat_id (int): Chat ID
+            state (UserState): Navigation state updated in place
+
+        Returns:
+            bool: False if the chat's state was replaced by another one meanwhile
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._states.get(chat_id)
+            if entry is not None and entry[0] is not state:
+                return False
+
+            # An evicted state is stored again, it is still the chat's latest navigation
+            self._store(chat_id, state, now, entry[2] if entry else 0)
+            self._evict(now)
+            return True
+
+    def __contains__(self, chat_id):
+        with self._lock:
+            entry = self._states.get(chat_id)
+            return entry is not None and not self._is_expired(entry[1], time.monotonic())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._states)
+
+    def _is_expired(self, last_access, now):
+        """
+        Check whether a state accessed at the given time has outlived the TTL
+
+        Args:
+            last_access (float): Monotonic time of the last access
+            now (float): Current monotonic time
+
+        Returns:
+            bool: True if the state is expired
+        """
+        return self.ttl is not None and now - last_access > self.ttl
+
+    def _store(self, chat_id, state, now, previous_size):
+        """
+        Store a state as the most recently used entry
+
+        Args:
+            chat_id (int): Chat ID
+            state (UserState): Navigation state
+            now (float): Current monotonic time
+            previous_size (int): Size accounted for the chat so far
+        """
+        size = estimate_state_size(state)
+        self._memory_bytes += size - previous_size
+        self._states[chat_id] = (state, now, size)
+        self._states.move_to_end(chat_id)
+
+    def _remove(self, chat_id):
+        """
+        Remove a chat's state
+
+        Args:
+            chat_id (int): Chat ID
+        """
+        _, _, size = self._states.pop(chat_id)
+        self._memory_bytes -= size
+
+    def _evict(self, now):
+        """
+        Drop expired states and the least recently used states above the limits
+
+        Entries are kept in access order, so expired states are always at the front
+
+        Args:
+            now (float): Current monotonic time
+        """
+        while self._states:
+            chat_id, (_, last_access, _) = next(iter(self._states.items()))
+
+            if self._is_expired(last_access, now):
+                self.stats["expired"] += 1
+            elif len(self._states) > self.max_entries:
+                self.stats["evicted_lru"] += 1
+            elif self.max_memory_bytes is not None and self._memory_bytes > self.max_memory_bytes:
+                self.stats["evicted_memory"] += 1
+            else:
+                break
+
+            self._remove(chat_id)
+
+    def get_stats(self):
+        """
+        Get store statistics
+
+        Returns:
+            dict: Hit, miss and eviction counters with current size
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._states)
+            stats["memory_bytes"] = self._memory_bytes
+        return stats
+
+
+class SQLiteStateStore:
+    """
+    Class to persist navigation state in SQLite behind a hot in-memory store
+
+    Reads are served from the hot store and fall through to SQLite on a miss.
+    Writes are batched: chats stored or saved since the last flush are written
+    together by a background thread, so taps never wait on the disk. States
+    changed in place must be saved once the changes are complete.
+    """
+
+    def __init__(self, db_path, flush_interval=1.0, ttl=24 * 3600, hot_store=None):
+        """
+        Initialize the SQLiteStateStore
+
+        Args:
+            db_path (str): Path of the SQLite database
+            flush_interval (float): Seconds between write-behind flushes
+            ttl (float): Seconds a chat's state survives on disk without being saved, None disables expiry
+            hot_store (UserStateStore, optional): In-memory tier, a default UserStateStore if not given
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.hot = hot_store if hot_store is not None else UserStateStore(ttl=ttl)
+
+        # chat_id -> state to write, or None to delete, since the last flush
+        self._dirty = {}
+        self._dirty_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        self.stats = {"disk_hits": 0, "disk_misses": 0, "flushes": 0, "rows_written": 0, "flush_errors": 0}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS user_states ("
+            "chat_id INTEGER PRIMARY KEY, "
+            "state TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS user_states_updated ON user_states (updated_at)")
+        self._db.commit()
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="state-flusher", daemon=True)
+        self._flusher.start()
+
+    def _mark_dirty(self, chat_id, state):
+        """
+        Queue a chat's state for the next flush
+
+        Args:
+            chat_id (int): Chat ID
+            state (UserState): Navigation state, or None to delete it
+        """
+        with self._dirty_lock:
+            self._dirty[chat_id] = state
+
+    def _load(self, chat_id):
+        """
+        Read a chat's state from SQLite
+
+        Args:
+            chat_id (int): Chat ID
+
+        Returns:
+            UserState: Navigation state or None if missing or expired
+        """
+        with self._dirty_lock:
+            if chat_id in self._dirty:
+                # Written or deleted since the last flush, the database is behind
+                return self._dirty[chat_id]
+
+        with self._db_lock:
+            row = self._db.execute("SELECT state, updated_at FROM user_states WHERE chat_id = ?", (chat_id,)).fetchone()
+
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            self.stats["disk_misses"] += 1
+            return None
+
+        self.stats["disk_hits"] += 1
+        return UserState.from_dict(json.loads(row[0]))
+
+    def get(self, chat_id, default=None):
+        """
+        Get the state of a chat
+
+        Args:
+            chat_id (int): Chat ID
+            default: Value returned when the chat has no state
+
+        Returns:
+            UserState: Navigation state, or default if missing or expired
+        """
+        state = self.hot.get(chat_id)
+
+        if state is None:
+            state = self._load(chat_id)
+            if state is None:
+                return default
+            self.hot[chat_id] = state
+
+        return state
+
+    def __getitem__(self, chat_id):
+        state = self.get(chat_id)
+        if state is None:
+            raise KeyError(chat_id)
+        return state
+
+    def __setitem__(self, chat_id, state):
+        self.hot[chat_id] = state
+        self._mark_dirty(chat_id, state)
+
+    def save(self, chat_id, state):
+        """
+        Queue the changes a handler made to a state it got from the store for the next flush
+
+        Args:
+            chat_id (int): Chat ID
+            state (UserState): Navigation state updated in place
+
+        Returns:
+            bool: False if the chat's state was replaced by another one meanwhile
+        """
+        if not self.hot.save(chat_id, state):
+            return False
+        self._mark_dirty(chat_id, state)
+        return True
+
+    def __delitem__(self, chat_id):
+        if chat_id not in self:
+            raise KeyError(chat_id)
+        if chat_id in self.hot:
+            del self.hot[chat_id]
+        self._mark_dirty(chat_id, None)
+
+    def __contains__(self, chat_id):
+        return chat_id in self.hot or self._load(chat_id) is not None
+
+    def __len__(self):
+        self.flush()
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM user_states").fetchone()[0]
+
+    def _flush_loop(self):
+        """
+        Flush dirty states every flush_interval until closed
+        """
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Write all states changed since the last flush in one transaction
+
+        Returns:
+            int: Number of rows written or deleted
+        """
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, {}
+
+        if not dirty:
+            return 0
+
+        now = time.time()
+        rows = []
+        deleted = []
+        for chat_id, state in dirty.items():
+            if state is None:
+                deleted.append((chat_id,))
+                continue
+            rows.append((chat_id, json.dumps(state.to_dict(), ensure_ascii=False), now))
+
+        try:
+            with self._db_lock:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO user_states (chat_id, state, updated_at) VALUES (?, ?, ?)",
+                        rows
+                    )
+                    self._db.executemany("DELETE FROM user_states WHERE chat_id = ?", deleted)
+                    if self.ttl is not None:
+                        self._db.execute("DELETE FROM user_states WHERE updated_at < ?", (now - self.ttl,))
+        except sqlite3.Error as e:
+            print(f"❌ Error flushing user states: {e}")
+            self.stats["flush_errors"] += 1
+            for chat_id, state in dirty.items():
+                self._requeue(chat_id, state)
+            return 0
+
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(rows) + len(deleted)
+        return len(rows) + len(deleted)
+
+    def _requeue(self, chat_id, state):
+        """
+        Queue a state again after a failed write unless it changed since
+
+        Args:
+            chat_id (int): Chat ID
+            state (UserState): Navigation state, or None to delete it
+        """
+        with self._dirty_lock:
+            self._dirty.setdefault(chat_id, state)
+
+    def get_stats(self):
+        """
+        Get store statistics
+
+        Returns:
+            dict: Hot store counters with disk and flush counters
+        """
+        stats = self.hot.get_stats()
+        stats.update(self.stats)
+        with self._dirty_lock:
+            stats["dirty"] = len(self._dirty)
+        return stats
+
+    def close(self):
+        """
+        Stop the flush thread, write pending states and close the database
+        """
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+
+        with self._db_lock:
+            self._db.close()
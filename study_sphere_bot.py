@@ -9,7 +9,12 @@ Version: 1.0.0
 Date: March 2025
 """
 
+import argparse
+import asyncio
+import functools
 import json
+import os
+import secrets
 import urllib.request
 import urllib.parse
 import time
@@ -17,15 +22,28 @@ import ssl
 import re
 import traceback
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # Import custom modules
 from telegram_api import TelegramAPI
+from rate_limiter import OutboundScheduler
 from deepseek_api import DeepSeekAPI
+from admission import AdmissionController
+from circuit_breaker import CircuitBreaker
+from hedging import HedgingPolicy
+from model_router import ModelBackend, ModelRouter
+from http_pool import create_insecure_ssl_context
 from menu_navigation import MenuNavigation
 from content_generator import ContentGenerator
+from content_cache import ContentCache
 from error_handler import ErrorHandler
 from user_experience import UserExperience
-from navigation_handler import NavigationHandler
+from navigation_handler import NavigationHandler, GenerationRequest
+from prefetcher import SpeculativePrefetcher
+from pregenerate import run_pregeneration
+from state_store import SQLiteStateStore, UserStateStore
+from update_dispatcher import UpdateDispatcher, get_update_chat_id
+from webhook_server import WebhookServer
 from course_data import COURSE_DATA, RESOURCE_TYPES, DIFFICULTY_LEVELS
 
 # ========================
@@ -36,30 +54,247 @@ DEEP_SEEK_API_KEY = "sk-or-v1-f3f4cefb2e8098c63084b63819b17f2c0cb935c34463fc135f
 DEEP_SEEK_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
 DEEP_SEEK_MODEL = "deepseek/deepseek-r1-zero:free"
 
+# One API client is shared by every component calling the LLM
+DEEP_SEEK_POOL_SIZE = 4
+DEEP_SEEK_MAX_CONCURRENT = 8  # calls in flight at once, further calls wait
+DEEP_SEEK_TIMEOUT = 120  # seconds, until enough latencies are known for an adaptive timeout
+DEEP_SEEK_MIN_TIMEOUT = 10  # seconds
+
+# After this many failed calls in a row the API is skipped for a while and fallback content is served
+DEEP_SEEK_BREAKER_THRESHOLD = 5
+DEEP_SEEK_BREAKER_RESET = 30  # seconds
+
+# Race a second request against calls slower than the p90 latency, at most one hedge per 10 calls
+DEEP_SEEK_HEDGING = False
+DEEP_SEEK_HEDGE_PERCENTILE = 90
+DEEP_SEEK_HEDGE_BUDGET = 0.1  # hedges per call
+DEEP_SEEK_HEDGE_MODEL = None  # e.g. another free model on OpenRouter, None hedges with the same model
+
+# Generation settings replacing those of deepseek_api.GENERATION_PROFILES, per resource type,
+# e.g. {"Sample Paper": {"max_tokens": 2048}}. Check the token usage printed on shutdown: a
+# p90 far below max_tokens leaves room to lower it, truncated calls need it raised
+GENERATION_PROFILE_OVERRIDES = {}
+
+# LLM backends each generation is routed between, by rolling latency and error rate. Weights
+# prefer (above 1), avoid (below 1) or exclude (0) a backend for a resource type, e.g. a small
+# fast model with {"Quick Revision Notes": 2.0, "Sample Paper": 0.25}. An optional "profiles"
+# entry overrides generation settings for the backend's model only. The first backend's
+# prompts and fallback content are used. STUDY_SPHERE_LLM_BACKENDS replaces the list with the
+# same structure as JSON, e.g. to point the bot at local stub servers.
+LLM_BACKENDS = [
+    {
+        "name": "deepseek-r1",
+        "base_url": DEEP_SEEK_BASE_URL,
+        "model": DEEP_SEEK_MODEL,
+        "api_key": DEEP_SEEK_API_KEY,
+        "weights": {}
+    }
+]
+LLM_BACKENDS_JSON = os.environ.get("STUDY_SPHERE_LLM_BACKENDS", "")
+LLM_ROUTER_EXPLORE_RATIO = 0.05  # share of generations sent to a backend that is not the best
+
+# Global cap on generations in flight across all backends. Queued user requests go before
+# prefetches and pregeneration; a request expected to wait longer than its SLO gets cached or
+# fallback content instead, None waits as long as it takes
+LLM_MAX_IN_FLIGHT = 6
+LLM_QUEUE_SLO = {
+    AdmissionController.INTERACTIVE: 20,  # seconds
+    AdmissionController.SPECULATIVE: 5,  # seconds, a late prefetch is rarely used
+    AdmissionController.BULK: None
+}
+
+# Keep-alive connection pool settings for the Telegram API
+TELEGRAM_POOL_SIZE = 4
+TELEGRAM_POOL_IDLE_TIMEOUT = 60  # seconds
+TELEGRAM_POOL_MAX_RECONNECTS = 1
+
+# Outbound rate limits (Telegram allows about 30 messages/s overall and 1/s per chat)
+TELEGRAM_GLOBAL_RATE = 30  # calls per second
+TELEGRAM_CHAT_RATE = 1  # calls per second
+TELEGRAM_CHAT_BURST = 3
+TELEGRAM_RATE_LIMIT_RETRIES = 3
+
+# Responses needing more messages than this are sent as a text file document
+MAX_CHUNKED_MESSAGES = 2
+
+# Concurrent update processing settings
+UPDATE_WORKERS = 8
+UPDATE_QUEUE_SIZE = 1000
+UPDATE_SHUTDOWN_TIMEOUT = 15  # seconds updates in progress get to finish before shared resources are closed
+
+# Stream generated content into the "generating" message (edits are throttled
+# to stay within Telegram's per-chat edit rate limits)
+STREAM_RESPONSES = True
+STREAM_EDIT_INTERVAL = 1.5  # seconds
+
+# Show each menu by editing the previous menu message instead of sending a new one
+EDIT_MENUS = True
+
+# Generated content cache (memory LRU tier backed by SQLite)
+CONTENT_CACHE_PATH = "/tmp/study_sphere/content_cache.sqlite3"
+CONTENT_CACHE_MEMORY_ENTRIES = 512
+CONTENT_CACHE_DISK_ENTRIES = 50000
+CONTENT_CACHE_TTL = 7 * 24 * 3600  # seconds
+
+# Speculative generation of a chapter's most requested resources while its menu is shown
+SPECULATIVE_PREFETCH = False
+PREFETCH_WORKERS = 2
+PREFETCH_PER_CHAPTER = 2
+
+# Offline pregeneration of the whole catalogue into the content cache
+PREGENERATE_CHECKPOINT_PATH = "/tmp/study_sphere/pregenerate_checkpoint.jsonl"
+PREGENERATE_WORKERS = 4
+PREGENERATE_REQUESTS_PER_MINUTE = 20
+
+# Per-chat navigation state (least recently used and idle chats are evicted
+# from memory, an empty path keeps state in memory only)
+USER_STATE_PATH = "/tmp/study_sphere/user_states.sqlite3"
+USER_STATE_MAX_ENTRIES = 100000
+USER_STATE_TTL = 24 * 3600  # seconds
+USER_STATE_MAX_MEMORY = 64 * 1024 * 1024  # bytes
+USER_STATE_FLUSH_INTERVAL = 1.0  # seconds
+
+# Webhook mode settings (the public URL must point at the embedded server)
+WEBHOOK_URL = os.environ.get("STUDY_SPHERE_WEBHOOK_URL", "")
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_SECRET_TOKEN = os.environ.get("STUDY_SPHERE_WEBHOOK_SECRET", "")
+
 class StudySphereBot:
     """
     Main bot class that orchestrates all components and handles the main loop
     """
     
-    def __init__(self):
+    def __init__(self, num_workers=UPDATE_WORKERS, max_queue_size=UPDATE_QUEUE_SIZE, stream_responses=STREAM_RESPONSES,
+                 prefetch=SPECULATIVE_PREFETCH, hedge=DEEP_SEEK_HEDGING):
         """
         Initialize the Study Sphere AI bot with all required components
+        
+        Args:
+            num_workers (int, optional): Number of threads processing updates
+            max_queue_size (int, optional): Maximum number of queued updates
+            stream_responses (bool, optional): Stream generated content as it arrives
+            prefetch (bool, optional): Speculatively generate likely resources when a chapter is opened
+            hedge (bool, optional): Race a second request against slow LLM calls
         """
         print("🚀 Initializing Study Sphere AI Bot...")
         
-        # Initialize API clients
-        self.telegram_api = TelegramAPI(TELEGRAM_BOT_TOKEN)
-        self.deepseek_api = DeepSeekAPI(DEEP_SEEK_API_KEY, DEEP_SEEK_BASE_URL, DEEP_SEEK_MODEL)
+        # Initialize API clients, sharing one SSL context
+        ssl_context = create_insecure_ssl_context()
+        self.telegram_api = TelegramAPI(
+            TELEGRAM_BOT_TOKEN,
+            pool_size=TELEGRAM_POOL_SIZE,
+            idle_timeout=TELEGRAM_POOL_IDLE_TIMEOUT,
+            max_reconnects=TELEGRAM_POOL_MAX_RECONNECTS,
+            scheduler=OutboundScheduler(
+                global_rate=TELEGRAM_GLOBAL_RATE,
+                global_burst=TELEGRAM_GLOBAL_RATE,
+                per_chat_rate=TELEGRAM_CHAT_RATE,
+                per_chat_burst=TELEGRAM_CHAT_BURST
+            ),
+            max_rate_limit_retries=TELEGRAM_RATE_LIMIT_RETRIES,
+            ssl_context=ssl_context
+        )
+        self.llm_router = create_model_router(ssl_context, hedge=hedge)
+        self.llm_admission = AdmissionController(max_in_flight=LLM_MAX_IN_FLIGHT, slo=LLM_QUEUE_SLO)
         
         # Initialize helper modules
         self.menu_navigation = MenuNavigation()
-        self.content_generator = ContentGenerator(DEEP_SEEK_API_KEY, DEEP_SEEK_BASE_URL, DEEP_SEEK_MODEL)
+        index_stats = self.menu_navigation.catalogue_index.get_stats()
+        print(
+            f"✅ Catalogue index built: {index_stats['nodes']} nodes, ID table v{index_stats['ids_version']}, "
+            f"{index_stats['build_time'] * 1000:.1f} ms, {index_stats['memory_bytes'] / 1024:.1f} KiB"
+        )
+        if index_stats["new_ids"]:
+            # IDs assigned only in memory would change on the next start
+            print(f"⚠️ {index_stats['new_ids']} catalogue nodes have no stable ID, run catalogue_index.py to update the table")
+        
+        started = time.perf_counter()
+        keyboard_count = self.menu_navigation.warm_keyboards()
+        print(f"✅ Prebuilt {keyboard_count} keyboards in {(time.perf_counter() - started) * 1000:.1f} ms")
+        self.content_cache = ContentCache(
+            CONTENT_CACHE_PATH,
+            max_memory_entries=CONTENT_CACHE_MEMORY_ENTRIES,
+            max_disk_entries=CONTENT_CACHE_DISK_ENTRIES,
+            ttl=CONTENT_CACHE_TTL
+        )
+        self.content_generator = ContentGenerator(
+            DEEP_SEEK_API_KEY,
+            DEEP_SEEK_BASE_URL,
+            DEEP_SEEK_MODEL,
+            cache=self.content_cache,
+            api=self.llm_router,
+            admission=self.llm_admission
+        )
         self.user_experience = UserExperience()
-        self.error_handler = ErrorHandler(self.telegram_api)
-        self.navigation_handler = NavigationHandler(self.menu_navigation, self.user_experience)
+        self.error_handler = ErrorHandler(self.telegram_api, max_chunked_messages=MAX_CHUNKED_MESSAGES)
+        self.user_state_store = UserStateStore(
+            max_entries=USER_STATE_MAX_ENTRIES,
+            ttl=USER_STATE_TTL,
+            max_memory_bytes=USER_STATE_MAX_MEMORY
+        )
+        if USER_STATE_PATH:
+            # Persist navigation so restarts do not send every user back to /start
+            self.user_state_store = SQLiteStateStore(
+                USER_STATE_PATH,
+                flush_interval=USER_STATE_FLUSH_INTERVAL,
+                ttl=USER_STATE_TTL,
+                hot_store=self.user_state_store
+            )
+        self.prefetcher = None
+        if prefetch:
+            self.prefetcher = SpeculativePrefetcher(
+                self.content_generator,
+                max_concurrent=PREFETCH_WORKERS,
+                max_per_chapter=PREFETCH_PER_CHAPTER
+            )
+        self.navigation_handler = NavigationHandler(
+            self.menu_navigation,
+            self.user_experience,
+            stream_responses=stream_responses,
+            stream_edit_interval=STREAM_EDIT_INTERVAL,
+            state_store=self.user_state_store,
+            edit_menus=EDIT_MENUS,
+            prefetcher=self.prefetcher
+        )
+        
+        # Run updates concurrently while keeping each chat's updates in order
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.dispatcher = UpdateDispatcher(self._process_update, num_workers, max_queue_size)
         
         print("✅ Bot components initialized successfully")
     
+    def close(self):
+        """
+        Release resources held by the bot's components
+        """
+        if self.prefetcher is not None:
+            prefetch_stats = self.prefetcher.get_stats()
+            print(
+                f"📊 Prefetch: {prefetch_stats['completed']} warmed, {prefetch_stats['used']} used, "
+                f"{prefetch_stats['cancelled']} cancelled, {prefetch_stats['dropped']} dropped"
+            )
+            self.prefetcher.close()
+        
+        if hasattr(self.user_state_store, "close"):
+            # Write navigation state still waiting for the write-behind flush
+            self.user_state_store.close()
+        self.content_cache.close()
+        
+        print_admission_stats(self.llm_admission)
+        print_llm_stats(self.llm_router)
+        self.llm_router.close()
+        
+        scheduler_stats = self.telegram_api.scheduler.get_stats()
+        print(
+            f"📊 Outbound calls: {scheduler_stats['granted']} sent, {scheduler_stats['throttled']} throttled "
+            f"(avg {scheduler_stats['avg_delay'] * 1000:.0f} ms, max {scheduler_stats['max_delay'] * 1000:.0f} ms), "
+            f"{scheduler_stats['retry_after']} retry_after, max queue depth {scheduler_stats['max_queue_depth']}"
+        )
+        self.telegram_api.close()
+    
     def start(self):
         """
         Start the bot and begin processing updates
@@ -70,6 +305,8 @@ class StudySphereBot:
         self.telegram_api.delete_webhook()
         print("✅ Webhook deleted")
         
+        self.dispatcher.start()
+        
         print("🔄 Bot is now running. Press Ctrl+C to stop.")
         
         # Main loop
@@ -78,15 +315,13 @@ class StudySphereBot:
                 # Get updates from Telegram API
                 updates = self.telegram_api.process_updates()
                 
-                # Process each update
+                # Hand each update to the dispatcher (blocks while the queue is full)
                 for update in updates:
-                    self._process_update(update)
-                    
-                # Small delay to avoid excessive API calls
-                time.sleep(0.5)
+                    self.dispatcher.submit(update)
                 
             except KeyboardInterrupt:
                 print("👋 Bot stopped by user")
+                self._stop_dispatcher()
                 break
                 
             except Exception as e:
@@ -94,6 +329,58 @@ class StudySphereBot:
                 print(traceback.format_exc())
                 time.sleep(5)  # Wait before retrying
     
+    def start_webhook(self, webhook_url, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, secret_token=None):
+        """
+        Start the bot in webhook mode, receiving updates on an embedded HTTP server
+        
+        Args:
+            webhook_url (str): Public HTTPS URL that forwards to the embedded server
+            host (str, optional): Interface the server listens on
+            port (int, optional): Port the server listens on
+            path (str, optional): URL path updates are posted to
+            secret_token (str, optional): Secret Telegram must send with every update,
+                a random one is generated if not given
+        """
+        print("🔄 Starting Study Sphere AI Bot (webhook mode)...")
+        
+        secret_token = secret_token or secrets.token_urlsafe(32)
+        
+        self.dispatcher.start()
+        self.webhook_server = WebhookServer(
+            lambda update: self.dispatcher.submit(update, block=False),
+            host=host,
+            port=port,
+            path=path,
+            secret_token=secret_token
+        )
+        
+        # Register the webhook only once the server is bound and able to accept updates
+        result = self.telegram_api.set_webhook(webhook_url, secret_token=secret_token)
+        if not result.get("ok", False):
+            print(f"❌ Failed to set webhook: {result.get('error', result.get('description', 'Unknown error'))}")
+            self.webhook_server.httpd.server_close()
+            self.dispatcher.stop(wait=False)
+            return
+        print("✅ Webhook set")
+        
+        print("🔄 Bot is now running. Press Ctrl+C to stop.")
+        
+        try:
+            self.webhook_server.serve_forever()
+        except KeyboardInterrupt:
+            print("👋 Bot stopped by user")
+        finally:
+            self.webhook_server.httpd.server_close()
+            self._stop_dispatcher()
+    
+    def _stop_dispatcher(self):
+        """
+        Stop the update workers, giving updates in progress a bounded time to finish
+        before close releases the state store, cache and connection pools they use
+        """
+        if not self.dispatcher.stop(timeout=UPDATE_SHUTDOWN_TIMEOUT):
+            print(f"⚠️ Updates still in progress after {UPDATE_SHUTDOWN_TIMEOUT} s, shutting down anyway")
+    
     def _process_update(self, update):
         """
         Process a single update from Telegram API
@@ -187,17 +474,478 @@ class StudySphereBot:
             self.content_generator,
             self.error_handler
         )
+    
+    # ========================
+    # Asyncio runtime
+    # ========================
+    def start_async(self):
+        """
+        Start the bot on an asyncio event loop
+        
+        LLM generation is awaited on the event loop, so waiting chats do not hold a
+        thread each. Menu navigation still runs the shared NavigationHandler logic on
+        a small thread pool, since it only makes short Telegram calls.
+        """
+        try:
+            asyncio.run(self._run_async())
+        except KeyboardInterrupt:
+            print("👋 Bot stopped by user")
+    
+    async def _run_async(self):
+        """
+        Poll for updates and process them as concurrent tasks
+        """
+        print("🔄 Starting Study Sphere AI Bot (asyncio runtime)...")
+        
+        # Delete any existing webhook
+        await self.telegram_api.delete_webhook_async()
+        print("✅ Webhook deleted")
+        
+        self._executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="navigation")
+        self._chat_locks = {}
+        self._update_slots = asyncio.Semaphore(self.max_queue_size)
+        tasks = set()
+        
+        print("🔄 Bot is now running. Press Ctrl+C to stop.")
+        
+        try:
+            while True:
+                try:
+                    # Get updates from Telegram API
+                    updates = await self.telegram_api.process_updates_async()
+                    
+                    # Start a task per update (waits while too many updates are in progress)
+                    for update in updates:
+                        await self._update_slots.acquire()
+                        task = asyncio.create_task(self._process_update_async(update))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    
+                except Exception as e:
+                    print(f"❌ Error in main loop: {e}")
+                    print(traceback.format_exc())
+                    await asyncio.sleep(5)  # Wait before retrying
+        finally:
+            # Let updates in progress finish before close releases the resources they use
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=UPDATE_SHUTDOWN_TIMEOUT)
+                if pending:
+                    print(f"⚠️ {len(pending)} updates still in progress after {UPDATE_SHUTDOWN_TIMEOUT} s, cancelling them")
+                    for task in pending:
+                        task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def _run_sync(self, function, *args):
+        """
+        Run blocking component code on the navigation thread pool
+        
+        Args:
+            function (callable): Function to run
+            *args: Arguments for the function
+            
+        Returns:
+            Any: Return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args))
+    
+    async def _process_update_async(self, update):
+        """
+        Process a single update, after any earlier update from the same chat
+        
+        Args:
+            update (dict): Update from Telegram API
+        """
+        chat_id = get_update_chat_id(update)
+        
+        # asyncio locks wake waiters in arrival order, which keeps each chat's updates ordered
+        entry = self._chat_locks.get(chat_id)
+        if entry is None:
+            entry = self._chat_locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        
+        try:
+            async with entry[0]:
+                await self._handle_update_async(update)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[chat_id]
+            self._update_slots.release()
+    
+    async def _handle_update_async(self, update):
+        """
+        Async counterpart of _process_update
+        
+        Args:
+            update (dict): Update from Telegram API
+        """
+        try:
+            # Handle message
+            if "message" in update:
+                await self._run_sync(self._handle_message, update["message"])
+                
+            # Handle callback query
+            if "callback_query" in update:
+                await self._handle_callback_query_async(update["callback_query"])
+                
+        except Exception as e:
+            print(f"❌ Error processing update: {e}")
+            print(traceback.format_exc())
+            
+            # Try to send error message to user if possible
+            chat_id = get_update_chat_id(update)
+            if chat_id is not None:
+                await self._run_sync(self.error_handler.handle_error, chat_id, e)
+    
+    async def _handle_callback_query_async(self, callback_query):
+        """
+        Async counterpart of _handle_callback_query
+        
+        Args:
+            callback_query (dict): Callback query from Telegram API
+        """
+        # Extract callback data
+        callback_id = callback_query["id"]
+        callback_data = callback_query.get("data", "")
+        chat_id = callback_query["message"]["chat"]["id"]
+        
+        # Answer callback query to remove loading indicator
+        await self.telegram_api.answer_callback_query_async(callback_id)
+        
+        # Navigate, leaving any content generation to the event loop
+        result = await self._run_sync(
+            self.navigation_handler.handle_callback,
+            chat_id,
+            callback_data,
+            self.telegram_api,
+            self.content_generator,
+            self.error_handler,
+            True
+        )
+        
+        if not isinstance(result, GenerationRequest):
+            return
+            
+        try:
+            content, document_path = await self.content_generator.generate_content_async(
+                result.hierarchy,
+                result.resource_type,
+                result.difficulty,
+                with_file=True
+            )
+            await self._run_sync(
+                self.navigation_handler.deliver_content,
+                chat_id,
+                content,
+                self.telegram_api,
+                self.error_handler,
+                None,
+                result.resource_type,
+                document_path
+            )
+        except Exception as e:
+            await self._run_sync(
+                self.navigation_handler.handle_generation_error,
+                chat_id,
+                e,
+                self.telegram_api,
+                self.error_handler
+            )
+
+def parse_args(argv=None):
+    """
+    Parse command line arguments
+    
+    Args:
+        argv (list, optional): Arguments to parse, defaults to sys.argv
+        
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Study Sphere AI - Telegram Study Assistant Bot")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["run", "pregenerate"],
+        default="run",
+        help="Run the bot, or generate the whole catalogue into the content cache"
+    )
+    parser.add_argument(
+        "--runtime",
+        choices=["threads", "asyncio"],
+        default="threads",
+        help="Process updates on a worker thread pool or on an asyncio event loop"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["polling", "webhook"],
+        default="polling",
+        help="Receive updates by long polling getUpdates or through a webhook"
+    )
+    parser.add_argument("--webhook-url", default=WEBHOOK_URL, help="Public HTTPS URL registered with Telegram")
+    parser.add_argument("--webhook-host", default=WEBHOOK_HOST, help="Interface the webhook server listens on")
+    parser.add_argument("--webhook-port", type=int, default=WEBHOOK_PORT, help="Port the webhook server listens on")
+    parser.add_argument("--webhook-path", default=WEBHOOK_PATH, help="URL path the webhook server accepts updates on")
+    parser.add_argument("--webhook-secret", default=WEBHOOK_SECRET_TOKEN, help="Secret token Telegram must send with updates")
+    parser.add_argument(
+        "--stream",
+        action=argparse.BooleanOptionalAction,
+        default=STREAM_RESPONSES,
+        help="Stream generated content into the chat while it is produced"
+    )
+    parser.add_argument(
+        "--prefetch",
+        action=argparse.BooleanOptionalAction,
+        default=SPECULATIVE_PREFETCH,
+        help="Generate a chapter's most requested resources in the background when it is opened"
+    )
+    parser.add_argument(
+        "--hedge",
+        action=argparse.BooleanOptionalAction,
+        default=DEEP_SEEK_HEDGING,
+        help="Race a second LLM request against calls slower than usual"
+    )
+    parser.add_argument("--workers", type=int, default=UPDATE_WORKERS, help="Number of update worker threads")
+    parser.add_argument("--queue-size", type=int, default=UPDATE_QUEUE_SIZE, help="Maximum number of queued updates")
+    parser.add_argument(
+        "--pregenerate-workers",
+        type=int,
+        default=PREGENERATE_WORKERS,
+        help="Number of generations running at once when pregenerating"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=PREGENERATE_REQUESTS_PER_MINUTE,
+        help="Most generations started per minute when pregenerating"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=PREGENERATE_CHECKPOINT_PATH,
+        help="File recording pregenerated items, so an interrupted run resumes"
+    )
+    parser.add_argument("--classes", nargs="+", help="Only pregenerate these class numbers")
+    parser.add_argument("--limit", type=int, help="Only pregenerate the first N catalogue items")
+    args = parser.parse_args(argv)
+    
+    if args.mode == "webhook":
+        if not args.webhook_url:
+            parser.error("--webhook-url is required in webhook mode")
+        if args.runtime == "asyncio":
+            parser.error("webhook mode uses the threads runtime")
+            
+    return args
+
+def create_deepseek_api(ssl_context=None, hedge=False, base_url=DEEP_SEEK_BASE_URL, model=DEEP_SEEK_MODEL,
+                        api_key=DEEP_SEEK_API_KEY, generation_profiles=None):
+    """
+    Create the API client of one LLM backend
+    
+    Args:
+        ssl_context (ssl.SSLContext, optional): SSL context shared with the other clients
+        hedge (bool, optional): Race a second request against slow calls
+        base_url (str, optional): Completion endpoint of the backend
+        model (str, optional): Model to use
+        api_key (str, optional): API key of the backend
+        generation_profiles (dict, optional): Generation settings per resource type, defaults to
+            GENERATION_PROFILE_OVERRIDES
+        
+    Returns:
+        DeepSeekAPI: API client
+    """
+    return DeepSeekAPI(
+        api_key,
+        base_url,
+        model,
+        ssl_context=ssl_context,
+        pool_size=DEEP_SEEK_POOL_SIZE,
+        max_concurrent=DEEP_SEEK_MAX_CONCURRENT,
+        timeout=DEEP_SEEK_TIMEOUT,
+        min_timeout=DEEP_SEEK_MIN_TIMEOUT,
+        breaker=CircuitBreaker(
+            failure_threshold=DEEP_SEEK_BREAKER_THRESHOLD,
+            reset_timeout=DEEP_SEEK_BREAKER_RESET
+        ),
+        hedging=HedgingPolicy(
+            percent=DEEP_SEEK_HEDGE_PERCENTILE,
+            budget_ratio=DEEP_SEEK_HEDGE_BUDGET,
+            alternate_model=DEEP_SEEK_HEDGE_MODEL
+        ) if hedge else None,
+        generation_profiles=generation_profiles if generation_profiles is not None else GENERATION_PROFILE_OVERRIDES
+    )
+
+def create_model_router(ssl_context=None, hedge=False):
+    """
+    Create the router over the configured LLM backends, shared by every component calling the LLM
+    
+    Args:
+        ssl_context (ssl.SSLContext, optional): SSL context shared with the other clients
+        hedge (bool, optional): Race a second request against slow calls
+        
+    Returns:
+        ModelRouter: Shared router
+    """
+    backends = []
+    for backend in json.loads(LLM_BACKENDS_JSON) if LLM_BACKENDS_JSON else LLM_BACKENDS:
+        # A backend's own profiles go on top of the global overrides
+        profiles = dict(GENERATION_PROFILE_OVERRIDES)
+        for resource_type, profile in backend.get("profiles", {}).items():
+            profiles[resource_type] = dict(profiles.get(resource_type, {}), **profile)
+        
+        client = create_deepseek_api(
+            ssl_context,
+            hedge,
+            backend["base_url"],
+            backend["model"],
+            backend["api_key"],
+            generation_profiles=profiles
+        )
+        backends.append(ModelBackend(backend["name"], client, weights=backend.get("weights")))
+    
+    return ModelRouter(backends, explore_ratio=LLM_ROUTER_EXPLORE_RATIO)
+
+def print_llm_stats(llm_router):
+    """
+    Print the routing and call statistics of every LLM backend
+    
+    Args:
+        llm_router (ModelRouter): Shared router
+    """
+    for name, backend in llm_router.get_stats().items():
+        stats = backend["client"]
+        latency = ", ".join(
+            f"{resource_type or 'Other'} {seconds:.1f} s" for resource_type, seconds in backend["latency"].items()
+        ) or "unknown"
+        print(
+            f"📊 LLM {name} ({backend['model']}): {backend['calls']} generations, {backend['failures']} failed, "
+            f"error rate {backend['error_rate'] * 100:.0f}%, rolling latency {latency}"
+        )
+        print(
+            f"📊 LLM {name} calls: {stats['requests']} sent ({stats['streamed']} streamed), {stats['failures']} failed, "
+            f"avg {stats['avg_latency']:.1f} s, max {stats['max_in_flight']} in flight, "
+            f"avg slot wait {stats['avg_slot_wait'] * 1000:.0f} ms, "
+            f"{stats['connections']['created']} connections opened, {stats['connections']['reused']} reused"
+        )
+        print(
+            f"📊 LLM {name} circuit {stats['breaker']['state']}: opened {stats['breaker']['opened']} times, "
+            f"{stats['breaker']['rejected']} calls failed fast, timeout {stats['timeout']:.0f} s"
+        )
+        if "hedging" in stats:
+            print(
+                f"📊 LLM {name} hedging: {stats['hedging']['hedged']} of {stats['hedging']['calls']} calls hedged, "
+                f"{stats['hedging']['hedge_wins']} hedges won, {stats['hedging']['over_budget']} over budget"
+            )
+        for resource_type, usage in stats["tokens"].items():
+            if usage["p90_completion_tokens"] is None:
+                continue
+            print(
+                f"📊 LLM {name} tokens for {resource_type}: p50 {usage['p50_completion_tokens']}, "
+                f"p90 {usage['p90_completion_tokens']}, max {usage['max_completion_tokens']} "
+                f"of {usage['max_tokens']} budget, {usage['truncated']} of {usage['calls']} truncated"
+            )
+
+def print_admission_stats(llm_admission):
+    """
+    Print the queueing statistics of the LLM admission controller
+    
+    Args:
+        llm_admission (AdmissionController): Shared admission controller
+    """
+    stats = llm_admission.get_stats()
+    print(
+        f"📊 LLM admission: max {stats['max_in_flight']} of {llm_admission.max_in_flight} in flight, "
+        f"max queue length {stats['max_queue_length']}"
+    )
+    for name, priority in stats["priorities"].items():
+        if not priority["admitted"] and not priority["shed"] and not priority["timed_out"]:
+            continue
+        queue_time = priority["queue_time"]
+        p90 = f"{queue_time['p90']:.1f} s" if queue_time["p90"] is not None else "unknown"
+        print(
+            f"📊 LLM admission {name}: {priority['admitted']} admitted ({priority['queued']} queued), "
+            f"queue time p90 {p90}, max {priority['max_wait']:.1f} s, "
+            f"{priority['shed']} shed, {priority['timed_out']} timed out"
+        )
+
+def pregenerate(args):
+    """
+    Generate the whole catalogue into the content cache
+    
+    Args:
+        args (argparse.Namespace): Parsed arguments
+    """
+    content_cache = ContentCache(
+        CONTENT_CACHE_PATH,
+        max_memory_entries=CONTENT_CACHE_MEMORY_ENTRIES,
+        max_disk_entries=CONTENT_CACHE_DISK_ENTRIES,
+        ttl=CONTENT_CACHE_TTL
+    )
+    llm_router = create_model_router()
+    llm_admission = AdmissionController(max_in_flight=LLM_MAX_IN_FLIGHT, slo=LLM_QUEUE_SLO)
+    content_generator = ContentGenerator(
+        DEEP_SEEK_API_KEY,
+        DEEP_SEEK_BASE_URL,
+        DEEP_SEEK_MODEL,
+        cache=content_cache,
+        api=llm_router,
+        admission=llm_admission
+    )
+    
+    try:
+        stats = run_pregeneration(
+            content_generator,
+            MenuNavigation(),
+            args.checkpoint,
+            workers=args.pregenerate_workers,
+            requests_per_minute=args.rate,
+            classes=args.classes,
+            limit=args.limit
+        )
+        print(f"✅ Pregeneration finished: {stats['done']} cached, {stats['failed']} failed, {stats['skipped']} skipped")
+    finally:
+        content_cache.close()
+        print_admission_stats(llm_admission)
+        print_llm_stats(llm_router)
+        llm_router.close()
 
 def main():
     """
     Main entry point for the bot
     """
+    args = parse_args()
+    
     print("📚 Study Sphere AI - Telegram Study Assistant Bot")
     print("================================================")
     
+    if args.command == "pregenerate":
+        pregenerate(args)
+        return
+    
     # Create and start the bot
-    bot = StudySphereBot()
-    bot.start()
+    bot = StudySphereBot(
+        num_workers=args.workers,
+        max_queue_size=args.queue_size,
+        stream_responses=args.stream,
+        prefetch=args.prefetch,
+        hedge=args.hedge
+    )
+    
+    try:
+        if args.mode == "webhook":
+            bot.start_webhook(
+                args.webhook_url,
+                host=args.webhook_host,
+                port=args.webhook_port,
+                path=args.webhook_path,
+                secret_token=args.webhook_secret or None
+            )
+        elif args.runtime == "asyncio":
+            bot.start_async()
+        else:
+            bot.start()
+    finally:
+        bot.close()
 
 if __name__ == "__main__":
     main()
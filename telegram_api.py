@@ -3,33 +3,394 @@ Study Sphere AI - Telegram API Module
 This module handles all Telegram API interactions for the Study Sphere AI bot
 """
 
+import asyncio
+import functools
+import html
 import json
-import urllib.request
+import mimetypes
+import os
+import secrets
 import urllib.parse
 import time
-import ssl
+
+from http_pool import AsyncHTTPConnectionPool, HTTPConnectionPool, HTTPStatusError, create_insecure_ssl_context
+from rate_limiter import OutboundScheduler
+
+# Methods that post to a chat and count against Telegram's message rate limits
+RATE_LIMITED_METHODS = frozenset(["sendMessage", "editMessageText", "sendDocument"])
+
+# Size of the file reads streamed into a multipart upload
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+@functools.lru_cache(maxsize=1024)
+def _encode_reply_markup(reply_markup):
+    """
+    Form-encode serialized reply markup
+    
+    Menus reuse a few hundred prebuilt keyboards, so their encoded form is cached
+    instead of being escaped again on every request
+    
+    Args:
+        reply_markup (str): Serialized inline keyboard markup
+        
+    Returns:
+        str: Form-encoded markup
+    """
+    return urllib.parse.quote_plus(reply_markup)
+
+
+def _encode_form(data):
+    """
+    Form-encode request parameters
+    
+    Args:
+        data (dict): Request parameters
+        
+    Returns:
+        bytes: Request body
+    """
+    if "reply_markup" not in data:
+        return urllib.parse.urlencode(data).encode()
+    
+    fields = {name: value for name, value in data.items() if name != "reply_markup"}
+    return (urllib.parse.urlencode(fields) + "&reply_markup=" + _encode_reply_markup(data["reply_markup"])).encode()
+
+
+def _encode_multipart(data, field, file_path, filename):
+    """
+    Build a multipart/form-data body that streams a file from disk
+    
+    Args:
+        data (dict): Request parameters
+        field (str): Form field of the file
+        file_path (str): Path of the file to upload
+        filename (str): File name shown to the user
+        
+    Returns:
+        tuple: (content type, content length, function returning an iterable of body chunks)
+    """
+    boundary = secrets.token_hex(16)
+    
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in data.items()
+    )
+    quoted_name = filename.replace("\\", "\\\\").replace('"', '\\"')
+    file_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{quoted_name}"\r\n'
+        f'Content-Type: {file_type}\r\n\r\n'
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    
+    def chunks():
+        yield head
+        with open(file_path, "rb") as file:
+            while True:
+                chunk = file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        yield tail
+    
+    content_length = len(head) + os.path.getsize(file_path) + len(tail)
+    return f"multipart/form-data; boundary={boundary}", content_length, chunks
+
+
+def _retry_after(error):
+    """
+    Get the wait Telegram asked for in a 429 response
+    
+    Args:
+        error (HTTPStatusError): Error raised by the request
+        
+    Returns:
+        float: Seconds to wait, or None if the error is not a 429 response
+    """
+    if error.code != 429:
+        return None
+    
+    try:
+        return float(json.loads(error.body)["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return 1.0
+
 
 class TelegramAPI:
     """
     Class to handle all Telegram API interactions
     """
     
-    def __init__(self, token):
+    def __init__(self, token, pool_size=4, idle_timeout=60, max_reconnects=1, scheduler=None, max_rate_limit_retries=3,
+                 ssl_context=None):
         """
         Initialize the TelegramAPI with the bot token
         
         Args:
             token (str): Telegram Bot API token
+            pool_size (int, optional): Number of keep-alive connections kept open
+            idle_timeout (float, optional): Seconds before an idle connection is dropped
+            max_reconnects (int, optional): Retries on a fresh connection after a reset
+            scheduler (OutboundScheduler, optional): Paces calls to chats within Telegram's
+                global and per-chat limits, one with the default limits is created if not given
+            max_rate_limit_retries (int, optional): Times a call is repeated after a 429 response
+            ssl_context (ssl.SSLContext, optional): SSL context shared with other clients,
+                one ignoring certificate verification is created if not given
         """
         self.token = token
         self.api_url = f"https://api.telegram.org/bot{token}/"
+        self.api_path = urllib.parse.urlsplit(self.api_url).path
         self.update_offset = None
         
         # Create SSL context that ignores certificate verification
-        # This is sometimes needed for API calls in certain environments
-        self.ssl_context = ssl.create_default_context()
-        self.ssl_context.check_hostname = False
-        self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.ssl_context = ssl_context if ssl_context is not None else create_insecure_ssl_context()
+        
+        # Persistent connections so each call skips the TCP and TLS handshake
+        self.pool = HTTPConnectionPool(
+            self.api_url,
+            pool_size=pool_size,
+            idle_timeout=idle_timeout,
+            max_reconnects=max_reconnects,
+            ssl_context=self.ssl_context
+        )
+        
+        # Event-loop bound pool for the async counterparts, created on first use
+        self.pool_settings = {
+            "pool_size": pool_size,
+            "idle_timeout": idle_timeout,
+            "max_reconnects": max_reconnects
+        }
+        self._async_pool = None
+        
+        # Calls to chats wait here for a slot instead of running into 429 errors
+        self.scheduler = scheduler if scheduler is not None else OutboundScheduler()
+        self.max_rate_limit_retries = max_rate_limit_retries
+    
+    @property
+    def async_pool(self):
+        """
+        Get the asyncio connection pool, creating it on first use
+        
+        Returns:
+            AsyncHTTPConnectionPool: Pool used by the async methods
+        """
+        if self._async_pool is None:
+            self._async_pool = AsyncHTTPConnectionPool(
+                self.api_url,
+                ssl_context=self.ssl_context,
+                **self.pool_settings
+            )
+        return self._async_pool
+    
+    def _post(self, method, data, timeout=None, document=None):
+        """
+        Call a Telegram API method, waiting for a send slot if it posts to a chat
+        
+        A call answered with 429 is repeated after the retry_after wait, ahead of
+        the chat's other queued calls so messages keep their order
+        
+        Args:
+            method (str): Telegram API method name
+            data (dict): Request parameters
+            timeout (float, optional): Socket timeout in seconds
+            document (tuple, optional): (file path, file name) uploaded as the document field
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        if method not in RATE_LIMITED_METHODS:
+            return self._request(method, data, timeout, document)
+        
+        chat_id = data["chat_id"]
+        attempt = 0
+        
+        while True:
+            self.scheduler.acquire(chat_id, retry=attempt > 0)
+            retry_after = None
+            try:
+                return self._request(method, data, timeout, document)
+            except HTTPStatusError as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt >= self.max_rate_limit_retries:
+                    raise
+                print(f"⏳ Rate limited on {method} to chat {chat_id}, retrying in {retry_after:g}s")
+                attempt += 1
+            finally:
+                self.scheduler.release(chat_id, retry_after)
+    
+    def _request(self, method, data, timeout=None, document=None):
+        """
+        Call a Telegram API method with form-encoded data over a pooled connection
+        
+        Args:
+            method (str): Telegram API method name
+            data (dict): Request parameters
+            timeout (float, optional): Socket timeout in seconds
+            document (tuple, optional): (file path, file name) streamed as a multipart upload
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        if document:
+            content_type, content_length, body = _encode_multipart(data, "document", *document)
+            headers = {"Content-Type": content_type, "Content-Length": str(content_length)}
+        else:
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            body = _encode_form(data)
+        status, response_body = self.pool.request("POST", self.api_path + method, body, headers, timeout)
+        
+        if status >= 400:
+            raise HTTPStatusError(status, response_body.decode())
+            
+        return json.loads(response_body.decode())
+    
+    async def _post_async(self, method, data, timeout=None):
+        """
+        Async counterpart of _post
+        
+        Args:
+            method (str): Telegram API method name
+            data (dict): Request parameters
+            timeout (float, optional): Timeout in seconds
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        if method not in RATE_LIMITED_METHODS:
+            return await self._request_async(method, data, timeout)
+        
+        chat_id = data["chat_id"]
+        attempt = 0
+        
+        while True:
+            await self.scheduler.acquire_async(chat_id, retry=attempt > 0)
+            retry_after = None
+            try:
+                return await self._request_async(method, data, timeout)
+            except HTTPStatusError as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt >= self.max_rate_limit_retries:
+                    raise
+                print(f"⏳ Rate limited on {method} to chat {chat_id}, retrying in {retry_after:g}s")
+                attempt += 1
+            finally:
+                self.scheduler.release(chat_id, retry_after)
+    
+    async def _request_async(self, method, data, timeout=None):
+        """
+        Async counterpart of _request
+        
+        Args:
+            method (str): Telegram API method name
+            data (dict): Request parameters
+            timeout (float, optional): Timeout in seconds
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        body = _encode_form(data)
+        status, response_body = await self.async_pool.request("POST", self.api_path + method, body, headers, timeout)
+        
+        if status >= 400:
+            raise HTTPStatusError(status, response_body.decode())
+            
+        return json.loads(response_body.decode())
+    
+    def _updates_path(self, timeout):
+        """
+        Build the getUpdates request path for the current offset
+        
+        Args:
+            timeout (int): Timeout for long polling in seconds
+            
+        Returns:
+            str: Request path with query string
+        """
+        params = {
+            "timeout": timeout
+        }
+        
+        if self.update_offset:
+            params["offset"] = self.update_offset
+            
+        return self.api_path + "getUpdates?" + urllib.parse.urlencode(params)
+    
+    def _message_data(self, chat_id, text, reply_markup, parse_mode, message_id=None):
+        """
+        Build parameters for sendMessage and editMessageText
+        
+        Args:
+            chat_id (int): Chat ID
+            text (str): Message text
+            reply_markup (dict or str): Inline keyboard markup, serialized or not, or None
+            parse_mode (str): Parse mode for message formatting
+            message_id (int, optional): Message ID when editing
+            
+        Returns:
+            dict: Request parameters
+        """
+        data = {
+            "chat_id": chat_id
+        }
+        
+        if message_id is not None:
+            data["message_id"] = message_id
+            
+        data["text"] = text
+        data["parse_mode"] = parse_mode
+        
+        if reply_markup:
+            # Keyboards from MenuNavigation arrive already serialized
+            data["reply_markup"] = reply_markup if isinstance(reply_markup, str) else json.dumps(reply_markup)
+            
+        return data
+    
+    def _send_error(self, error):
+        """
+        Convert an error raised while sending a message into a response
+        
+        Args:
+            error (Exception): Error raised by the request
+            
+        Returns:
+            dict: Error response
+        """
+        if isinstance(error, HTTPStatusError):
+            error_message = error.body
+            print(f"❌ HTTP Error sending message: {error.code} - {error_message}")
+            
+            # If message is too long, return special error
+            if error.code == 400 and "message is too long" in error_message.lower():
+                return {"ok": False, "error": "MESSAGE_TOO_LONG"}
+                
+            return {"ok": False, "error": error_message}
+            
+        print(f"❌ Error sending message: {error}")
+        return {"ok": False, "error": str(error)}
+    
+    def _updates_result(self, updates_response):
+        """
+        Extract updates from a getUpdates response and advance the offset
+        
+        Args:
+            updates_response (dict): Response from get_updates
+            
+        Returns:
+            list: List of updates, or None if the request failed
+        """
+        if not updates_response.get("ok", False):
+            print(f"❌ Failed to get updates: {updates_response.get('error', 'Unknown error')}")
+            return None
+            
+        updates = updates_response.get("result", [])
+        
+        if updates:
+            # Update the offset to acknowledge processed updates
+            self.update_offset = updates[-1]["update_id"] + 1
+            
+        return updates
     
     def delete_webhook(self):
         """
@@ -38,19 +399,63 @@ class TelegramAPI:
         Returns:
             dict: Response from Telegram API
         """
-        url = self.api_url + "setWebhook"
-        data = urllib.parse.urlencode({"url": ""}).encode()
-        req = urllib.request.Request(url, data=data)
-        
         try:
-            with urllib.request.urlopen(req, context=self.ssl_context) as response:
-                result = json.loads(response.read().decode())
-                print(f"🔄 Webhook status: {result}")
-                return result
+            result = self._post("setWebhook", {"url": ""})
+            print(f"🔄 Webhook status: {result}")
+            return result
         except Exception as e:
             print(f"❌ Error deleting webhook: {e}")
             return {"ok": False, "error": str(e)}
     
+    def _webhook_data(self, url, secret_token, max_connections, drop_pending_updates):
+        """
+        Build parameters for setWebhook
+        
+        Args:
+            url (str): Public HTTPS URL Telegram posts updates to
+            secret_token (str): Secret sent back in every webhook request, or None
+            max_connections (int): Maximum simultaneous webhook connections, or None
+            drop_pending_updates (bool): Whether to drop updates queued while offline
+            
+        Returns:
+            dict: Request parameters
+        """
+        data = {
+            "url": url,
+            "drop_pending_updates": drop_pending_updates
+        }
+        
+        if secret_token:
+            data["secret_token"] = secret_token
+            
+        if max_connections:
+            data["max_connections"] = max_connections
+            
+        return data
+    
+    def set_webhook(self, url, secret_token=None, max_connections=None, drop_pending_updates=False):
+        """
+        Register a webhook so Telegram pushes updates instead of being polled
+        
+        Args:
+            url (str): Public HTTPS URL Telegram posts updates to
+            secret_token (str, optional): Secret sent back in every webhook request
+            max_connections (int, optional): Maximum simultaneous webhook connections
+            drop_pending_updates (bool, optional): Whether to drop updates queued while offline
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        data = self._webhook_data(url, secret_token, max_connections, drop_pending_updates)
+        
+        try:
+            result = self._post("setWebhook", data)
+            print(f"🔄 Webhook status: {result}")
+            return result
+        except Exception as e:
+            print(f"❌ Error setting webhook: {e}")
+            return {"ok": False, "error": str(e)}
+    
     def get_updates(self, timeout=30):
         """
         Get updates from Telegram API using long polling
@@ -61,18 +466,13 @@ class TelegramAPI:
         Returns:
             dict: Updates from Telegram API
         """
-        params = {
-            "timeout": timeout
-        }
-        
-        if self.update_offset:
-            params["offset"] = self.update_offset
-            
-        url = self.api_url + "getUpdates?" + urllib.parse.urlencode(params)
+        path = self._updates_path(timeout)
         
         try:
-            with urllib.request.urlopen(url, timeout=timeout+10, context=self.ssl_context) as response:
-                return json.loads(response.read().decode())
+            status, body = self.pool.request("GET", path, timeout=timeout+10)
+            if status >= 400:
+                raise HTTPStatusError(status, body.decode())
+            return json.loads(body.decode())
         except Exception as e:
             print(f"❌ Error getting updates: {e}")
             return {"ok": False, "error": str(e)}
@@ -84,40 +484,51 @@ class TelegramAPI:
         Args:
             chat_id (int): Chat ID to send message to
             text (str): Message text
-            reply_markup (dict, optional): Inline keyboard markup
+            reply_markup (dict or str, optional): Inline keyboard markup
             parse_mode (str, optional): Parse mode for message formatting
             
+        Returns:
+            dict: Response from Telegram API
+        """
+        data = self._message_data(chat_id, text, reply_markup, parse_mode)
+            
+        try:
+            return self._post("sendMessage", data)
+        except Exception as e:
+            return self._send_error(e)
+    
+    def send_document(self, chat_id, file_path, caption=None, reply_markup=None, parse_mode="HTML", filename=None,
+                      timeout=60):
+        """
+        Send a file to a chat as a document, streaming it from disk
+        
+        Args:
+            chat_id (int): Chat ID to send the document to
+            file_path (str): Path of the file to send
+            caption (str, optional): Caption shown under the document
+            reply_markup (dict or str, optional): Inline keyboard markup
+            parse_mode (str, optional): Parse mode for the caption
+            filename (str, optional): File name shown to the user, defaults to the file's name
+            timeout (float, optional): Socket timeout in seconds
+            
         Returns:
             dict: Response from Telegram API
         """
         data = {
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": parse_mode
+            "chat_id": chat_id
         }
         
-        if reply_markup:
-            data["reply_markup"] = json.dumps(reply_markup)
+        if caption:
+            data["caption"] = caption
+            data["parse_mode"] = parse_mode
             
-        encoded_data = urllib.parse.urlencode(data).encode()
-        url = self.api_url + "sendMessage"
-        req = urllib.request.Request(url, data=encoded_data)
+        if reply_markup:
+            data["reply_markup"] = reply_markup if isinstance(reply_markup, str) else json.dumps(reply_markup)
         
         try:
-            with urllib.request.urlopen(req, context=self.ssl_context) as response:
-                return json.loads(response.read().decode())
-        except urllib.error.HTTPError as e:
-            error_message = e.read().decode()
-            print(f"❌ HTTP Error sending message: {e.code} - {error_message}")
-            
-            # If message is too long, return special error
-            if e.code == 400 and "message is too long" in error_message.lower():
-                return {"ok": False, "error": "MESSAGE_TOO_LONG"}
-                
-            return {"ok": False, "error": error_message}
+            return self._post("sendDocument", data, timeout, (file_path, filename or os.path.basename(file_path)))
         except Exception as e:
-            print(f"❌ Error sending message: {e}")
-            return {"ok": False, "error": str(e)}
+            return self._send_error(e)
     
     def answer_callback_query(self, callback_query_id, text=None, show_alert=False):
         """
@@ -140,13 +551,8 @@ class TelegramAPI:
             
         data["show_alert"] = show_alert
         
-        encoded_data = urllib.parse.urlencode(data).encode()
-        url = self.api_url + "answerCallbackQuery"
-        req = urllib.request.Request(url, data=encoded_data)
-        
         try:
-            with urllib.request.urlopen(req, context=self.ssl_context) as response:
-                return json.loads(response.read().decode())
+            return self._post("answerCallbackQuery", data)
         except Exception as e:
             print(f"❌ Error answering callback query: {e}")
             return {"ok": False, "error": str(e)}
@@ -159,29 +565,19 @@ class TelegramAPI:
             chat_id (int): Chat ID
             message_id (int): Message ID to edit
             text (str): New text
-            reply_markup (dict, optional): New inline keyboard markup
+            reply_markup (dict or str, optional): New inline keyboard markup
             parse_mode (str, optional): Parse mode for message formatting
             
         Returns:
             dict: Response from Telegram API
         """
-        data = {
-            "chat_id": chat_id,
-            "message_id": message_id,
-            "text": text,
-            "parse_mode": parse_mode
-        }
-        
-        if reply_markup:
-            data["reply_markup"] = json.dumps(reply_markup)
+        data = self._message_data(chat_id, text, reply_markup, parse_mode, message_id)
             
-        encoded_data = urllib.parse.urlencode(data).encode()
-        url = self.api_url + "editMessageText"
-        req = urllib.request.Request(url, data=encoded_data)
-        
         try:
-            with urllib.request.urlopen(req, context=self.ssl_context) as response:
-                return json.loads(response.read().decode())
+            return self._post("editMessageText", data)
+        except HTTPStatusError as e:
+            print(f"❌ HTTP Error editing message: {e.code} - {e.body}")
+            return {"ok": False, "error": e.body}
         except Exception as e:
             print(f"❌ Error editing message: {e}")
             return {"ok": False, "error": str(e)}
@@ -202,17 +598,31 @@ class TelegramAPI:
             "action": action
         }
         
-        encoded_data = urllib.parse.urlencode(data).encode()
-        url = self.api_url + "sendChatAction"
-        req = urllib.request.Request(url, data=encoded_data)
-        
         try:
-            with urllib.request.urlopen(req, context=self.ssl_context) as response:
-                return json.loads(response.read().decode())
+            return self._post("sendChatAction", data)
         except Exception as e:
             print(f"❌ Error sending chat action: {e}")
             return {"ok": False, "error": str(e)}
     
+    def get_stats(self):
+        """
+        Get connection reuse and outbound throttling statistics
+        
+        Returns:
+            dict: Pool counters and scheduler counters
+        """
+        return {
+            "pool": dict(self.pool.stats),
+            "scheduler": self.scheduler.get_stats()
+        }
+    
+    def close(self):
+        """
+        Stop the outbound scheduler and close pooled connections
+        """
+        self.scheduler.close()
+        self.pool.close()
+    
     def process_updates(self):
         """
         Process updates from Telegram API
@@ -220,17 +630,251 @@ class TelegramAPI:
         Returns:
             list: List of processed updates
         """
-        updates_response = self.get_updates()
+        updates = self._updates_result(self.get_updates())
         
-        if not updates_response.get("ok", False):
-            print(f"❌ Failed to get updates: {updates_response.get('error', 'Unknown error')}")
+        if updates is None:
             time.sleep(5)  # Wait before retrying
             return []
             
-        updates = updates_response.get("result", [])
+        return updates
+    
+    # Async counterparts for the asyncio runtime
+    async def delete_webhook_async(self):
+        """
+        Async counterpart of delete_webhook
         
-        if updates:
-            # Update the offset to acknowledge processed updates
-            self.update_offset = updates[-1]["update_id"] + 1
+        Returns:
+            dict: Response from Telegram API
+        """
+        try:
+            result = await self._post_async("setWebhook", {"url": ""})
+            print(f"🔄 Webhook status: {result}")
+            return result
+        except Exception as e:
+            print(f"❌ Error deleting webhook: {e}")
+            return {"ok": False, "error": str(e)}
+    
+    async def set_webhook_async(self, url, secret_token=None, max_connections=None, drop_pending_updates=False):
+        """
+        Async counterpart of set_webhook
+        
+        Args:
+            url (str): Public HTTPS URL Telegram posts updates to
+            secret_token (str, optional): Secret sent back in every webhook request
+            max_connections (int, optional): Maximum simultaneous webhook connections
+            drop_pending_updates (bool, optional): Whether to drop updates queued while offline
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        data = self._webhook_data(url, secret_token, max_connections, drop_pending_updates)
+        
+        try:
+            result = await self._post_async("setWebhook", data)
+            print(f"🔄 Webhook status: {result}")
+            return result
+        except Exception as e:
+            print(f"❌ Error setting webhook: {e}")
+            return {"ok": False, "error": str(e)}
+    
+    async def get_updates_async(self, timeout=30):
+        """
+        Async counterpart of get_updates
+        
+        Args:
+            timeout (int): Timeout for long polling in seconds
+            
+        Returns:
+            dict: Updates from Telegram API
+        """
+        path = self._updates_path(timeout)
+        
+        try:
+            status, body = await self.async_pool.request("GET", path, timeout=timeout+10)
+            if status >= 400:
+                raise HTTPStatusError(status, body.decode())
+            return json.loads(body.decode())
+        except Exception as e:
+            print(f"❌ Error getting updates: {e}")
+            return {"ok": False, "error": str(e)}
+    
+    async def send_message_async(self, chat_id, text, reply_markup=None, parse_mode="HTML"):
+        """
+        Async counterpart of send_message
+        
+        Args:
+            chat_id (int): Chat ID to send message to
+            text (str): Message text
+            reply_markup (dict or str, optional): Inline keyboard markup
+            parse_mode (str, optional): Parse mode for message formatting
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        data = self._message_data(chat_id, text, reply_markup, parse_mode)
+        
+        try:
+            return await self._post_async("sendMessage", data)
+        except Exception as e:
+            return self._send_error(e)
+    
+    async def answer_callback_query_async(self, callback_query_id, text=None, show_alert=False):
+        """
+        Async counterpart of answer_callback_query
+        
+        Args:
+            callback_query_id (str): Callback query ID
+            text (str, optional): Text to show to user
+            show_alert (bool, optional): Whether to show as alert
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        data = {
+            "callback_query_id": callback_query_id
+        }
+        
+        if text:
+            data["text"] = text
+            
+        data["show_alert"] = show_alert
+        
+        try:
+            return await self._post_async("answerCallbackQuery", data)
+        except Exception as e:
+            print(f"❌ Error answering callback query: {e}")
+            return {"ok": False, "error": str(e)}
+    
+    async def edit_message_text_async(self, chat_id, message_id, text, reply_markup=None, parse_mode="HTML"):
+        """
+        Async counterpart of edit_message_text
+        
+        Args:
+            chat_id (int): Chat ID
+            message_id (int): Message ID to edit
+            text (str): New text
+            reply_markup (dict or str, optional): New inline keyboard markup
+            parse_mode (str, optional): Parse mode for message formatting
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        data = self._message_data(chat_id, text, reply_markup, parse_mode, message_id)
+        
+        try:
+            return await self._post_async("editMessageText", data)
+        except HTTPStatusError as e:
+            print(f"❌ HTTP Error editing message: {e.code} - {e.body}")
+            return {"ok": False, "error": e.body}
+        except Exception as e:
+            print(f"❌ Error editing message: {e}")
+            return {"ok": False, "error": str(e)}
+    
+    async def send_chat_action_async(self, chat_id, action="typing"):
+        """
+        Async counterpart of send_chat_action
+        
+        Args:
+            chat_id (int): Chat ID
+            action (str, optional): Action type (typing, upload_photo, etc.)
+            
+        Returns:
+            dict: Response from Telegram API
+        """
+        data = {
+            "chat_id": chat_id,
+            "action": action
+        }
+        
+        try:
+            return await self._post_async("sendChatAction", data)
+        except Exception as e:
+            print(f"❌ Error sending chat action: {e}")
+            return {"ok": False, "error": str(e)}
+    
+    async def process_updates_async(self):
+        """
+        Async counterpart of process_updates
+        
+        Returns:
+            list: List of processed updates
+        """
+        updates = self._updates_result(await self.get_updates_async())
+        
+        if updates is None:
+            await asyncio.sleep(5)  # Wait before retrying
+            return []
             
         return updates
+
+
+class ThrottledMessageEditor:
+    """
+    Class to update one message in place with progressive content, within Telegram's edit rate limits
+    """
+    
+    def __init__(self, telegram_api, chat_id, message_id, header="", min_interval=1.5, max_length=4000):
+        """
+        Initialize the ThrottledMessageEditor
+        
+        Args:
+            telegram_api: Instance of TelegramAPI class
+            chat_id (int): Chat ID
+            message_id (int): Message ID to edit
+            header (str, optional): HTML text shown above the partial content
+            min_interval (float, optional): Minimum seconds between edits of the message
+            max_length (int, optional): Maximum length of the edited text
+        """
+        self.telegram_api = telegram_api
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.header = header
+        self.min_interval = min_interval
+        self.max_length = max_length
+        
+        self.last_edit = 0.0
+        self.last_text = None
+        self.edits = 0
+    
+    def __call__(self, text):
+        """
+        Show partial plain text content, skipping the edit if one was made too recently
+        
+        Args:
+            text (str): Partial content
+            
+        Returns:
+            bool: True if the message was edited
+        """
+        if time.monotonic() - self.last_edit < self.min_interval:
+            return False
+        
+        body = html.escape(text)
+        room = self.max_length - len(self.header) - 2
+        if len(body) > room:
+            # Cut the raw text, slicing the escaped text could split an entity like &amp;.
+            # Find the longest prefix whose escaped form still fits
+            low, high = 0, min(len(text), room - 1)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if len(html.escape(text[:middle])) <= room - 1:
+                    low = middle
+                else:
+                    high = middle - 1
+            body = html.escape(text[:low]) + "…"
+        
+        message = f"{self.header}\n\n{body}" if self.header else body
+        
+        # Telegram rejects edits that do not change the message
+        if message == self.last_text:
+            return False
+        
+        result = self.telegram_api.edit_message_text(self.chat_id, self.message_id, message)
+        self.last_edit = time.monotonic()
+        
+        if result.get("ok", False):
+            self.last_text = message
+            self.edits += 1
+            return True
+            
+        return False
@@ -0,0 +1,99 @@
+"""
+Study Sphere AI - Stub Server for Tests
+This module runs a local HTTP/1.1 server whose answers are set by each test,
+recording the requests and connections it sees
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """
+    Class to serve canned responses on a free local port
+
+    The handler given to the server is called with the request handler and the
+    request body, and returns (status, headers, body) where body is bytes or a
+    list of byte chunks sent with chunked transfer encoding. A handler may set
+    request.close_connection to drop the connection once it answered.
+    """
+
+    def __init__(self, handler):
+        """
+        Initialize and start the StubServer
+
+        Args:
+            handler (callable): Builds the response of each request
+        """
+        self.handler = handler
+        self.requests = []
+        self.connections = set()
+        self._lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        """
+        Get the base URL of the server
+
+        Returns:
+            str: http://host:port
+        """
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        """
+        Build the request handler class bound to this server
+
+        Returns:
+            type: BaseHTTPRequestHandler subclass
+        """
+        server = self
+
+        class StubRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self._answer(b"")
+
+            def do_POST(self):
+                self._answer(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+
+            def _answer(self, body):
+                with server._lock:
+                    server.requests.append((self.command, self.path, body))
+                    server.connections.add(self.client_address)
+
+                status, headers, payload = server.handler(self, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+
+                if isinstance(payload, list):
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for chunk in payload + [b""]:
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                else:
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return StubRequestHandler
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
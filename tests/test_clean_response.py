@@ -0,0 +1,54 @@
+"""
+Study Sphere AI - clean_response Golden Tests
+Checks DeepSeekAPI.clean_response against outputs recorded from the original
+implementation, so any rewrite of the cleaning passes stays byte-identical
+"""
+
+import glob
+import os
+import unittest
+
+from deepseek_api import DeepSeekAPI
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden", "clean_response")
+
+
+def read_golden(path):
+    """
+    Read a golden file exactly as stored, keeping its line endings
+
+    Args:
+        path (str): Path of the file
+
+    Returns:
+        str: File content
+    """
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        return file.read()
+
+
+class CleanResponseGoldenTest(unittest.TestCase):
+    """
+    Compare clean_response output with the golden corpus
+    """
+
+    def setUp(self):
+        self.api = DeepSeekAPI("test-key", "http://127.0.0.1:9/v1/chat/completions", "test-model")
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_corpus_is_present(self):
+        self.assertGreater(len(glob.glob(os.path.join(GOLDEN_DIR, "*.input.txt"))), 0)
+
+    def test_output_matches_golden_files(self):
+        for input_path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.input.txt"))):
+            name = os.path.basename(input_path)[:-len(".input.txt")]
+            with self.subTest(case=name):
+                content = read_golden(input_path)
+                expected = read_golden(input_path[:-len(".input.txt")] + ".expected.txt")
+                self.assertEqual(self.api.clean_response(content), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
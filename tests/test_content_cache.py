@@ -0,0 +1,48 @@
+"""
+Study Sphere AI - Content Cache Tests
+Checks that stale entries are misses but can still be served to shed requests
+"""
+
+import os
+import tempfile
+import unittest
+
+from content_cache import ContentCache
+
+
+class ContentCacheStaleTest(unittest.TestCase):
+    """
+    Entries from an older prompt version in both tiers
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ContentCache(os.path.join(self.directory.name, "cache.db"))
+        self.cache.put("key", "v1", "old content")
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_stale_entry_is_a_miss_but_stays_readable(self):
+        self.assertIsNone(self.cache.get("key", "v2"))
+        self.assertEqual(self.cache.get_stale("key"), "old content")
+        self.assertEqual(self.cache.get("key", "v1"), "old content")
+
+    def test_stale_entry_is_read_from_disk_after_a_restart(self):
+        self.cache.close()
+        self.cache = ContentCache(os.path.join(self.directory.name, "cache.db"))
+
+        self.assertIsNone(self.cache.get("key", "v2"))
+        self.assertEqual(self.cache.get_stale("key"), "old content")
+        self.assertIsNone(self.cache.get_stale("other"))
+
+    def test_new_version_replaces_the_stale_entry(self):
+        self.cache.put("key", "v2", "new content")
+
+        self.assertEqual(self.cache.get("key", "v2"), "new content")
+        self.assertEqual(self.cache.get_stale("key"), "new content")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Study Sphere AI - HTTP Connection Pool Tests
+Checks keep-alive reuse, streaming and reconnects of both pools against a local server
+"""
+
+import asyncio
+import unittest
+
+from http_pool import AsyncHTTPConnectionPool, HTTPConnectionPool
+from tests.stub_server import StubServer
+
+
+def answer(request, body):
+    """
+    Echo the request body, stream numbered lines on /stream and drop the connection on /drop
+    """
+    if request.path == "/stream":
+        return 200, {}, [b"line %d\n" % index for index in range(5)]
+    if request.path == "/drop":
+        # Answer as if the connection stays open, then close it like an idle timeout would
+        request.close_connection = True
+    return 200, {"Content-Type": "text/plain"}, b"echo:" + body
+
+
+class HTTPConnectionPoolTest(unittest.TestCase):
+    """
+    Threaded pool used by the Telegram and LLM clients
+    """
+
+    def setUp(self):
+        self.server = StubServer(answer)
+        self.pool = HTTPConnectionPool(self.server.url, pool_size=2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    def test_requests_reuse_one_connection(self):
+        for index in range(3):
+            status, body = self.pool.request("POST", "/echo", b"%d" % index, {"Content-Type": "text/plain"}, 5)
+            self.assertEqual((status, body), (200, b"echo:%d" % index))
+
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.pool.stats["created"], 1)
+        self.assertEqual(self.pool.stats["reused"], 2)
+
+    def test_stream_read_to_the_end_returns_the_connection(self):
+        with self.pool.stream("GET", "/stream", timeout=5) as response:
+            lines = list(response)
+
+        self.assertEqual(lines, [b"line %d\n" % index for index in range(5)])
+        self.pool.request("GET", "/echo", timeout=5)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_stream_stopped_early_closes_the_connection(self):
+        with self.pool.stream("GET", "/stream", timeout=5) as response:
+            self.assertEqual(response.readline(), b"line 0\n")
+
+        self.pool.request("GET", "/echo", timeout=5)
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_connection_closed_while_idle_is_replaced(self):
+        self.pool.request("GET", "/drop", timeout=5)
+        status, body = self.pool.request("POST", "/echo", b"again", {}, 5)
+
+        self.assertEqual((status, body), (200, b"echo:again"))
+        self.assertEqual(self.pool.stats["reconnects"], 1)
+
+
+class AsyncHTTPConnectionPoolTest(unittest.TestCase):
+    """
+    Event-loop pool used by the asyncio runtime
+    """
+
+    def setUp(self):
+        self.server = StubServer(answer)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_with_pool(self, scenario):
+        async def main():
+            pool = AsyncHTTPConnectionPool(self.server.url, pool_size=2)
+            try:
+                return await scenario(pool)
+            finally:
+                await pool.close()
+
+        return asyncio.run(main())
+
+    def test_requests_reuse_one_connection(self):
+        async def scenario(pool):
+            return [await pool.request("POST", "/echo", b"%d" % index, {}, 5) for index in range(3)]
+
+        results = self.run_with_pool(scenario)
+
+        self.assertEqual(results, [(200, b"echo:%d" % index) for index in range(3)])
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_chunked_response_is_read_whole(self):
+        async def scenario(pool):
+            return await pool.request("GET", "/stream", timeout=5), await pool.request("GET", "/echo", timeout=5)
+
+        (status, body), _ = self.run_with_pool(scenario)
+
+        self.assertEqual((status, body), (200, b"".join(b"line %d\n" % index for index in range(5))))
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_connection_closed_while_idle_is_replaced(self):
+        async def scenario(pool):
+            await pool.request("GET", "/drop", timeout=5)
+            result = await pool.request("POST", "/echo", b"again", {}, 5)
+            return result, pool.stats["reconnects"]
+
+        result, reconnects = self.run_with_pool(scenario)
+
+        self.assertEqual(result, (200, b"echo:again"))
+        self.assertEqual(reconnects, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Study Sphere AI - Model Router Tests
+Checks routing and failover between LLM backends served by local stub servers
+"""
+
+import json
+import unittest
+
+from circuit_breaker import CircuitBreaker
+from deepseek_api import DeepSeekAPI
+from model_router import ModelBackend, ModelRouter
+from tests.stub_server import StubServer
+
+
+def completion(request, body):
+    """
+    Answer a chat completion with a fixed question
+    """
+    payload = {"choices": [{"message": {"content": "1. What is a rational number?"}, "finish_reason": "stop"}]}
+    return 200, {"Content-Type": "application/json"}, json.dumps(payload).encode()
+
+
+def failure(request, body):
+    """
+    Answer every call with a server error
+    """
+    return 500, {"Content-Type": "application/json"}, b'{"error": "overloaded"}'
+
+
+class ModelRouterFailoverTest(unittest.TestCase):
+    """
+    A router over a failing primary backend and a working secondary one
+    """
+
+    def setUp(self):
+        self.primary_server = StubServer(failure)
+        self.secondary_server = StubServer(completion)
+
+        # The primary's breaker opens on its first failure so it is tried last afterwards
+        self.primary = ModelBackend("primary", self.client(self.primary_server, CircuitBreaker(failure_threshold=1)))
+        self.secondary = ModelBackend("secondary", self.client(self.secondary_server, CircuitBreaker()))
+        self.router = ModelRouter([self.primary, self.secondary], explore_ratio=0)
+
+    def tearDown(self):
+        self.router.close()
+        self.primary_server.stop()
+        self.secondary_server.stop()
+
+    def client(self, server, breaker):
+        return DeepSeekAPI("key", server.url + "/v1/chat/completions", "model", timeout=5, breaker=breaker)
+
+    def generate(self, resource_type="Important Questions", use_fallback=True):
+        return self.router.generate_study_material("10", "Mathematics", "Real Numbers", resource_type,
+                                                   use_fallback=use_fallback)
+
+    def test_failed_backend_falls_over_to_the_next_one(self):
+        content = self.generate()
+
+        self.assertIn("rational number", content)
+        self.assertEqual(len(self.primary_server.requests), 1)
+        self.assertEqual(len(self.secondary_server.requests), 1)
+        self.assertEqual(self.router.get_stats()["primary"]["failures"], 1)
+
+    def test_backend_with_open_breaker_is_tried_last(self):
+        self.generate()
+        self.generate()
+
+        self.assertEqual(self.router.rank("Important Questions"), [self.secondary, self.primary])
+        self.assertEqual(len(self.primary_server.requests), 1)
+        self.assertEqual(len(self.secondary_server.requests), 2)
+
+    def test_latency_is_tracked_per_resource_type(self):
+        self.generate("Important Questions")
+
+        latency = self.router.get_stats()["secondary"]["latency"]
+        self.assertEqual(list(latency), ["Important Questions"])
+        self.assertEqual(self.secondary.score("Formula Sheet"), 0.0)
+
+    def test_fallback_content_when_every_backend_fails(self):
+        self.secondary_server.handler = failure
+
+        self.assertIsNone(self.generate(use_fallback=False))
+        self.assertTrue(self.generate())
+
+
+if __name__ == "__main__":
+    unittest.main()
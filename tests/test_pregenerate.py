@@ -0,0 +1,93 @@
+"""
+Study Sphere AI - Pregenerate Tests
+Checks that a resumed run only skips jobs whose cached content is still current
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from content_cache import ContentCache
+from content_generator import ContentGenerator
+from pregenerate import Pregenerator
+
+JOB = (["10", "Mathematics", "Real Numbers"], "Important Questions", "mixed")
+
+
+class FakeAPI:
+    """
+    Stand-in for the LLM client, counting generations
+    """
+
+    def __init__(self):
+        self.model = "model-a"
+        self.calls = 0
+
+    def _build_prompt(self, class_num, subject, chapter, resource_type, difficulty=None, subsubject=None):
+        return f"{resource_type} for {chapter}"
+
+    def generate_study_material(self, *args, **kwargs):
+        self.calls += 1
+        return "1. What is a rational number?"
+
+
+class PregeneratorCheckpointTest(unittest.TestCase):
+    """
+    Runs resumed from the checkpoint of an earlier run
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint_path = os.path.join(self.directory.name, "checkpoint.jsonl")
+        self.api = FakeAPI()
+        self.cache = ContentCache(None, ttl=3600)
+        self.generator = ContentGenerator(None, None, None, cache=self.cache, api=self.api)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_jobs(self):
+        pregenerator = Pregenerator(self.generator, self.checkpoint_path, workers=1, requests_per_minute=6000)
+        return pregenerator.run([JOB])
+
+    def test_finished_job_is_skipped(self):
+        self.assertEqual(self.run_jobs()["done"], 1)
+        self.assertEqual(self.run_jobs()["skipped"], 1)
+        self.assertEqual(self.api.calls, 1)
+
+    def test_job_is_done_again_after_a_model_change(self):
+        self.run_jobs()
+        self.api.model = "model-b"
+
+        stats = self.run_jobs()
+
+        self.assertEqual((stats["skipped"], stats["done"]), (0, 1))
+        self.assertEqual(self.api.calls, 2)
+
+    def test_job_is_done_again_once_past_the_cache_ttl(self):
+        self.run_jobs()
+        with open(self.checkpoint_path, "r", encoding="utf-8") as file:
+            entry = json.loads(file.readline())
+        entry["finished_at"] = time.time() - 2 * self.cache.ttl
+        with open(self.checkpoint_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps(entry) + "\n")
+        self.cache.clear()
+
+        stats = self.run_jobs()
+
+        self.assertEqual((stats["skipped"], stats["done"]), (0, 1))
+        self.assertEqual(self.api.calls, 2)
+
+    def test_checkpoint_without_versions_is_not_trusted(self):
+        with open(self.checkpoint_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps(JOB[0] + [JOB[1], JOB[2]]) + "\n")
+
+        stats = self.run_jobs()
+
+        self.assertEqual((stats["skipped"], stats["done"]), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
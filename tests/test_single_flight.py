@@ -0,0 +1,149 @@
+"""
+Study Sphere AI - Single Flight Tests
+Checks that threads and coroutines coalesce onto one call per key
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from single_flight import SingleFlight, SingleFlightCancelled, SingleFlightTimeout
+
+
+class SingleFlightTest(unittest.TestCase):
+    """
+    Coalescing across the threaded and asyncio runtimes
+    """
+
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.executions = 0
+
+    def test_coroutine_joins_call_started_by_a_thread(self):
+        started = threading.Event()
+
+        def generate():
+            self.executions += 1
+            started.set()
+            time.sleep(0.2)
+            return "from thread"
+
+        leader = threading.Thread(target=self.single_flight.do, args=("key", generate))
+        leader.start()
+        started.wait()
+
+        async def generate_async():
+            self.executions += 1
+            return "from loop"
+
+        result = asyncio.run(self.single_flight.do_async("key", generate_async, timeout=5))
+        leader.join()
+
+        self.assertEqual(result, "from thread")
+        self.assertEqual(self.executions, 1)
+
+    def test_thread_joins_call_started_by_a_coroutine(self):
+        results = []
+
+        async def scenario():
+            async def generate_async():
+                self.executions += 1
+                await asyncio.sleep(0.2)
+                return "from loop"
+
+            leader = asyncio.create_task(self.single_flight.do_async("key", generate_async))
+            await asyncio.sleep(0.05)
+
+            waiter = threading.Thread(
+                target=lambda: results.append(self.single_flight.do("key", lambda: "from thread", timeout=5))
+            )
+            waiter.start()
+            self.assertEqual(await leader, "from loop")
+            await asyncio.to_thread(waiter.join)
+
+        asyncio.run(scenario())
+        self.assertEqual(results, ["from loop"])
+        self.assertEqual(self.executions, 1)
+
+    def test_waiters_of_a_cancelled_leader_get_an_ordinary_error(self):
+        async def scenario():
+            async def generate_async():
+                await asyncio.sleep(5)
+
+            leader = asyncio.create_task(self.single_flight.do_async("key", generate_async))
+            await asyncio.sleep(0.05)
+            waiter = asyncio.create_task(self.single_flight.do_async("key", generate_async, timeout=5))
+            await asyncio.sleep(0.05)
+
+            leader.cancel()
+            with self.assertRaises(SingleFlightCancelled):
+                await waiter
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+
+        asyncio.run(scenario())
+        self.assertFalse(self.single_flight.in_flight("key"))
+
+    def test_waiter_that_timed_out_no_longer_blocks_detach(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def generate():
+            started.set()
+            release.wait()
+
+        leader = threading.Thread(target=self.single_flight.do, args=("key", generate))
+        leader.start()
+        started.wait()
+
+        with self.assertRaises(SingleFlightTimeout):
+            self.single_flight.do("key", generate, timeout=0.05)
+        self.assertTrue(self.single_flight.detach("key"))
+
+        release.set()
+        leader.join()
+
+    def test_cancelled_waiter_no_longer_blocks_detach(self):
+        async def scenario():
+            async def generate_async():
+                await asyncio.sleep(5)
+
+            leader = asyncio.create_task(self.single_flight.do_async("key", generate_async))
+            await asyncio.sleep(0.05)
+            waiter = asyncio.create_task(self.single_flight.do_async("key", generate_async))
+            await asyncio.sleep(0.05)
+            self.assertFalse(self.single_flight.detach("key"))
+
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            self.assertTrue(self.single_flight.detach("key"))
+            leader.cancel()
+
+        asyncio.run(scenario())
+
+    def test_lead_returns_at_once_while_another_call_is_in_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def generate():
+            self.executions += 1
+            started.set()
+            release.wait()
+            return "from leader"
+
+        leader = threading.Thread(target=self.single_flight.do, args=("key", generate))
+        leader.start()
+        started.wait()
+
+        self.assertEqual(self.single_flight.lead("key", generate), (False, None))
+        release.set()
+        leader.join()
+
+        self.assertEqual(self.single_flight.lead("key", lambda: "led"), (True, "led"))
+        self.assertEqual(self.executions, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Study Sphere AI - State Store Tests
+Checks that navigation state changed in place reaches SQLite once it is saved
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from state_store import SQLiteStateStore, UserState
+
+
+class SQLiteStateStoreTest(unittest.TestCase):
+    """
+    Write-behind persistence of navigation state
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "states.sqlite3")
+        # A long interval keeps the background flusher out of the way, the tests flush explicitly
+        self.store = SQLiteStateStore(self.db_path, flush_interval=3600)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self):
+        self.store.close()
+        self.store = SQLiteStateStore(self.db_path, flush_interval=3600)
+
+    def test_reads_do_not_queue_writes(self):
+        self.store[1] = UserState(current_level="class")
+        self.assertEqual(self.store.flush(), 1)
+
+        self.store.get(1)
+        self.assertEqual(self.store.flush(), 0)
+
+    def test_change_after_a_flush_is_persisted_once_saved(self):
+        self.store[1] = UserState(current_level="class")
+        state = self.store.get(1)
+
+        # The flusher runs while the handler waits on Telegram, then the handler finishes its changes
+        self.store.flush()
+        state.last_message_id = 42
+        self.store.save(1, state)
+
+        self.reopen()
+        self.assertEqual(self.store.get(1).last_message_id, 42)
+
+    def test_replaced_state_is_not_saved_over_the_new_one(self):
+        old = UserState(current_level="chapter")
+        self.store[1] = old
+        self.store[1] = UserState(current_level="start")
+
+        self.assertFalse(self.store.save(1, old))
+
+        self.reopen()
+        self.assertEqual(self.store.get(1).current_level, "start")
+
+
+if __name__ == "__main__":
+    unittest.main()
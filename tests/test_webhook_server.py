@@ -0,0 +1,81 @@
+"""
+Study Sphere AI - Webhook Server Tests
+Checks how the webhook server answers Telegram's posts over a real connection
+"""
+
+import http.client
+import json
+import unittest
+
+from webhook_server import SECRET_TOKEN_HEADER, WebhookServer
+
+
+class WebhookServerTest(unittest.TestCase):
+    """
+    Requests posted to a running WebhookServer
+    """
+
+    def setUp(self):
+        self.updates = []
+        self.accept = True
+        self.server = WebhookServer(self.on_update, host="127.0.0.1", port=0, secret_token="secret")
+        self.server.start()
+        self.connection = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.stop()
+
+    def on_update(self, update):
+        self.updates.append(update)
+        return self.accept
+
+    def post(self, path="/telegram/webhook", body=b'{"update_id": 1}', headers=None):
+        headers = {SECRET_TOKEN_HEADER: "secret", **(headers or {})}
+        self.connection.request("POST", path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response
+
+    def test_updates_are_acknowledged_over_one_connection(self):
+        for update_id in range(3):
+            response = self.post(body=json.dumps({"update_id": update_id}).encode())
+            self.assertEqual(response.status, 200)
+            self.assertFalse(response.will_close)
+
+        self.assertEqual([update["update_id"] for update in self.updates], [0, 1, 2])
+
+    def test_wrong_path_closes_the_connection(self):
+        response = self.post(path="/other")
+
+        self.assertEqual(response.status, 404)
+        self.assertTrue(response.will_close)
+        self.assertEqual(self.updates, [])
+
+    def test_invalid_content_length_is_rejected(self):
+        self.connection.putrequest("POST", "/telegram/webhook")
+        self.connection.putheader("Content-Length", "abc")
+        self.connection.endheaders()
+        response = self.connection.getresponse()
+        response.read()
+
+        self.assertEqual(response.status, 400)
+        self.assertTrue(response.will_close)
+        self.assertEqual(self.server.stats["invalid"], 1)
+
+    def test_wrong_secret_token_is_unauthorized(self):
+        response = self.post(headers={SECRET_TOKEN_HEADER: "guess"})
+
+        self.assertEqual(response.status, 403)
+        self.assertEqual(self.updates, [])
+        self.assertEqual(self.post().status, 200)
+
+    def test_update_the_dispatcher_refuses_is_not_acknowledged(self):
+        self.accept = False
+
+        self.assertEqual(self.post().status, 503)
+        self.assertEqual(self.server.stats["rejected"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
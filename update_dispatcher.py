@@ -0,0 +1,215 @@
+"""
+Study Sphere AI - Update Dispatcher Module
+This module runs Telegram updates on a pool of worker threads while keeping
+updates from the same chat strictly in the order they were received
+"""
+
+import threading
+import time
+import traceback
+from collections import deque
+
+
+def get_update_chat_id(update):
+    """
+    Get the chat ID an update belongs to
+
+    Args:
+        update (dict): Update from Telegram API
+
+    Returns:
+        int: Chat ID, or None if the update is not tied to a chat
+    """
+    if "message" in update:
+        return update["message"].get("chat", {}).get("id")
+
+    if "callback_query" in update:
+        return update["callback_query"].get("message", {}).get("chat", {}).get("id")
+
+    return None
+
+
+class UpdateDispatcher:
+    """
+    Class to dispatch updates to worker threads with per-chat ordering
+    """
+
+    def __init__(self, handler, num_workers=8, max_queue_size=1000):
+        """
+        Initialize the UpdateDispatcher
+
+        Args:
+            handler (callable): Function called with each update
+            num_workers (int): Number of worker threads
+            max_queue_size (int): Maximum number of queued updates before submit blocks
+        """
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+
+        # Queued updates per chat, and chats that have work and no running update
+        self._pending = {}
+        self._ready = deque()
+        self._active = set()
+        self._size = 0
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        self._workers = []
+        self._running = False
+
+        # Dispatch statistics
+        self.stats = {
+            "submitted": 0,
+            "processed": 0,
+            "rejected": 0,
+            "total_queue_delay": 0.0,
+            "max_queue_delay": 0.0
+        }
+
+    def start(self):
+        """
+        Start the worker threads
+        """
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"update-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        print(f"✅ Update dispatcher started with {self.num_workers} workers")
+
+    def stop(self, wait=True, timeout=None):
+        """
+        Stop the worker threads after the queued updates are processed
+
+        Args:
+            wait (bool): Whether to wait for the workers to finish
+            timeout (float, optional): Most seconds to wait for all workers together
+
+        Returns:
+            bool: True if every worker finished, always False without wait
+        """
+        with self._lock:
+            self._running = False
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+        finished = False
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for worker in self._workers:
+                worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            finished = not any(worker.is_alive() for worker in self._workers)
+
+        self._workers = []
+        return finished
+
+    def submit(self, update, block=True, timeout=None):
+        """
+        Queue an update for processing
+
+        Args:
+            update (dict): Update from Telegram API
+            block (bool): Whether to wait for room when the queue is full
+            timeout (float, optional): Maximum time to wait for room
+
+        Returns:
+            bool: True if the update was queued
+        """
+        chat_id = get_update_chat_id(update)
+
+        # Updates without a chat do not need ordering with anything else
+        key = chat_id if chat_id is not None else ("update", update.get("update_id"))
+
+        with self._lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+
+            while self._size >= self.max_queue_size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0) or not self._running:
+                    self.stats["rejected"] += 1
+                    return False
+                self._not_full.wait(remaining)
+
+            queue = self._pending.setdefault(key, deque())
+            queue.append((update, time.monotonic()))
+            self._size += 1
+            self.stats["submitted"] += 1
+
+            # A chat becomes ready only if none of its updates is already queued or running
+            if len(queue) == 1 and key not in self._active:
+                self._ready.append(key)
+                self._not_empty.notify()
+
+        return True
+
+    def queue_size(self):
+        """
+        Get the number of queued updates
+
+        Returns:
+            int: Number of updates waiting for a worker
+        """
+        with self._lock:
+            return self._size
+
+    def get_stats(self):
+        """
+        Get dispatch statistics
+
+        Returns:
+            dict: Counters and queue delay figures
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["queue_size"] = self._size
+            stats["active_chats"] = len(self._active)
+
+        processed = stats["processed"]
+        stats["avg_queue_delay"] = stats["total_queue_delay"] / processed if processed else 0.0
+        return stats
+
+    def _worker_loop(self):
+        """
+        Take the next ready chat, run its oldest update and release the chat
+        """
+        while True:
+            with self._lock:
+                while not self._ready and self._running:
+                    self._not_empty.wait()
+
+                if not self._ready:
+                    return
+
+                key = self._ready.popleft()
+                update, enqueued_at = self._pending[key].popleft()
+                self._active.add(key)
+                self._size -= 1
+                self._not_full.notify()
+
+                delay = time.monotonic() - enqueued_at
+                self.stats["total_queue_delay"] += delay
+                self.stats["max_queue_delay"] = max(self.stats["max_queue_delay"], delay)
+
+            try:
+                self.handler(update)
+            except Exception as e:
+                print(f"❌ Error in update worker: {e}")
+                print(traceback.format_exc())
+
+            with self._lock:
+                self._active.discard(key)
+                self.stats["processed"] += 1
+
+                if self._pending[key]:
+                    self._ready.append(key)
+                    self._not_empty.notify()
+                else:
+                    del self._pending[key]
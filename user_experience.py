@@ -206,6 +206,21 @@ class UserExperience:
             f"This may take a moment. Please wait..."
         )
     
+    def get_generation_complete_message(self, resource_type):
+        """
+        Get a formatted message replacing a streamed preview once the full content is sent
+        
+        Args:
+            resource_type (str): Selected resource type
+            
+        Returns:
+            str: Formatted completion message
+        """
+        return (
+            f"{self.emojis['success']} <b>{resource_type} ready!</b>\n\n"
+            f"Your study material is below."
+        )
+    
     def get_post_response_message(self):
         """
         Get a formatted post-response message
@@ -0,0 +1,157 @@
+"""
+Study Sphere AI - Webhook Server Module
+This module runs a lightweight HTTP server that receives Telegram updates pushed
+to the bot's webhook and hands them to the update dispatcher
+"""
+
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Header Telegram uses to send the secret token registered with setWebhook
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Largest update body accepted, Telegram updates are far smaller
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookServer:
+    """
+    Class to receive Telegram webhook updates over HTTP
+    """
+
+    def __init__(self, on_update, host="0.0.0.0", port=8443, path="/telegram/webhook", secret_token=None):
+        """
+        Initialize the WebhookServer
+
+        Args:
+            on_update (callable): Called with each update, returns True if it was accepted
+            host (str): Interface to listen on
+            port (int): Port to listen on, 0 picks a free port
+            path (str): URL path Telegram posts updates to
+            secret_token (str, optional): Expected value of the secret token header
+        """
+        self.on_update = on_update
+        self.path = path
+        self.secret_token = secret_token
+        self.stats = {"received": 0, "rejected": 0, "unauthorized": 0, "invalid": 0}
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def server_address(self):
+        """
+        Get the address the server is bound to
+
+        Returns:
+            tuple: (host, port)
+        """
+        return self.httpd.server_address
+
+    def _make_handler(self):
+        """
+        Build the request handler class bound to this server
+
+        Returns:
+            type: BaseHTTPRequestHandler subclass
+        """
+        server = self
+
+        class WebhookRequestHandler(BaseHTTPRequestHandler):
+            """
+            Request handler that validates and acknowledges webhook updates
+            """
+
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                status = server._handle_post(self)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                if self.close_connection:
+                    self.send_header("Connection", "close")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                # Telegram posts every update, so per-request logging is too noisy
+                pass
+
+        return WebhookRequestHandler
+
+    def _handle_post(self, request):
+        """
+        Validate a webhook request and pass its update on
+
+        Args:
+            request (BaseHTTPRequestHandler): Incoming request
+
+        Returns:
+            int: HTTP status to answer with
+        """
+        # A body left unread would be parsed as the next request on the keep-alive
+        # connection, so requests rejected before reading it close the connection
+        if request.path != self.path:
+            request.close_connection = True
+            return 404
+
+        try:
+            length = int(request.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length <= 0 or length > MAX_BODY_SIZE:
+            self.stats["invalid"] += 1
+            request.close_connection = True
+            return 400
+
+        body = request.rfile.read(length)
+
+        if self.secret_token:
+            received = request.headers.get(SECRET_TOKEN_HEADER, "")
+            if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+                self.stats["unauthorized"] += 1
+                return 403
+
+        try:
+            update = json.loads(body.decode())
+        except ValueError:
+            self.stats["invalid"] += 1
+            return 400
+
+        self.stats["received"] += 1
+
+        # Acknowledge as soon as the update is queued, processing happens on the workers
+        if self.on_update(update):
+            return 200
+
+        # Telegram redelivers updates that were not acknowledged with a 2xx status
+        self.stats["rejected"] += 1
+        return 503
+
+    def start(self):
+        """
+        Serve requests on a background thread
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="webhook-server", daemon=True)
+        self._thread.start()
+        print(f"✅ Webhook server listening on {self.server_address[0]}:{self.server_address[1]}{self.path}")
+
+    def serve_forever(self):
+        """
+        Serve requests on the calling thread until shutdown
+        """
+        print(f"✅ Webhook server listening on {self.server_address[0]}:{self.server_address[1]}{self.path}")
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None